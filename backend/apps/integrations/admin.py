@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import IntegrationDefinition, PublishTarget, PublishLog
+from .models import IntegrationDefinition, PublishTarget, PublishLog, PublishPayload
 
 
 @admin.register(IntegrationDefinition)
@@ -22,3 +22,10 @@ class PublishLogAdmin(admin.ModelAdmin):
     list_display = ('publish_target', 'status', 'created_at')
     list_filter = ('status',)
     search_fields = ('publish_target__integration__name',)
+    raw_id_fields = ('payload',)
+
+
+@admin.register(PublishPayload)
+class PublishPayloadAdmin(admin.ModelAdmin):
+    list_display = ('hash', 'size', 'created_at')
+    search_fields = ('hash',)
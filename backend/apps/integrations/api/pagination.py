@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PublishLogPagination(CursorPagination):
+    """Keyset pages over ``pl_target_date_idx`` (publish_target, created_at)."""
+
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -9,9 +9,20 @@ from apps.integrations.models import (
     PublishTarget,
     PublishLog,
 )
+from apps.integrations.services import schema_service
 from blog.models import Integration
 
 
+def validate_publish_settings(attrs, integration: Integration) -> None:
+    """Check ``publish_settings`` against the integration's ``publish_schema``."""
+    publish_settings = attrs.get('publish_settings')
+    if publish_settings is None or integration is None:
+        return
+    errors = schema_service.publish_settings_errors(integration.definition, publish_settings)
+    if errors:
+        raise ValidationError({'publish_settings': errors})
+
+
 class IntegrationDefinitionSerializer(serializers.ModelSerializer):
     class Meta:
         model = IntegrationDefinition
@@ -55,6 +66,9 @@ class IntegrationSerializer(serializers.ModelSerializer):
             'credentials',
             'status',
             'last_error',
+            'rate_limit_per_minute',
+            'rate_limit_burst',
+            'max_concurrency',
             'created_at',
             'updated_at',
         )
@@ -70,16 +84,9 @@ class IntegrationSerializer(serializers.ModelSerializer):
         # validate credentials schema if provided
         creds = attrs.get('credentials')
         if definition and creds is not None:
-            schema = definition.config_schema or {}
-            if schema:
-                try:
-                    import jsonschema
-
-                    jsonschema.validate(instance=creds, schema=schema)
-                except ImportError:  # no dependency, skip
-                    pass
-                except Exception as exc:
-                    raise ValidationError({'credentials': f'invalid: {exc}'})
+            errors = schema_service.credentials_errors(definition, creds)
+            if errors:
+                raise ValidationError({'credentials': errors})
         return super().validate(attrs)
 
     def create(self, validated_data):
@@ -124,17 +131,26 @@ class PublishTargetSerializer(serializers.ModelSerializer):
             'scheduled_at',
             'last_published_at',
             'retry_count',
+            'next_attempt_at',
             'last_error',
+            'last_error_class',
             'created_at',
             'updated_at',
         )
+        # status and retry bookkeeping only move through transition_service
         read_only_fields = (
+            'status',
             'last_published_at',
             'retry_count',
+            'next_attempt_at',
             'last_error',
+            'last_error_class',
             'created_at',
             'updated_at',
         )
+        # the unique constraint is checked in validate(), DRF can't build the
+        # validator with two fields mapped to content_type
+        validators = []
 
     def validate_integration(self, value: Integration) -> Integration:
         user = self.context['request'].user
@@ -168,18 +184,64 @@ class PublishTargetSerializer(serializers.ModelSerializer):
                 uuid.UUID(str(obj))
             except Exception:
                 raise ValidationError({'object_id': 'Must be a valid UUID.'})
+        if self.instance is None and PublishTarget.objects.filter(
+            integration=integration, content_type=attrs['content_type'], object_id=obj
+        ).exists():
+            raise ValidationError('A publish target for this integration and object already exists.')
+        validate_publish_settings(attrs, integration or self.instance.integration)
         return super().validate(attrs)
 
+    def update(self, instance: PublishTarget, validated_data) -> PublishTarget:
+        # only the edited columns; a worker may be writing the claim, status
+        # and retry bookkeeping of the same row right now
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
 
 class PublishLogSerializer(serializers.ModelSerializer):
+    """Logs reference their request payload by hash.
+
+    The payload body is only loaded and returned when the serializer context
+    has ``include_payload`` set (``?include=payload`` on the logs endpoint).
+    """
+
+    payload_hash = serializers.CharField(source='payload_id', read_only=True)
+    request_payload = serializers.JSONField(read_only=True)
+
     class Meta:
         model = PublishLog
         fields = (
             'id',
             'status',
             'error_message',
+            'payload_hash',
             'request_payload',
             'response_payload',
             'created_at',
         )
         read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_payload'):
+            self.fields.pop('request_payload')
+
+
+class DeadLetterScopeSerializer(serializers.Serializer):
+    """Which dead targets to list or requeue; the owner is always the current user."""
+
+    integration_id = serializers.IntegerField(required=False)
+    # blank: targets given up on before error classes were recorded
+    error_class = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+
+class DeadLetterGroupSerializer(serializers.Serializer):
+    integration_id = serializers.IntegerField()
+    integration_title = serializers.CharField(source='integration__title')
+    error_class = serializers.CharField(source='last_error_class')
+    count = serializers.IntegerField()
+    first_failed_at = serializers.DateTimeField()
+    last_failed_at = serializers.DateTimeField()
+    last_error = serializers.CharField(allow_null=True)
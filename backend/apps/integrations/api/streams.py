@@ -0,0 +1,136 @@
+"""``GET /api/publish-events/``: server-sent events of publish status changes.
+
+Streams the current user's PublishEvent rows (see services.event_service)
+as ``event: target`` / ``event: log`` messages whose ``id`` is the event
+id; browsers resend it as ``Last-Event-ID`` when they reconnect. Without it
+the stream starts at the newest event. ``?object_id=<note uuid>`` limits
+the stream to one note.
+
+``EventSource`` can't send headers, so instead of the JWT access token it
+may pass a ticket from ``POST /api/publish-events/ticket/`` as ``?ticket=``
+(see ``event_service.issue_ticket``). Reconnecting after the ticket expired
+answers 401; the client then asks for a new ticket and resumes with
+``?last_event_id=``. The view is async and meant to be served through
+``config.asgi``; a stream ends after ``PUBLISH_EVENTS_STREAM_SECONDS`` and
+the browser reconnects on its own. The database connection is closed after
+every read, so idle streams hold none.
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import AsyncIterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpRequest, HttpResponseBase, JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from apps.integrations.services import event_service
+
+DEFAULT_STREAM_SECONDS = 300
+KEEPALIVE_SECONDS = 15
+# browser reconnect delay
+RETRY_MS = 3000
+
+
+async def publish_events(request: HttpRequest) -> HttpResponseBase:
+    if request.method != 'GET':
+        return JsonResponse({'detail': 'Method not allowed.'}, status=405)
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    object_id = request.GET.get('object_id') or None
+    if object_id:
+        try:
+            uuid.UUID(object_id)
+        except ValueError:
+            return JsonResponse({'detail': 'object_id must be a UUID.'}, status=400)
+    last_id = _last_event_id(request)
+    if last_id is None:
+        last_id = await sync_to_async(event_service.latest_id)(user.pk)
+
+    response = StreamingHttpResponse(
+        _stream(user.pk, last_id, object_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _authenticate(request: HttpRequest):
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    if result is not None:
+        return result[0]
+    ticket = request.GET.get('ticket')
+    user_id = event_service.ticket_user_id(ticket) if ticket else None
+    if user_id is None:
+        return None
+    return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+
+def _last_event_id(request: HttpRequest) -> Optional[int]:
+    raw = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+async def _stream(user_id: int, last_id: int, object_id: Optional[str]) -> AsyncIterator[str]:
+    listener = event_service.get_listener()
+    waiter = listener.subscribe(user_id)
+    poll_interval = event_service.get_poll_interval()
+    deadline = time.monotonic() + getattr(
+        settings, 'PUBLISH_EVENTS_STREAM_SECONDS', DEFAULT_STREAM_SECONDS
+    )
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        last_sent = time.monotonic()
+        # the first read catches up from ``last_id``, later ones follow a wake-up
+        read = True
+        while time.monotonic() < deadline:
+            if read:
+                waiter.clear()
+                events = await sync_to_async(_events_after)(user_id, last_id, object_id)
+                for event in events:
+                    data = json.dumps(event.data, cls=DjangoJSONEncoder)
+                    yield f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'
+                    last_id = event.id
+                if events:
+                    last_sent = time.monotonic()
+                    continue
+            if time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            if listener.notifies:
+                # sleep until a NOTIFY for this user or the next keepalive
+                wait = KEEPALIVE_SECONDS - (time.monotonic() - last_sent)
+            else:
+                wait = poll_interval
+            timeout = min(max(wait, 0), max(deadline - time.monotonic(), 0))
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout)
+                read = True
+            except asyncio.TimeoutError:
+                read = not listener.notifies
+    finally:
+        listener.unsubscribe(user_id, waiter)
+
+
+def _events_after(user_id: int, last_id: int, object_id: Optional[str]):
+    try:
+        return event_service.events_after(user_id, last_id, object_id)
+    finally:
+        # a stream is open for minutes, mostly idle; in tests it runs in a transaction
+        if not connection.in_atomic_block:
+            connection.close()
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
-from typing import Any
+import hmac
+from typing import Any, Optional, Sequence
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.db.models import Count, Max, Q, QuerySet
+from django.http import HttpResponse
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import BasePermission, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from apps.integrations.services import publish_service
+from apps.integrations import metrics
+from apps.integrations.api.pagination import PublishLogPagination
+from apps.integrations.services import (
+    catalogue_service,
+    circuit_breaker_service,
+    dead_letter_service,
+    event_service,
+    idempotency_service,
+    queue_service,
+)
 from apps.integrations.api.serializers import (
+    DeadLetterGroupSerializer,
+    DeadLetterScopeSerializer,
     IntegrationDefinitionSerializer,
     IntegrationSerializer,
     PublishLogSerializer,
@@ -21,10 +36,59 @@ from apps.integrations.models import (
     PublishTarget,
 )
 from blog.models import Integration
+from blog.conditional import ConditionalMixin
 from blog.permissions import IsOwner
 
 
-class IntegrationDefinitionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class CatalogueCacheMixin:
+    """Serve ``list``/``retrieve`` as rendered bytes from ``catalogue_service``.
+
+    Sits behind ``ConditionalMixin`` and adds its ``resource_version`` to the
+    cache key. Only JSON responses are cached, they are the same for every
+    user; of the query string only ``cache_query_params`` count.
+    """
+
+    cache_query_params: Sequence[str] = ()
+
+    def list(self, request, *args, **kwargs):
+        respond = super().list
+        return self._cached(lambda: respond(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        respond = super().retrieve
+        return self._cached(lambda: respond(request, *args, **kwargs))
+
+    def _cached(self, respond):
+        request = self.request
+        version = getattr(self, 'resource_version', None)
+        if version is None or request.accepted_renderer.format != 'json':
+            return respond()
+        params = tuple(sorted(
+            (name, request.query_params.get(name, ''))
+            for name in self.cache_query_params
+        ))
+        key = catalogue_service.response_key(request.path, request.accepted_media_type, params, version)
+        cached = catalogue_service.get_response(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = respond()
+        if response.status_code == 200:
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            catalogue_service.store_response(key, response.content, response['Content-Type'])
+        return response
+
+
+class IntegrationDefinitionViewSet(
+    ConditionalMixin,
+    CatalogueCacheMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
     """Read-only viewset for active integration definitions."""
 
     queryset = (
@@ -34,6 +98,18 @@ class IntegrationDefinitionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMi
     serializer_class = IntegrationDefinitionSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_object_version(self) -> Optional[Sequence[Any]]:
+        return self.get_queryset().filter(pk=self.lookup_value()).values_list(
+            'updated_at', 'version'
+        ).first()
+
+    def get_list_version(self) -> Optional[Sequence[Any]]:
+        # deactivating a definition moves its updated_at too
+        latest = IntegrationDefinition.objects.aggregate(
+            latest=Max('updated_at'), total=Count('pk', filter=Q(is_active=True))
+        )
+        return (latest['latest'], latest['total'])
+
 
 class IntegrationViewSet(viewsets.ModelViewSet):
     serializer_class = IntegrationSerializer
@@ -50,6 +126,14 @@ class IntegrationViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer: IntegrationSerializer) -> None:
         serializer.save(owner=self.request.user)
 
+    def perform_update(self, serializer: IntegrationSerializer) -> None:
+        integration = serializer.save()
+        # new credentials or a manual re-activation close a tripped circuit
+        if 'credentials' in serializer.validated_data or (
+            serializer.validated_data.get('status') == Integration.STATUS_ACTIVE
+        ):
+            circuit_breaker_service.reset(integration)
+
 
 class PublishTargetViewSet(viewsets.ModelViewSet):
     serializer_class = PublishTargetSerializer
@@ -69,6 +153,9 @@ class PublishTargetViewSet(viewsets.ModelViewSet):
         obj_id = self.request.query_params.get('object_id')
         if obj_id:
             qs = qs.filter(object_id=obj_id)
+        status_param = self.request.query_params.get('status')
+        if status_param:
+            qs = qs.filter(status=status_param)
         return qs
 
     def perform_create(self, serializer: PublishTargetSerializer) -> None:
@@ -78,21 +165,93 @@ class PublishTargetViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def publish(self, request: Request, pk: Any = None) -> Response:
         target = self.get_object()
+        return idempotency_service.idempotent_response(
+            request, f'publish-target:{target.pk}', lambda: self._enqueue(request, target)
+        )
+
+    def _enqueue(self, request: Request, target: PublishTarget) -> Response:
         if not target.is_enabled:
             return Response({'detail': 'Target is disabled'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            publish_service.publish_target(target, request.data or {})
-        except Exception:  # log internally
-            return Response({'detail': 'internal error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # the actual publish runs in `manage.py publish_worker`
+        if not queue_service.enqueue_target(target, request.data or {}):
+            target.refresh_from_db()
+            if target.status == PublishTarget.STATUS_PUBLISHED:
+                return Response(
+                    {'detail': 'Target is already published'}, status=status.HTTP_409_CONFLICT
+                )
+            # being published right now
         serializer = self.get_serializer(target)
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def dead(self, request: Request) -> Response:
+        """Dead targets grouped by integration and error class."""
+        scope = DeadLetterScopeSerializer(data=request.query_params)
+        scope.is_valid(raise_exception=True)
+        groups = dead_letter_service.summary(
+            dead_letter_service.dead_targets(owner=request.user, **scope.validated_data)
+        )
+        return Response(DeadLetterGroupSerializer(groups, many=True).data)
 
-    @action(detail=True, methods=['get'])
+    @action(detail=False, methods=['post'], url_path='dead/requeue')
+    def requeue_dead(self, request: Request) -> Response:
+        """Queue the dead targets of an integration and/or error class again."""
+        scope = DeadLetterScopeSerializer(data=request.data)
+        scope.is_valid(raise_exception=True)
+        if not scope.validated_data:
+            return Response(
+                {'detail': 'Pass integration_id and/or error_class.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        requeued = dead_letter_service.requeue(owner=request.user, **scope.validated_data)
+        return Response({'requeued': requeued})
+
+    @action(detail=True, methods=['get'], pagination_class=PublishLogPagination)
     def logs(self, request: Request, pk: Any = None) -> Response:
         target = self.get_object()
-        logs = target.logs.order_by('-created_at')
+        logs = target.logs.all()
+        include_payload = 'payload' in request.query_params.get('include', '').split(',')
+        if include_payload:
+            logs = logs.select_related('payload')
         page = self.paginate_queryset(logs)
-        serializer = PublishLogSerializer(page or logs, many=True)
-        if page is not None:
-            return self.get_paginated_response(serializer.data)
-        return Response(serializer.data)
+        serializer = PublishLogSerializer(
+            page, many=True, context={'include_payload': include_payload}
+        )
+        return self.get_paginated_response(serializer.data)
+
+
+class HasMetricsToken(BasePermission):
+    """``Authorization: Bearer <METRICS_TOKEN>``.
+
+    Without a token the metrics are closed, unless ``DEBUG`` or
+    ``METRICS_PUBLIC`` is on.
+    """
+
+    def has_permission(self, request, view) -> bool:
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        if not token:
+            return settings.DEBUG or getattr(settings, 'METRICS_PUBLIC', False)
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+class MetricsView(APIView):
+    """Publish pipeline metrics in the Prometheus text format."""
+
+    authentication_classes = []
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request: Request) -> HttpResponse:
+        body, content_type = metrics.render()
+        return HttpResponse(body, content_type=content_type)
+
+
+class PublishEventTicketView(APIView):
+    """Ticket for opening ``GET /api/publish-events/?ticket=`` (see api.streams)."""
+
+    def post(self, request: Request) -> Response:
+        return Response({
+            'ticket': event_service.issue_ticket(request.user.pk),
+            'expires_in': getattr(
+                settings, 'PUBLISH_EVENTS_TICKET_SECONDS', event_service.DEFAULT_TICKET_SECONDS
+            ),
+        })
@@ -5,3 +5,6 @@ class IntegrationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.integrations'
     verbose_name = 'Integrations'
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
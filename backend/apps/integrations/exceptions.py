@@ -0,0 +1,18 @@
+class PublishError(Exception):
+    """Base class for errors raised by integration handlers."""
+
+
+class RetryableError(PublishError):
+    """A transient failure, e.g. a timeout or a 5xx from the provider."""
+
+
+class PermanentError(PublishError):
+    """A failure that will not go away by retrying, e.g. invalid credentials."""
+
+
+class HandlerTimeout(RetryableError):
+    """An isolated handler call ran past its time limit and was killed."""
+
+
+class HandlerCrashed(RetryableError):
+    """The process running an isolated handler call died."""
@@ -1,8 +1,105 @@
+import http.client
+
+from django.conf import settings
+
+from apps.integrations import http_client
+from apps.integrations.exceptions import PermanentError, RetryableError
 from apps.integrations.registry import BaseIntegrationHandler
 
+# response bodies kept in the publish log
+MAX_LOGGED_BODY = 4096
+
 
 class WebhookHandler(BaseIntegrationHandler):
+    """POST the content as JSON to the integration's ``url``.
+
+    ``publish_settings.url`` overrides the URL from the credentials. Requests
+    go through the process-wide keep-alive pool. URLs are user input: hosts
+    resolving to loopback, private or link-local addresses are refused unless
+    ``WEBHOOK_ALLOW_PRIVATE_ADDRESSES`` is on. With a ``batch_policy``
+    queued targets are sent together, see ``publish_batch``.
+    """
+
     def publish(self, integration, publish_target, content: dict):
-        # basic stub - real implementation would perform HTTP POST
-        # here we simply return the payload for logging
-        return {'sent': content}
+        url = self.url_for(integration, publish_target)
+        if not url:
+            raise PermanentError('webhook url is not configured')
+        return self.post(url, self.item(publish_target, content))
+
+    def publish_batch(self, integration, items):
+        """POST several targets as ``{"items": [...]}``, one request per URL.
+
+        A JSON response ``{"results": [...]}`` with one entry per item is
+        mapped back to the items: an entry with ``"ok": false`` fails its
+        item with the entry's ``error``, retried when ``"retryable": true``.
+        Any other successful response applies to every item of the request.
+        """
+        results = [None] * len(items)
+        by_url = {}
+        for index, (publish_target, content) in enumerate(items):
+            url = self.url_for(integration, publish_target)
+            if url:
+                by_url.setdefault(url, []).append(index)
+            else:
+                results[index] = PermanentError('webhook url is not configured')
+        for url, indexes in by_url.items():
+            payload = {'items': [self.item(*items[index]) for index in indexes]}
+            try:
+                outcome = self.post(url, payload)
+            except (RetryableError, PermanentError) as exc:
+                for index in indexes:
+                    results[index] = exc
+                continue
+            entries = outcome['body'].get('results') if isinstance(outcome['body'], dict) else None
+            if not isinstance(entries, list) or len(entries) != len(indexes):
+                entries = [None] * len(indexes)
+            for index, entry in zip(indexes, entries):
+                results[index] = self.item_result(outcome['status'], entry)
+        return results
+
+    def url_for(self, integration, publish_target):
+        return (publish_target.publish_settings or {}).get('url') or (
+            integration.credentials or {}
+        ).get('url')
+
+    def item(self, publish_target, content: dict) -> dict:
+        return {
+            'target_id': str(publish_target.pk),
+            'object_id': str(publish_target.object_id),
+            'content': content,
+        }
+
+    def item_result(self, status: int, entry):
+        if not isinstance(entry, dict):
+            return {'status': status, 'body': entry}
+        if entry.get('ok', True) is False:
+            error = f"webhook rejected the item: {entry.get('error') or 'no reason given'}"
+            return RetryableError(error) if entry.get('retryable') else PermanentError(error)
+        return {'status': status, 'body': entry}
+
+    def post(self, url: str, payload: dict):
+        try:
+            response = http_client.get_pool().post_json(
+                url,
+                payload,
+                headers={'User-Agent': 'scrapp-webhook'},
+                public_only=not getattr(settings, 'WEBHOOK_ALLOW_PRIVATE_ADDRESSES', False),
+            )
+        except ValueError as exc:
+            raise PermanentError(str(exc)) from exc
+        except (OSError, http.client.HTTPException) as exc:
+            raise RetryableError(f'webhook request failed: {exc}') from exc
+        return self.handle_response(response)
+
+    def handle_response(self, response: http_client.Response):
+        if response.status == 429 or response.status >= 500:
+            raise RetryableError(f'webhook responded {response.status}')
+        if not response.ok:
+            raise PermanentError(
+                f'webhook responded {response.status}: {response.text()[:200]}'
+            )
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text()[:MAX_LOGGED_BODY]
+        return {'status': response.status, 'body': body}
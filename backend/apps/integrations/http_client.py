@@ -0,0 +1,287 @@
+"""Keep-alive HTTP connection pool shared by outgoing integration calls.
+
+One pool exists per process (it is re-created after a fork, so gunicorn
+workers never share sockets). Connections are kept per ``(scheme, host,
+port, address)`` and each host is limited to ``max_per_host`` concurrent
+requests. The host is resolved once per request and connections go to that
+address, so with ``public_only`` a URL cannot pass the check and then reach
+an internal service through a second DNS answer.
+
+Requests are never pipelined: integrations mostly POST, and pipelining
+non-idempotent requests is unsafe when the server drops the connection
+halfway. Idle connections the server already closed are dropped before
+reuse. If a reused connection still fails, the request is sent again on a
+fresh one only when it was never written, or when the method is idempotent:
+a POST may have been processed before the server hung up, so that error is
+left to the caller's retry policy.
+"""
+import http.client
+import ipaddress
+import json
+import os
+import select
+import socket
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_PER_HOST = 10
+
+# raised by a reused connection that the server closed while it was idle
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+# safe to send twice when the connection drops before the response
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'})
+
+Origin = Tuple[str, str, int]
+HostKey = Tuple[str, str, int, str]
+
+
+class PoolTimeout(TimeoutError):
+    """No connection to the host became available in time."""
+
+
+class UnsafeAddress(ValueError):
+    """The host resolves to a loopback, private or otherwise non-public address."""
+
+
+class Response:
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode('utf-8'))
+
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+
+class _HostPool:
+    def __init__(self, max_size: int):
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle: Deque[http.client.HTTPConnection] = deque()
+        self.lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._hosts: Dict[HostKey, _HostPool] = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        timeout: Optional[float] = None,
+        public_only: bool = False,
+    ) -> Response:
+        """``public_only`` refuses hosts that resolve to non-public addresses."""
+        origin, path = _split(url)
+        key = (*origin, resolve(origin[1], origin[2], public_only))
+        host_pool = self._host_pool(key)
+        timeout = self.timeout if timeout is None else timeout
+        if not host_pool.slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"no free connection to {key[1]}:{key[2]}")
+        try:
+            conn, reused = self._checkout(key, host_pool, timeout)
+            while True:
+                written = False
+                try:
+                    conn.request(method, path, body=body, headers=dict(headers or {}))
+                    written = True
+                    response, keep = _read(conn)
+                    break
+                except _STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused or (written and method.upper() not in _IDEMPOTENT_METHODS):
+                        raise
+                    conn, reused = self._connect(key, timeout), False
+                except Exception:
+                    conn.close()
+                    raise
+            if keep:
+                with host_pool.lock:
+                    host_pool.idle.append(conn)
+            else:
+                conn.close()
+            return response
+        finally:
+            host_pool.slots.release()
+
+    def post_json(self, url: str, payload: Any, headers: Optional[Mapping[str, str]] = None,
+                  timeout: Optional[float] = None, public_only: bool = False) -> Response:
+        merged = {'Content-Type': 'application/json'}
+        merged.update(headers or {})
+        body = json.dumps(payload, default=str).encode('utf-8')
+        return self.request(
+            'POST', url, body=body, headers=merged, timeout=timeout, public_only=public_only
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            hosts, self._hosts = self._hosts, {}
+        for host_pool in hosts.values():
+            with host_pool.lock:
+                while host_pool.idle:
+                    host_pool.idle.pop().close()
+
+    def _host_pool(self, key: HostKey) -> _HostPool:
+        host_pool = self._hosts.get(key)
+        if host_pool is None:
+            with self._lock:
+                host_pool = self._hosts.setdefault(key, _HostPool(self.max_per_host))
+        return host_pool
+
+    def _checkout(self, key: HostKey, host_pool: _HostPool, timeout: float):
+        while True:
+            with host_pool.lock:
+                # most recently used first: least likely to be closed by the server
+                conn = host_pool.idle.pop() if host_pool.idle else None
+            if conn is None:
+                return self._connect(key, timeout), False
+            if _is_dropped(conn):
+                conn.close()
+                continue
+            conn.timeout = timeout
+            conn.sock.settimeout(timeout)
+            return conn, True
+
+    def _connect(self, key: HostKey, timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port, address = key
+        self.connections_opened += 1
+        conn_cls = _PinnedHTTPSConnection if scheme == 'https' else _PinnedHTTPConnection
+        return conn_cls(host, port, address, timeout=timeout)
+
+
+class _PinnedConnectionMixin:
+    """Connect to a resolved ``address``; Host header and TLS still use the hostname."""
+
+    def __init__(self, host: str, port: int, address: str, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.address = address
+        self._create_connection = self._create_pinned_connection
+
+    def _create_pinned_connection(self, host_port, *args, **kwargs):
+        return socket.create_connection((self.address, host_port[1]), *args, **kwargs)
+
+
+class _PinnedHTTPConnection(_PinnedConnectionMixin, http.client.HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedConnectionMixin, http.client.HTTPSConnection):
+    pass
+
+
+def resolve(host: str, port: int, public_only: bool = False) -> str:
+    """The address connections to ``host`` go to.
+
+    Raises ``UnsafeAddress`` when ``public_only`` is set and the address is
+    not globally routable (loopback, private, link-local, reserved...).
+    """
+    address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4][0]
+    if public_only and not _is_public(address):
+        raise UnsafeAddress(f"{host} resolves to a non-public address")
+    return address
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def request_once(
+    method: str,
+    url: str,
+    body: Optional[bytes] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Response:
+    """Send a single request on a new connection that is closed afterwards."""
+    key, path = _split(url)
+    scheme, host, port = key
+    conn_cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+    conn = conn_cls(host, port, timeout=timeout)
+    try:
+        merged = {'Connection': 'close'}
+        merged.update(headers or {})
+        response, _ = _send(conn, method, path, body, merged)
+        return response
+    finally:
+        conn.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return this process' shared pool."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    max_per_host=getattr(settings, 'HTTP_POOL_MAX_PER_HOST', DEFAULT_MAX_PER_HOST),
+                    timeout=getattr(settings, 'HTTP_POOL_TIMEOUT', DEFAULT_TIMEOUT),
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def _split(url: str) -> Tuple[Origin, str]:
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"unsupported url {url!r}")
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return (parts.scheme, parts.hostname, port), path
+
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    # an idle connection has nothing to read, unless the server closed it
+    if conn.sock is None:
+        return True
+    readable, _, _ = select.select([conn.sock], [], [], 0)
+    return bool(readable)
+
+
+def _send(conn, method, path, body, headers) -> Tuple[Response, bool]:
+    conn.request(method, path, body=body, headers=dict(headers or {}))
+    return _read(conn)
+
+
+def _read(conn) -> Tuple[Response, bool]:
+    raw = conn.getresponse()
+    data = raw.read()
+    response = Response(raw.status, dict(raw.getheaders()), data)
+    return response, not raw.will_close
@@ -0,0 +1,84 @@
+import json
+import platform
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.integrations.services import benchmark_service
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the publish pipeline with synthetic handlers and report throughput, '
+        'latency percentiles and queries per publish as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--integrations', type=int, default=5, help='Synthetic integrations to seed.')
+        parser.add_argument('--targets', type=int, default=200, help='Publish targets to seed and publish.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Threads publishing at once.')
+        parser.add_argument('--latency-ms', type=float, default=50, help='Mean handler latency.')
+        parser.add_argument(
+            '--latency-distribution',
+            choices=benchmark_service.DISTRIBUTIONS,
+            default='fixed',
+            help='How handler latency varies around the mean.',
+        )
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of handler calls that fail.')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for latency and errors.')
+        parser.add_argument('--output', default=None, help='Write the JSON result to this file.')
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the seeded rows instead of deleting them afterwards.',
+        )
+
+    def handle(self, *args, **options):
+        if options['integrations'] < 1 or options['targets'] < 1:
+            raise CommandError('--integrations and --targets must be positive')
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError('--error-rate must be between 0 and 1')
+
+        fixture = benchmark_service.seed(
+            options['integrations'],
+            options['targets'],
+            latency_ms=options['latency_ms'],
+            distribution=options['latency_distribution'],
+            error_rate=options['error_rate'],
+            random_seed=options['seed'],
+        )
+        try:
+            result = benchmark_service.run(fixture, concurrency=options['concurrency'])
+        finally:
+            if not options['keep']:
+                benchmark_service.cleanup(fixture)
+
+        report = {
+            'run_id': fixture.run_id,
+            'finished_at': timezone.now().isoformat(),
+            'parameters': {
+                key: options[key]
+                for key in (
+                    'integrations', 'targets', 'concurrency', 'latency_ms',
+                    'latency_distribution', 'error_rate', 'seed',
+                )
+            },
+            'environment': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'fanout_max_workers': getattr(settings, 'PUBLISH_FANOUT_MAX_WORKERS', None),
+            },
+            'result': result,
+        }
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                fh.write(text + '\n')
+            self.stdout.write(
+                f"{result['publishes']} publishes, {result['throughput_per_second']}/s, "
+                f"p95 {result['latency_ms']['p95']} ms; written to {options['output']}"
+            )
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.integrations.services import (
+    event_service,
+    idempotency_service,
+    outbox_service,
+    retention_service,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete publish logs older than the retention period, optionally archiving them first, '
+        'expired idempotency keys, old publish events and relayed outbox events.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=retention_service.get_retention_days(),
+            help='Keep logs of the last N days.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(
+                settings, 'PUBLISH_LOG_PRUNE_BATCH_SIZE', retention_service.DEFAULT_BATCH_SIZE
+            ),
+            help='Rows deleted per statement.',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=getattr(settings, 'PUBLISH_LOG_ARCHIVE_DIR', '') or None,
+            help='Write pruned logs to a gzipped JSONL file in this directory first.',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        before = retention_service.cutoff(now, options['days'])
+        if retention_service.is_partitioned():
+            # run regularly, so upcoming months always have their partition
+            for name in retention_service.ensure_partitions(now):
+                self.stdout.write(f'created partition {name}')
+
+        archive = None
+        if options['archive_dir']:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            path = os.path.join(
+                options['archive_dir'], f'publish_logs_{now:%Y%m%dT%H%M%S}.jsonl.gz'
+            )
+            archive = retention_service.LogArchive(path)
+
+        if archive is None:
+            removed = retention_service.prune_logs(before, options['batch_size'])
+        else:
+            with archive:
+                removed = retention_service.prune_logs(before, options['batch_size'], archive)
+            self.stdout.write(f'archived {archive.written} logs to {archive.path}')
+        self.stdout.write(f'pruned {removed} publish logs created before {before:%Y-%m-%d %H:%M}')
+        self.stdout.write(f'pruned {idempotency_service.prune()} expired idempotency keys')
+        self.stdout.write(f'pruned {event_service.prune()} old publish events')
+        self.stdout.write(f'pruned {outbox_service.prune()} relayed outbox events')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.integrations.services import dead_letter_service
+
+
+class Command(BaseCommand):
+    help = (
+        'List dead publish targets grouped by integration and error class, '
+        'or requeue them with --requeue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--integration', type=int, help='Only targets of this integration id.')
+        parser.add_argument('--error-class', help='Only targets that failed with this exception class.')
+        parser.add_argument(
+            '--requeue',
+            action='store_true',
+            help='Queue the selected dead targets again.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Allow --requeue without --integration or --error-class.',
+        )
+
+    def handle(self, *args, **options):
+        scope = {
+            'integration_id': options['integration'],
+            'error_class': options['error_class'],
+        }
+        if options['requeue']:
+            if not options['all'] and not any(value is not None for value in scope.values()):
+                raise CommandError('pass --integration and/or --error-class, or --all')
+            requeued = dead_letter_service.requeue(**scope)
+            self.stdout.write(f'requeued {requeued} dead publish targets')
+            return
+
+        groups = dead_letter_service.summary(dead_letter_service.dead_targets(**scope))
+        if not groups:
+            self.stdout.write('no dead publish targets')
+            return
+        for group in groups:
+            self.stdout.write(
+                f"integration {group['integration_id']} ({group['integration__title']}) "
+                f"{group['last_error_class'] or '-'}: {group['count']} targets, "
+                f"last failed {group['last_failed_at']:%Y-%m-%d %H:%M}: {group['last_error']}"
+            )
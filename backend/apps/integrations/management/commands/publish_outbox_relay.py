@@ -0,0 +1,52 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.integrations.services import outbox_service
+
+
+class Command(BaseCommand):
+    help = 'Relay outbox events of note status changes into the publish queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'PUBLISH_OUTBOX_BATCH_SIZE', outbox_service.DEFAULT_BATCH_SIZE),
+            help='Number of events relayed per transaction.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'PUBLISH_OUTBOX_POLL_INTERVAL', 1.0),
+            help='Seconds to sleep when the outbox is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write('publish outbox relay started')
+        relayed = 0
+        while not self._stopping:
+            handled = outbox_service.drain(batch_size)
+            relayed += handled
+            if handled:
+                continue
+            if options['once']:
+                break
+            time.sleep(poll_interval)
+        self.stdout.write(f'publish outbox relay stopped, relayed {relayed} events')
+
+    def _stop(self, signum, frame):
+        self._stopping = True
@@ -0,0 +1,75 @@
+import logging
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.integrations.services import scheduler_service
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Publish scheduled notes and queue scheduled publish targets when they come due.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lookahead',
+            type=int,
+            default=getattr(
+                settings,
+                'PUBLISH_SCHEDULER_LOOKAHEAD_SECONDS',
+                scheduler_service.DEFAULT_LOOKAHEAD_SECONDS,
+            ),
+            help='Seconds of upcoming due times kept in memory.',
+        )
+        parser.add_argument(
+            '--refresh-interval',
+            type=float,
+            default=getattr(settings, 'PUBLISH_SCHEDULER_REFRESH_SECONDS', 5.0),
+            help='Seconds between incremental reloads from the database.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Dispatch everything currently due and exit.',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = scheduler_service.Scheduler(lookahead_seconds=options['lookahead'])
+        refresh_interval = options['refresh_interval']
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write('publish scheduler started')
+        next_refresh = 0.0
+        while not self._stopping:
+            try:
+                if time.monotonic() >= next_refresh:
+                    scheduler.refresh()
+                    next_refresh = time.monotonic() + refresh_interval
+                fired = scheduler.dispatch_due()
+            except Exception:
+                if options['once']:
+                    raise
+                # the items of a failed dispatch are back on the heap
+                logger.exception('publish scheduler tick failed')
+                time.sleep(refresh_interval)
+                continue
+            if fired:
+                self.stdout.write(f'dispatched {fired} scheduled items')
+            if options['once']:
+                break
+            # sleep until the next due item or the next refresh, whichever is first
+            sleep_for = next_refresh - time.monotonic()
+            next_due = scheduler.next_due_at()
+            if next_due is not None:
+                sleep_for = min(sleep_for, (next_due - timezone.now()).total_seconds())
+            time.sleep(max(0.0, min(sleep_for, refresh_interval)))
+        self.stdout.write('publish scheduler stopped')
+
+    def _stop(self, signum, frame):
+        self._stopping = True
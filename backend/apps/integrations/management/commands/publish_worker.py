@@ -0,0 +1,57 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.integrations import registry
+from apps.integrations.services import queue_service
+
+
+class Command(BaseCommand):
+    help = 'Process queued publish targets. Run as many instances as needed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'PUBLISH_WORKER_BATCH_SIZE', queue_service.DEFAULT_BATCH_SIZE),
+            help='Number of targets claimed per batch.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'PUBLISH_WORKER_POLL_INTERVAL', 1.0),
+            help='Seconds to sleep when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit.',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        batch_size = options['batch_size']
+        poll_interval = options['poll_interval']
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        registry.warm()
+        self.stdout.write(f"publish worker {worker_id} started")
+        processed = 0
+        while not self._stopping:
+            handled = queue_service.run_once(worker_id, batch_size)
+            processed += handled
+            if handled:
+                continue
+            if options['once']:
+                break
+            time.sleep(poll_interval)
+        self.stdout.write(f"publish worker {worker_id} stopped, processed {processed} targets")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
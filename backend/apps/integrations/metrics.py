@@ -0,0 +1,107 @@
+"""Prometheus metrics of the publish pipeline, served on ``/api/metrics/``.
+
+Metrics are plain prometheus_client counters and histograms labelled by
+integration code; updating one is an in-process add, cheap enough for the
+publish hot path.
+
+With ``PROMETHEUS_MULTIPROC_DIR`` set, every process (gunicorn workers,
+publish workers, the scheduler) writes its values to mmap'd files in that
+directory and the endpoint merges all of them, so numbers add up across
+processes. Files are named after hostname and pid, so containers sharing the
+directory as a volume don't collide. Without it (runserver, tests) the
+process-local registry is served.
+"""
+import os
+import socket
+from typing import Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    values,
+)
+
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+
+def _process_identifier() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+if os.environ.get(MULTIPROC_DIR_ENV):
+    # must happen before any metric is created
+    values.ValueClass = values.MultiProcessValue(_process_identifier)
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+PUBLISH_ATTEMPTS = Counter(
+    'scrapp_publish_attempts_total', 'Handler calls.', ['integration']
+)
+PUBLISH_SUCCESSES = Counter(
+    'scrapp_publish_successes_total', 'Handler calls that published.', ['integration']
+)
+PUBLISH_FAILURES = Counter(
+    'scrapp_publish_failures_total',
+    'Failed publish attempts, including handlers that could not be loaded.',
+    ['integration'],
+)
+PUBLISH_RETRIES = Counter(
+    'scrapp_publish_retries_scheduled_total',
+    'Failed attempts for which a retry was scheduled.',
+    ['integration'],
+)
+PUBLISH_DEAD_LETTERED = Counter(
+    'scrapp_publish_dead_lettered_total',
+    'Failed attempts after which the target was moved to the dead-letter state.',
+    ['integration'],
+)
+PUBLISH_SHORT_CIRCUITED = Counter(
+    'scrapp_publish_short_circuited_total',
+    'Publishes skipped because the integration circuit was open.',
+    ['integration'],
+)
+PUBLISH_RATE_LIMITED = Counter(
+    'scrapp_publish_rate_limited_total',
+    'Publishes deferred because a rate limit or concurrency cap was reached.',
+    ['integration'],
+)
+HANDLER_LATENCY = Histogram(
+    'scrapp_publish_handler_seconds',
+    'Time spent in handler.publish.',
+    ['integration'],
+    buckets=LATENCY_BUCKETS,
+)
+QUEUE_WAIT = Histogram(
+    'scrapp_publish_queue_wait_seconds',
+    'Time from queueing a target until a worker starts publishing it.',
+    ['integration'],
+    buckets=WAIT_BUCKETS,
+)
+HANDLER_LOADS = Counter(
+    'scrapp_handler_loads_total',
+    'Handler instances created by the registry (cache misses).',
+    ['integration'],
+)
+HANDLER_LOAD_FAILURES = Counter(
+    'scrapp_handler_load_failures_total',
+    'Handlers the registry failed to import or instantiate.',
+    ['integration'],
+)
+
+
+def render(multiproc_dir: Optional[str] = None) -> Tuple[bytes, str]:
+    """Prometheus text exposition of all metrics and its content type."""
+    multiproc_dir = multiproc_dir or os.environ.get(MULTIPROC_DIR_ENV)
+    if multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=multiproc_dir)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
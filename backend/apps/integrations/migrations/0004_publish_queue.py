@@ -0,0 +1,39 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_merge_20260320_1657'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('integrations', '0003_rename_integrat_code_idx_integration_code_466fa6_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishtarget',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publishtarget',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='publishtarget',
+            name='pending_payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='publishtarget',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='publishtarget',
+            index=models.Index(fields=['status', 'queued_at'], name='pt_queue_idx'),
+        ),
+    ]
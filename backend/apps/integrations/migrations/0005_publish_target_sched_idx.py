@@ -0,0 +1,19 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_note_status_sched_idx'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('integrations', '0004_publish_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='publishtarget',
+            index=models.Index(fields=['status', 'scheduled_at'], name='pt_sched_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_note_status_sched_idx'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('integrations', '0005_publish_target_sched_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='integrationdefinition',
+            name='retry_policy',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='publishtarget',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='publishtarget',
+            index=models.Index(condition=models.Q(('status', 'failed')), fields=['next_attempt_at'], name='pt_retry_due_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import zlib
+
+import django.db.models.deletion
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def move_payloads(apps, schema_editor):
+    PublishLog = apps.get_model('integrations', 'PublishLog')
+    PublishPayload = apps.get_model('integrations', 'PublishPayload')
+    logs = PublishLog.objects.only('id', 'request_payload').order_by('pk')
+    batch = []
+    for log in logs.iterator(chunk_size=BATCH_SIZE):
+        batch.append(log)
+        if len(batch) >= BATCH_SIZE:
+            _move_batch(PublishLog, PublishPayload, batch)
+            batch = []
+    if batch:
+        _move_batch(PublishLog, PublishPayload, batch)
+
+
+def _move_batch(PublishLog, PublishPayload, logs):
+    payloads = {}
+    for log in logs:
+        raw = json.dumps(
+            log.request_payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')
+        log.payload_id = hashlib.sha256(raw).hexdigest()
+        payloads.setdefault(
+            log.payload_id,
+            PublishPayload(hash=log.payload_id, data=zlib.compress(raw), size=len(raw)),
+        )
+    PublishPayload.objects.bulk_create(payloads.values(), ignore_conflicts=True)
+    PublishLog.objects.bulk_update(logs, ['payload'])
+
+
+def restore_payloads(apps, schema_editor):
+    PublishLog = apps.get_model('integrations', 'PublishLog')
+    logs = PublishLog.objects.select_related('payload').order_by('pk')
+    batch = []
+    for log in logs.iterator(chunk_size=BATCH_SIZE):
+        log.request_payload = json.loads(zlib.decompress(bytes(log.payload.data)))
+        batch.append(log)
+        if len(batch) >= BATCH_SIZE:
+            PublishLog.objects.bulk_update(batch, ['request_payload'])
+            batch = []
+    if batch:
+        PublishLog.objects.bulk_update(batch, ['request_payload'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0007_rate_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishPayload',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='publishlog',
+            name='payload',
+            field=models.ForeignKey(
+                db_column='payload_hash',
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='logs',
+                to='integrations.publishpayload',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='publishlog',
+            name='request_payload',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(move_payloads, restore_payloads),
+        migrations.RemoveField(
+            model_name='publishlog',
+            name='request_payload',
+        ),
+        migrations.AlterField(
+            model_name='publishlog',
+            name='payload',
+            field=models.ForeignKey(
+                db_column='payload_hash',
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='logs',
+                to='integrations.publishpayload',
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+"""Partition integrations_publishlog by month on Postgres.
+
+The table is rebuilt as ``PARTITION BY RANGE (created_at)`` with one
+partition per month that has rows, the next few months and a default
+partition. Postgres requires the partition key in the primary key, so the
+database key becomes ``(id, created_at)``; ids are uuid4 and stay unique.
+Other backends keep the plain table.
+"""
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+TABLE = 'integrations_publishlog'
+MONTHS_AHEAD = 3
+
+
+def _month(value, months=0):
+    value = value.astimezone(timezone.utc)
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(created_at) FROM "{TABLE}"')
+        oldest = cursor.fetchone()[0]
+    now = datetime.now(timezone.utc)
+    first = _month(oldest or now)
+    last = _month(now, MONTHS_AHEAD)
+
+    execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_old"')
+    execute('DROP INDEX IF EXISTS "pl_target_date_idx"')
+    execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_old" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE (created_at)'
+    )
+    execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "pl_pkey" PRIMARY KEY (id, created_at)')
+    execute(f'CREATE INDEX "pl_target_date_idx" ON "{TABLE}" (publish_target_id, created_at)')
+    execute(f'CREATE INDEX "pl_payload_idx" ON "{TABLE}" (payload_hash)')
+    execute(
+        f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "pl_target_fk" FOREIGN KEY (publish_target_id) '
+        f'REFERENCES "integrations_publishtarget" (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(
+        f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "pl_payload_fk" FOREIGN KEY (payload_hash) '
+        f'REFERENCES "integrations_publishpayload" (hash) DEFERRABLE INITIALLY DEFERRED'
+    )
+    month = first
+    while month <= last:
+        execute(
+            f'CREATE TABLE "{TABLE}_p{month:%Y%m}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+            [month, _month(month, 1)],
+        )
+        month = _month(month, 1)
+    execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+    execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE}_old"')
+    execute(f'DROP TABLE "{TABLE}_old"')
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE}_parted"')
+    execute('ALTER INDEX "pl_target_date_idx" RENAME TO "pl_target_date_idx_parted"')
+    execute(
+        f'CREATE TABLE "{TABLE}" (LIKE "{TABLE}_parted" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id)')
+    execute(f'CREATE INDEX "pl_target_date_idx" ON "{TABLE}" (publish_target_id, created_at)')
+    execute(f'CREATE INDEX "pl_payload_idx" ON "{TABLE}" (payload_hash)')
+    execute(
+        f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY (publish_target_id) '
+        f'REFERENCES "integrations_publishtarget" (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(
+        f'ALTER TABLE "{TABLE}" ADD FOREIGN KEY (payload_hash) '
+        f'REFERENCES "integrations_publishpayload" (hash) DEFERRABLE INITIALLY DEFERRED'
+    )
+    execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE}_parted"')
+    execute(f'DROP TABLE "{TABLE}_parted" CASCADE')
+
+
+class Migration(migrations.Migration):
+    # DDL and the copy run in one transaction; the table is locked meanwhile
+
+    dependencies = [
+        ('integrations', '0008_publish_payloads'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:57
+
+from django.db import migrations
+from django.db.models import Count
+
+# which duplicate survives: the most advanced one, then the oldest
+STATUS_RANK = {'published': 0, 'queued': 1, 'failed': 2, 'draft': 3}
+
+
+def merge_duplicate_targets(apps, schema_editor):
+    PublishTarget = apps.get_model('integrations', 'PublishTarget')
+    PublishLog = apps.get_model('integrations', 'PublishLog')
+    duplicates = (
+        PublishTarget.objects.values('integration_id', 'content_type_id', 'object_id')
+        .annotate(n=Count('pk'))
+        .filter(n__gt=1)
+    )
+    for group in duplicates.iterator():
+        targets = sorted(
+            PublishTarget.objects.filter(
+                integration_id=group['integration_id'],
+                content_type_id=group['content_type_id'],
+                object_id=group['object_id'],
+            ),
+            key=lambda target: (STATUS_RANK.get(target.status, 9), target.created_at),
+        )
+        keep, extra = targets[0], [target.pk for target in targets[1:]]
+        PublishLog.objects.filter(publish_target_id__in=extra).update(publish_target=keep)
+        PublishTarget.objects.filter(pk__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0010_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_targets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # separate from 0011: Postgres can't ALTER a table with pending deferred FK checks
+
+    dependencies = [
+        ('blog', '0012_integration_circuit_breaker'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('integrations', '0011_merge_duplicate_targets'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='publishtarget',
+            constraint=models.UniqueConstraint(fields=('integration', 'content_type', 'object_id'), name='pt_integration_object_uniq'),
+        ),
+    ]
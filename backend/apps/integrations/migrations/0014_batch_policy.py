@@ -0,0 +1,18 @@
+# Generated by Django 6.0.3 on 2026-10-17 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('integrations', '0013_publish_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='integrationdefinition',
+            name='batch_policy',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.3 on 2026-10-17 15:23
+
+from django.db import migrations, models
+
+
+def move_exhausted_to_dead(apps, schema_editor):
+    # failed targets without a scheduled retry were given up on
+    PublishTarget = apps.get_model('integrations', 'PublishTarget')
+    PublishTarget.objects.filter(status='failed', next_attempt_at__isnull=True).update(status='dead')
+
+
+def move_dead_to_failed(apps, schema_editor):
+    PublishTarget = apps.get_model('integrations', 'PublishTarget')
+    PublishTarget.objects.filter(status='dead').update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_integration_circuit_breaker'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('integrations', '0015_outbox_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishtarget',
+            name='last_error_class',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='publishtarget',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('queued', 'Queued'), ('published', 'Published'), ('failed', 'Failed'), ('dead', 'Dead')], db_index=True, default='draft', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='publishtarget',
+            index=models.Index(condition=models.Q(('status', 'dead')), fields=['integration', 'last_error_class'], name='pt_dead_idx'),
+        ),
+        migrations.RunPython(move_exhausted_to_dead, move_dead_to_failed),
+    ]
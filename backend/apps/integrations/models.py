@@ -1,7 +1,12 @@
+import hashlib
+import json
 import uuid
+import zlib
 
+from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -16,6 +21,14 @@ class IntegrationDefinition(models.Model):
     handler_path = models.CharField(max_length=500)
     is_active = models.BooleanField(default=True, db_index=True)
     version = models.CharField(max_length=32, default="1.0")
+    # see services.retry_service.RetryPolicy for the supported keys
+    retry_policy = models.JSONField(default=dict, blank=True)
+    # see services.batch_service.BatchPolicy; empty means no batching
+    batch_policy = models.JSONField(default=dict, blank=True)
+    # provider-wide limits, shared by every user's integration
+    rate_limit_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    rate_limit_burst = models.PositiveIntegerField(null=True, blank=True)
+    max_concurrency = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -36,12 +49,15 @@ class PublishTarget(models.Model):
     STATUS_QUEUED = "queued"
     STATUS_PUBLISHED = "published"
     STATUS_FAILED = "failed"
+    # retries exhausted or not retryable, see services.dead_letter_service
+    STATUS_DEAD = "dead"
 
     STATUS_CHOICES = [
         (STATUS_DRAFT, "Draft"),
         (STATUS_QUEUED, "Queued"),
         (STATUS_PUBLISHED, "Published"),
         (STATUS_FAILED, "Failed"),
+        (STATUS_DEAD, "Dead"),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -59,6 +75,14 @@ class PublishTarget(models.Model):
     last_published_at = models.DateTimeField(null=True, blank=True)
     retry_count = models.IntegerField(default=0)
     last_error = models.TextField(null=True, blank=True)
+    # exception class name of the last failure
+    last_error_class = models.CharField(max_length=100, blank=True, default="")
+    # background queue state, see services.queue_service
+    pending_payload = models.JSONField(null=True, blank=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=100, blank=True, default="")
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     # generic relation
     content_type = models.ForeignKey(
         ContentType, on_delete=models.CASCADE, db_index=True
@@ -73,12 +97,75 @@ class PublishTarget(models.Model):
             models.Index(fields=["content_type", "object_id"]),
             models.Index(fields=["status"]),
             models.Index(fields=["integration"]),
+            models.Index(fields=["status", "queued_at"], name="pt_queue_idx"),
+            models.Index(fields=["status", "scheduled_at"], name="pt_sched_idx"),
+            models.Index(
+                fields=["next_attempt_at"],
+                name="pt_retry_due_idx",
+                condition=models.Q(status="failed"),
+            ),
+            models.Index(
+                fields=["integration", "last_error_class"],
+                name="pt_dead_idx",
+                condition=models.Q(status="dead"),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["integration", "content_type", "object_id"],
+                name="pt_integration_object_uniq",
+            ),
         ]
 
     def __str__(self):
         return f"PublishTarget({self.integration_id}, {self.content_type}, {self.object_id})"
 
 
+class PublishPayloadManager(models.Manager):
+    def store(self, content) -> str:
+        """Save ``content`` unless it is already stored; return its hash.
+
+        Reusing a stored payload moves its ``created_at``, so a concurrent
+        ``retention_service.prune_payloads`` no longer counts it as expired.
+        """
+        raw = PublishPayload.encode(content)
+        digest = hashlib.sha256(raw).hexdigest()
+        # identical payloads of retries and sibling targets hit the conflict
+        self.bulk_create(
+            [PublishPayload(hash=digest, data=zlib.compress(raw), size=len(raw))],
+            update_conflicts=True,
+            update_fields=['created_at'],
+            unique_fields=['hash'],
+        )
+        return digest
+
+
+class PublishPayload(models.Model):
+    """A request payload stored once, zlib-compressed, keyed by its sha256."""
+
+    hash = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    # uncompressed size in bytes
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = PublishPayloadManager()
+
+    @staticmethod
+    def encode(content) -> bytes:
+        # canonical form so equal payloads hash equally
+        return json.dumps(
+            content, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')
+
+    @property
+    def content(self):
+        return json.loads(zlib.decompress(bytes(self.data)))
+
+    def __str__(self):
+        return f"PublishPayload({self.hash[:12]}, {self.size} bytes)"
+
+
 class PublishLog(models.Model):
     STATUS_SUCCESS = "success"
     STATUS_ERROR = "error"
@@ -92,16 +179,137 @@ class PublishLog(models.Model):
     publish_target = models.ForeignKey(
         PublishTarget, on_delete=models.CASCADE, related_name="logs"
     )
-    request_payload = models.JSONField()
+    payload = models.ForeignKey(
+        PublishPayload,
+        on_delete=models.PROTECT,
+        related_name="logs",
+        db_column="payload_hash",
+    )
     response_payload = models.JSONField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     error_message = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        # partitioned by month on Postgres, see migration 0009 and
+        # services.retention_service
         indexes = [
             models.Index(fields=["publish_target", "created_at"], name="pl_target_date_idx"),
         ]
 
+    @property
+    def request_payload(self):
+        return self.payload.content
+
     def __str__(self):
         return f"PublishLog(target={self.publish_target_id}, status={self.status})"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket and in-flight counter shared by all processes.
+
+    Times are epoch seconds so refills can be computed inside a single
+    UPDATE on every database backend.
+    """
+
+    key = models.CharField(max_length=200, unique=True)
+    tokens = models.FloatField()
+    refilled_at = models.FloatField()
+    in_flight = models.PositiveIntegerField(default=0)
+    touched_at = models.FloatField()
+
+    def __str__(self):
+        return f"RateLimitBucket({self.key}, tokens={self.tokens:.2f}, in_flight={self.in_flight})"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an ``Idempotency-Key`` header.
+
+    See services.idempotency_service. ``response_status`` is null while the
+    first request is still being handled.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_user_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"IdempotencyKey({self.user_id}, {self.key})"
+
+
+class PublishEvent(models.Model):
+    """Change feed of publish target transitions and new publish logs.
+
+    Rows are appended by services.event_service and streamed to the owner
+    over ``/api/publish-events/``; the id is the stream cursor.
+    """
+
+    KIND_TARGET = "target"
+    KIND_LOG = "log"
+    KIND_CHOICES = [
+        (KIND_TARGET, "Target"),
+        (KIND_LOG, "Log"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+", db_index=False
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # the published object (e.g. the note) the event is about
+    object_id = models.UUIDField(null=True, blank=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="pe_user_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"PublishEvent({self.id}, {self.kind}, user={self.user_id})"
+
+
+class OutboxEvent(models.Model):
+    """Side effect of a status change, written in the transaction of the change.
+
+    ``manage.py publish_outbox_relay`` (services.outbox_service) drains
+    unprocessed rows in batches, e.g. queueing the publish targets of a note
+    that was published through the API.
+    """
+
+    TOPIC_NOTE_PUBLISHED = "note.published"
+    TOPIC_CHOICES = [
+        (TOPIC_NOTE_PUBLISHED, "Note published"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50, choices=TOPIC_CHOICES)
+    object_id = models.UUIDField()
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="oe_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"OutboxEvent({self.id}, {self.topic}, {self.object_id})"
@@ -1,51 +1,176 @@
 import logging
+import threading
+from asgiref.sync import async_to_sync, sync_to_async
 from django.utils.module_loading import import_string
-from typing import Any, Dict, Type
+from typing import Any, Dict, Optional, Tuple, Type
+
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
+# handlers registered explicitly in code take precedence over handler_path
 _registry: Dict[str, Type[Any]] = { }
+# code -> (version, handler_path) of known definitions
+_definitions: Dict[str, Tuple[str, str]] = {}
+# (code, version) -> shared handler instance
+_instances: Dict[Tuple[str, str], Any] = {}
+_warm = False
+_lock = threading.RLock()
+
+REGISTERED_VERSION = '__registered__'
 
 
 def register(code: str, handler_cls: Type[Any]) -> None:
     """Register a handler class under a given integration code."""
-    if code in _registry:
-        logger.warning("overwriting handler for code %s", code)
-    _registry[code] = handler_cls
+    with _lock:
+        if code in _registry:
+            logger.warning("overwriting handler for code %s", code)
+        _registry[code] = handler_cls
+        _drop_instances(code)
+
+
+def warm() -> None:
+    """Load every active definition with a single query and import its handler.
+
+    Called when a process starts serving (``config.asgi``/``config.wsgi``,
+    ``publish_worker``), so the first publish pays no import cost. A handler
+    that fails to import is logged and left to fail on use.
+    """
+    global _warm
+    from .models import IntegrationDefinition
+
+    rows = list(IntegrationDefinition.objects.filter(is_active=True).values_list(
+        'code', 'version', 'handler_path'
+    ))
+    with _lock:
+        for code, version, path in rows:
+            _remember(code, version, path)
+        _warm = True
+    for code, version, path in rows:
+        if code in _registry:
+            continue
+        try:
+            _instance(code, version, lambda path=path: import_string(path))
+        except Exception as exc:
+            logger.warning("failed to load handler %s for %s: %s", path, code, exc)
+
 
+def invalidate(code: Optional[str] = None) -> None:
+    """Forget cached definitions and handlers, for one code or all of them."""
+    global _warm
+    with _lock:
+        if code is None:
+            _definitions.clear()
+            _instances.clear()
+            _warm = False
+            return
+        _definitions.pop(code, None)
+        _drop_instances(code)
 
-def get_handler(code: str) -> Any:
-    """Return an instance of handler for the given code.
 
-    The handler_path is resolved only once and cached.
+def get_handler(code: str, definition: Any = None) -> Any:
+    """Return the shared handler instance for the given code.
+
+    Pass the already loaded ``definition`` when available: the handler is then
+    resolved without touching the database, and a changed ``version`` or
+    ``handler_path`` saved by another process is picked up immediately.
+    Handler instances are reused across calls and threads, so handlers must
+    not keep per-publish state on ``self``.
     """
     handler_cls = _registry.get(code)
     if handler_cls is not None:
-        return handler_cls()
+        return _instance(code, REGISTERED_VERSION, lambda: handler_cls)
+
+    if definition is not None:
+        version, path = definition.version, definition.handler_path
+        with _lock:
+            _remember(code, version, path)
+    else:
+        version, path = _resolve(code)
+
+    def load() -> Type[Any]:
+        try:
+            return import_string(path)
+        except ImportError as exc:
+            logger.error("failed to import handler %s: %s", path, exc)
+            raise
 
-    # dynamic import using handler_path from definition
+    return _instance(code, version, load)
+
+
+def _resolve(code: str) -> Tuple[str, str]:
+    if not _warm:
+        warm()
+    entry = _definitions.get(code)
+    if entry is not None:
+        return entry
+
+    # not active at warm-up time or created afterwards
     from .models import IntegrationDefinition
 
     try:
         definition = IntegrationDefinition.objects.get(code=code)
     except IntegrationDefinition.DoesNotExist:
         raise LookupError(f"no integration definition with code {code}")
+    with _lock:
+        _remember(code, definition.version, definition.handler_path)
+    return definition.version, definition.handler_path
+
+
+def _instance(code: str, version: str, load) -> Any:
+    key = (code, version)
+    handler = _instances.get(key)
+    if handler is not None:
+        return handler
+    with _lock:
+        handler = _instances.get(key)
+        if handler is None:
+            try:
+                handler = load()()
+            except Exception:
+                metrics.HANDLER_LOAD_FAILURES.labels(code).inc()
+                raise
+            metrics.HANDLER_LOADS.labels(code).inc()
+            _instances[key] = handler
+        return handler
 
-    path = definition.handler_path
-    try:
-        cls = import_string(path)
-    except ImportError as exc:
-        logger.error("failed to import handler %s: %s", path, exc)
-        raise
 
-    register(code, cls)
-    return cls()
+def _remember(code: str, version: str, path: str) -> None:
+    previous = _definitions.get(code)
+    if previous == (version, path):
+        return
+    _definitions[code] = (version, path)
+    if previous is not None:
+        _drop_instances(code)
+
+
+def _drop_instances(code: str) -> None:
+    for key in [key for key in _instances if key[0] == code]:
+        del _instances[key]
 
 
 class BaseIntegrationHandler:
+    """Handlers implement ``publish``, ``apublish`` or both.
+
+    Whichever one is missing is derived from the other, so sync callers
+    (workers, fan-out threads) and async callers can use any handler.
+    Handlers may also implement ``publish_batch``, see
+    ``services.batch_service``.
+    """
+
     def publish(self, integration, publish_target, content: dict):
         """Perform the actual publish operation.
 
-        Must be implemented by subclasses.
+        Must be implemented by subclasses unless they implement ``apublish``.
         """
-        raise NotImplementedError
+        if type(self).apublish is BaseIntegrationHandler.apublish:
+            raise NotImplementedError
+        return async_to_sync(self.apublish)(integration, publish_target, content)
+
+    async def apublish(self, integration, publish_target, content: dict):
+        """Async variant of ``publish``; by default runs it in a worker thread."""
+        if type(self).publish is BaseIntegrationHandler.publish:
+            raise NotImplementedError
+        return await sync_to_async(self.publish, thread_sensitive=False)(
+            integration, publish_target, content
+        )
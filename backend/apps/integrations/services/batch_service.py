@@ -0,0 +1,54 @@
+"""Coalescing of queued targets into batched handler calls.
+
+Handlers that implement ``publish_batch(integration, items)`` can receive
+several targets of one Integration in a single call (e.g. one webhook
+request). ``items`` is a list of (target, content) pairs and the handler
+returns one entry per item, in order: the result to log, or an exception
+instance for an item that failed.
+
+Batching is enabled through the IntegrationDefinition's ``batch_policy``
+JSON, which an Integration may override with ``config["batch"]``::
+
+    {
+        "max_size": 50,         # targets per call
+        "window_seconds": 2     # how long the oldest target may wait for more
+    }
+
+The publish worker claims the queued targets of such an integration
+together and holds them until ``max_size`` are queued or the oldest one has
+waited ``window_seconds``.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from apps.integrations import registry
+
+
+@dataclass(frozen=True)
+class BatchPolicy:
+    max_size: int = 1
+    window_seconds: float = 0.0
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> 'BatchPolicy':
+        known = {key: raw[key] for key in cls.__dataclass_fields__ if key in raw}
+        return cls(**known)
+
+
+def policy_for(integration) -> Optional[BatchPolicy]:
+    """The integration's batch policy, or None when it publishes one target per call."""
+    definition = integration.definition
+    raw = {**(definition.batch_policy or {}), **((integration.config or {}).get('batch') or {})}
+    if not raw:
+        return None
+    policy = BatchPolicy.from_dict(raw)
+    if policy.max_size <= 1:
+        return None
+    try:
+        handler = registry.get_handler(definition.code, definition=definition)
+    except Exception:
+        # publish_target records the load failure
+        return None
+    if not callable(getattr(handler, 'publish_batch', None)):
+        return None
+    return policy
@@ -0,0 +1,218 @@
+"""Load test of the publish pipeline with synthetic handlers.
+
+``seed`` creates a throwaway user with N integrations and M publish targets
+whose handler, registered through ``registry.register``, only sleeps and
+fails at random. ``run`` then publishes every target through
+``publish_service.publish_target`` from a pool of threads, timing each call
+and counting its database queries, and ``cleanup`` deletes all of it again.
+
+Synthetic definitions never retry, so a real worker sharing the database
+won't pick up their failed targets.
+"""
+import logging
+import math
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.integrations import registry
+from apps.integrations.models import IntegrationDefinition, PublishTarget
+from apps.integrations.services import publish_service
+from blog.models import Blog, Integration, Note
+
+logger = logging.getLogger(__name__)
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'exponential')
+CODE_PREFIX = 'bench-'
+CONTENT = {'title': 'Benchmark', 'html': '<p>benchmark</p>', 'markdown': 'benchmark'}
+
+_rng = random.Random()
+
+
+class SyntheticError(Exception):
+    pass
+
+
+class SyntheticHandler:
+    """Sleeps and fails as configured in ``integration.config``.
+
+    ``latency_ms`` is the mean delay; with the ``uniform`` distribution the
+    delay is drawn from [0, 2 * mean], with ``exponential`` from an
+    exponential distribution. ``error_rate`` is the share of calls raising.
+    """
+
+    def publish(self, integration, publish_target, content):
+        config = integration.config
+        time.sleep(sample_latency(config.get('latency_distribution', 'fixed'),
+                                  config.get('latency_ms', 0)) / 1000)
+        if _rng.random() < config.get('error_rate', 0):
+            raise SyntheticError('synthetic failure')
+        return {'ok': True}
+
+
+def sample_latency(distribution: str, mean_ms: float) -> float:
+    if mean_ms <= 0:
+        return 0.0
+    if distribution == 'uniform':
+        return _rng.uniform(0, 2 * mean_ms)
+    if distribution == 'exponential':
+        return _rng.expovariate(1 / mean_ms)
+    return float(mean_ms)
+
+
+@dataclass
+class Fixture:
+    run_id: str
+    user: Any
+    definitions: List[IntegrationDefinition]
+    target_ids: List[Any] = field(default_factory=list)
+
+
+def seed(
+    integrations: int,
+    targets: int,
+    latency_ms: float = 50,
+    distribution: str = 'fixed',
+    error_rate: float = 0.0,
+    random_seed: Optional[int] = None,
+) -> Fixture:
+    """Create ``integrations`` synthetic integrations and ``targets`` targets spread over them."""
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f'unknown latency distribution {distribution}')
+    if random_seed is not None:
+        _rng.seed(random_seed)
+    run_id = uuid.uuid4().hex[:12]
+    config = {
+        'latency_ms': latency_ms,
+        'latency_distribution': distribution,
+        'error_rate': error_rate,
+    }
+    with transaction.atomic():
+        user = get_user_model().objects.create_user(
+            username=f'{CODE_PREFIX}{run_id}', password=None
+        )
+        blog = Blog.objects.create(owner=user, title=f'Benchmark {run_id}')
+        definitions = []
+        integration_rows = []
+        for i in range(integrations):
+            code = f'{CODE_PREFIX}{run_id}-{i}'
+            definition = IntegrationDefinition.objects.create(
+                code=code,
+                name=code,
+                category='benchmark',
+                config_schema={'type': 'object'},
+                handler_path=f'{__name__}.SyntheticHandler',
+                retry_policy={'max_attempts': 1},
+            )
+            registry.register(code, SyntheticHandler)
+            definitions.append(definition)
+            integration_rows.append(Integration.objects.create(
+                owner=user,
+                definition=definition,
+                name=code,
+                title=code,
+                provider='telegram',
+                config=config,
+            ))
+
+        notes = Note.objects.bulk_create(
+            Note(blog=blog, title=f'n{i}')
+            for i in range(math.ceil(targets / max(integrations, 1)))
+        )
+        content_type = ContentType.objects.get_for_model(Note)
+        created = PublishTarget.objects.bulk_create(
+            PublishTarget(
+                integration=integration_rows[i % integrations],
+                content_type=content_type,
+                object_id=notes[i // integrations].uuid,
+            )
+            for i in range(targets)
+        )
+    return Fixture(run_id, user, definitions, [target.pk for target in created])
+
+
+def run(fixture: Fixture, concurrency: int = 1) -> Dict[str, Any]:
+    """Publish every seeded target once and summarize the run."""
+    targets = list(
+        PublishTarget.objects.filter(pk__in=fixture.target_ids)
+        .select_related('integration__definition')
+    )
+    started = time.perf_counter()
+    if concurrency <= 1:
+        samples = [_publish(target) for target in targets]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bench') as executor:
+            samples = list(executor.map(_publish_in_thread, targets))
+    elapsed = time.perf_counter() - started
+
+    statuses: Dict[str, int] = {}
+    for target in targets:
+        statuses[target.status] = statuses.get(target.status, 0) + 1
+    return {
+        'publishes': len(samples),
+        'concurrency': concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(len(samples) / elapsed, 2) if elapsed else None,
+        'statuses': statuses,
+        'latency_ms': _summary([sample['ms'] for sample in samples]),
+        'queries_per_publish': _summary([sample['queries'] for sample in samples]),
+    }
+
+
+def _publish_in_thread(target: PublishTarget) -> Dict[str, float]:
+    close_old_connections()
+    try:
+        return _publish(target)
+    finally:
+        close_old_connections()
+
+
+def _publish(target: PublishTarget) -> Dict[str, float]:
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        try:
+            publish_service.publish_target(target, CONTENT)
+        except Exception:
+            logger.exception("benchmark publish of target %s raised", target.pk)
+        ms = (time.perf_counter() - started) * 1000
+    return {'ms': ms, 'queries': len(queries)}
+
+
+def _summary(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    return {
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def cleanup(fixture: Fixture) -> None:
+    """Delete everything ``seed`` created, logs included."""
+    codes = [definition.code for definition in fixture.definitions]
+    with transaction.atomic():
+        integrations = Integration.objects.filter(owner=fixture.user)
+        PublishTarget.objects.filter(integration__in=integrations).delete()
+        integrations.delete()
+        Note.objects.filter(blog__owner=fixture.user).delete()
+        Blog.objects.filter(owner=fixture.user).delete()
+        IntegrationDefinition.objects.filter(code__in=codes).delete()
+        fixture.user.delete()
@@ -0,0 +1,63 @@
+"""Cached API responses of the integration definitions catalogue.
+
+Definitions change on deploys only, yet every client loads the catalogue
+with its large ``config_schema``/``publish_schema`` documents. Rendered
+responses are kept in the Django cache under a catalogue version, a random
+token stored in the cache itself. Saving or deleting an
+``IntegrationDefinition`` and running migrations bump it (see signals), so
+every process switches to fresh entries at once and stale ones expire.
+The key also carries the version the view reads for its ETag (see
+``blog.conditional``), so rows written without model signals are not served
+stale once their ``updated_at`` moves.
+
+The cache is shared by all processes only when the configured backend is
+(the database cache with Postgres, see settings).
+"""
+import hashlib
+import uuid
+from typing import Any, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_CACHE_TIMEOUT = 3600
+CACHE_PREFIX = 'integration-catalogue:v2'
+VERSION_KEY = f'{CACHE_PREFIX}:version'
+
+
+def get_cache_timeout() -> int:
+    return int(getattr(settings, 'INTEGRATION_CATALOGUE_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+
+
+def version() -> str:
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # evicted or never set; add() lets concurrent processes agree on one token
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def bump() -> None:
+    """Start a new catalogue version, every cached response is dropped."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def response_key(
+    path: str,
+    media_type: str,
+    params: Sequence[Tuple[str, str]],
+    resource_version: Sequence[Any],
+) -> str:
+    parts = [media_type, path, repr(tuple(params)), repr(tuple(resource_version))]
+    digest = hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+    return f'{CACHE_PREFIX}:{version()}:{digest}'
+
+
+def get_response(key: str) -> Optional[Tuple[bytes, str]]:
+    """``(content, content_type)`` stored under ``key``."""
+    return cache.get(key)
+
+
+def store_response(key: str, content: bytes, content_type: str) -> None:
+    cache.set(key, (content, content_type), get_cache_timeout())
@@ -0,0 +1,127 @@
+"""Per-integration circuit breaker.
+
+Consecutive handler failures are counted on the Integration row. Once
+``CIRCUIT_BREAKER_FAILURE_THRESHOLD`` is reached the circuit opens: the
+integration goes to ``STATUS_ERROR`` and publishes are short-circuited
+without calling the handler. After ``CIRCUIT_BREAKER_COOLDOWN_SECONDS`` a
+single caller is let through as a probe (half-open); its success closes the
+circuit again, its failure restarts the cooldown.
+
+All transitions are conditional UPDATEs, so concurrent workers agree on
+who trips the circuit and who gets to probe.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from blog.models import Integration
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN_SECONDS = 300
+
+
+class CircuitOpen(Exception):
+    """The integration is failing, publishes are not attempted."""
+
+    def __init__(self, integration: Integration, retry_at: datetime):
+        super().__init__(
+            f"integration is in error state: {integration.last_error or 'too many failures'}"
+        )
+        self.retry_at = retry_at
+
+
+def get_failure_threshold() -> int:
+    return int(getattr(settings, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD))
+
+
+def get_cooldown() -> timedelta:
+    return timedelta(
+        seconds=getattr(settings, 'CIRCUIT_BREAKER_COOLDOWN_SECONDS', DEFAULT_COOLDOWN_SECONDS)
+    )
+
+
+def before_call(integration: Integration, now: Optional[datetime] = None) -> None:
+    """Raise CircuitOpen unless the handler may be called.
+
+    Costs no query while the circuit is closed.
+    """
+    if integration.status != Integration.STATUS_ERROR:
+        return
+    now = now or timezone.now()
+    opened_at = integration.circuit_opened_at
+    if opened_at is not None and opened_at + get_cooldown() > now:
+        raise CircuitOpen(integration, opened_at + get_cooldown())
+    # half-open: whoever moves circuit_opened_at forward is the probe
+    probe = Integration.objects.filter(
+        pk=integration.pk,
+        status=Integration.STATUS_ERROR,
+        circuit_opened_at=opened_at,
+    ).update(circuit_opened_at=now)
+    integration.circuit_opened_at = now
+    if not probe:
+        raise CircuitOpen(integration, now + get_cooldown())
+    logger.info("probing integration %s after cooldown", integration.pk)
+
+
+def record_success(integration: Integration) -> None:
+    # ``integration`` was loaded at claim time, other workers may have counted
+    # failures or opened the circuit since: only the row is trusted
+    if _close(integration, status=Integration.STATUS_ERROR):
+        logger.info("integration %s recovered, circuit closed", integration.pk)
+        return
+    Integration.objects.filter(pk=integration.pk, consecutive_failures__gt=0).update(
+        consecutive_failures=0
+    )
+    integration.consecutive_failures = 0
+
+
+def record_failure(integration: Integration, exc: BaseException, now: Optional[datetime] = None) -> None:
+    now = now or timezone.now()
+    Integration.objects.filter(pk=integration.pk).update(
+        consecutive_failures=F('consecutive_failures') + 1
+    )
+    tripped = Integration.objects.filter(
+        pk=integration.pk,
+        status=Integration.STATUS_ACTIVE,
+        consecutive_failures__gte=get_failure_threshold(),
+    ).update(
+        status=Integration.STATUS_ERROR,
+        circuit_opened_at=now,
+        last_error=str(exc),
+        updated_at=now,
+    )
+    integration.consecutive_failures += 1
+    if tripped:
+        logger.warning("integration %s failing, circuit opened: %s", integration.pk, exc)
+        integration.status = Integration.STATUS_ERROR
+        integration.circuit_opened_at = now
+        integration.last_error = str(exc)
+
+
+def reset(integration: Integration) -> None:
+    """Close the circuit, e.g. after the user updated the credentials."""
+    _close(integration)
+
+
+def _close(integration: Integration, **conditions) -> int:
+    conditions.setdefault('status__in', (Integration.STATUS_ACTIVE, Integration.STATUS_ERROR))
+    closed = Integration.objects.filter(pk=integration.pk, **conditions).update(
+        status=Integration.STATUS_ACTIVE,
+        consecutive_failures=0,
+        circuit_opened_at=None,
+        last_error=None,
+        updated_at=timezone.now(),
+    )
+    if closed:
+        if integration.status == Integration.STATUS_ERROR:
+            integration.status = Integration.STATUS_ACTIVE
+        integration.consecutive_failures = 0
+        integration.circuit_opened_at = None
+        integration.last_error = None
+    return closed
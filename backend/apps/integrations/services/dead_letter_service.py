@@ -0,0 +1,84 @@
+"""Dead-letter state of publish targets that were given up on.
+
+A failed attempt without a scheduled retry (the retry policy is exhausted,
+the error is not retryable or the handler can't be loaded) moves the target
+to ``dead`` instead of ``failed``. Dead targets are kept out of the retry
+sweep and the note-level queueing, and are indexed by integration and
+``last_error_class`` (``pt_dead_idx``) for inspection.
+
+Once the cause is fixed, e.g. the user updated their credentials,
+``requeue`` moves the dead targets of an integration and/or error class back
+to the queue with a single UPDATE. Requeued targets start a fresh retry
+budget.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, QuerySet
+from django.utils import timezone
+
+from apps.integrations.models import PublishTarget
+from apps.integrations.services import event_service
+
+
+def dead_targets(
+    owner: Any = None, integration_id: Optional[Any] = None, error_class: Optional[str] = None
+) -> QuerySet[PublishTarget]:
+    return _scoped(owner, integration_id, error_class).filter(status=PublishTarget.STATUS_DEAD)
+
+
+def _scoped(owner: Any, integration_id: Optional[Any], error_class: Optional[str]) -> QuerySet[PublishTarget]:
+    targets = PublishTarget.objects.all()
+    if owner is not None:
+        targets = targets.filter(integration__owner=owner)
+    if integration_id is not None:
+        targets = targets.filter(integration_id=integration_id)
+    if error_class is not None:
+        targets = targets.filter(last_error_class=error_class)
+    return targets
+
+
+def summary(targets: QuerySet[PublishTarget]) -> List[Dict[str, Any]]:
+    """Dead targets counted per (integration, error class), largest groups first."""
+    return list(
+        targets.values('integration_id', 'integration__title', 'last_error_class')
+        .annotate(
+            count=Count('pk'),
+            first_failed_at=Min('updated_at'),
+            last_failed_at=Max('updated_at'),
+            last_error=Max('last_error'),
+        )
+        .order_by('-count', 'integration_id', 'last_error_class')
+    )
+
+
+def requeue(
+    owner: Any = None,
+    integration_id: Optional[Any] = None,
+    error_class: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """Move the enabled dead targets in scope back to the queue.
+
+    Returns the number of rows requeued. The queued payload is the one the
+    target failed with.
+    """
+    now = now or timezone.now()
+    scope = _scoped(owner, integration_id, error_class)
+    with transaction.atomic():
+        requeued = scope.filter(status=PublishTarget.STATUS_DEAD, is_enabled=True).update(
+            status=PublishTarget.STATUS_QUEUED,
+            retry_count=0,
+            queued_at=now,
+            next_attempt_at=None,
+            claimed_at=None,
+            claimed_by='',
+            updated_at=now,
+        )
+        if requeued:
+            # queued_at identifies the rows of this UPDATE
+            event_service.record_targets(
+                scope.filter(status=PublishTarget.STATUS_QUEUED, queued_at=now).values_list('pk', flat=True)
+            )
+    return requeued
@@ -0,0 +1,208 @@
+"""Change feed of publish status, streamed to editors over server-sent events.
+
+Every PublishTarget transition and every new PublishLog appends a
+``PublishEvent`` row for the owner of the integration, in the transaction
+that made the change. Streams read the rows after their last event id, so a
+reconnecting client (``Last-Event-ID``) misses nothing.
+
+To wake streams up, Postgres gets a ``NOTIFY`` with the user id, delivered
+on commit. Each ASGI process keeps a single ``LISTEN`` connection and wakes
+the streams of that user, which only query after a notify. Other databases
+fall back to polling every ``PUBLISH_EVENTS_POLL_INTERVAL`` seconds.
+"""
+import asyncio
+import logging
+import weakref
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+from apps.integrations.models import PublishEvent, PublishLog, PublishTarget
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'scrapp_publish_events'
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_RETENTION_HOURS = 24
+FETCH_LIMIT = 100
+RECONNECT_DELAY = 5.0
+DEFAULT_TICKET_SECONDS = 60
+TICKET_SALT = 'publish-events-ticket'
+
+
+def get_poll_interval() -> float:
+    return float(getattr(settings, 'PUBLISH_EVENTS_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+
+
+def issue_ticket(user_id: int) -> str:
+    """Short-lived credential for ``?ticket=`` of one stream request.
+
+    ``EventSource`` can't send headers; a ticket in the URL may end up in
+    access logs, but unlike the access token it is only good for opening a
+    stream, and only for ``PUBLISH_EVENTS_TICKET_SECONDS``.
+    """
+    return signing.dumps(user_id, salt=TICKET_SALT)
+
+
+def ticket_user_id(ticket: str) -> Optional[int]:
+    max_age = getattr(settings, 'PUBLISH_EVENTS_TICKET_SECONDS', DEFAULT_TICKET_SECONDS)
+    try:
+        return int(signing.loads(ticket, salt=TICKET_SALT, max_age=max_age))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def target_data(target: PublishTarget) -> Dict[str, Any]:
+    return {
+        'id': str(target.pk),
+        'object_id': str(target.object_id),
+        'integration_id': target.integration_id,
+        'status': target.status,
+        'last_error': target.last_error or '',
+        'last_published_at': target.last_published_at,
+        'next_attempt_at': target.next_attempt_at,
+    }
+
+
+def record_target(target: PublishTarget) -> None:
+    """Append the current state of ``target`` after a transition."""
+    _append([PublishEvent(
+        user_id=target.integration.owner_id,
+        kind=PublishEvent.KIND_TARGET,
+        object_id=target.object_id,
+        data=target_data(target),
+    )])
+
+
+def record_targets(pks: Iterable[Any]) -> None:
+    """Append the current state of several targets changed by one UPDATE."""
+    targets = PublishTarget.objects.filter(pk__in=list(pks)).select_related('integration').only(
+        'pk', 'object_id', 'integration__owner_id', 'status', 'last_error',
+        'last_published_at', 'next_attempt_at',
+    )
+    _append([
+        PublishEvent(
+            user_id=target.integration.owner_id,
+            kind=PublishEvent.KIND_TARGET,
+            object_id=target.object_id,
+            data=target_data(target),
+        )
+        for target in targets
+    ])
+
+
+def record_log(log: PublishLog) -> None:
+    target = log.publish_target
+    _append([PublishEvent(
+        user_id=target.integration.owner_id,
+        kind=PublishEvent.KIND_LOG,
+        object_id=target.object_id,
+        data={
+            'id': str(log.pk),
+            'publish_target': str(target.pk),
+            'status': log.status,
+            'error_message': log.error_message,
+            'created_at': log.created_at,
+        },
+    )])
+
+
+def _append(events: List[PublishEvent]) -> None:
+    if not events:
+        return
+    PublishEvent.objects.bulk_create(events)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for user_id in {event.user_id for event in events}:
+                cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, str(user_id)])
+
+
+def latest_id(user_id: int) -> int:
+    return PublishEvent.objects.filter(user_id=user_id).order_by('-id').values_list(
+        'id', flat=True
+    ).first() or 0
+
+
+def events_after(user_id: int, last_id: int, object_id: Optional[str] = None) -> List[PublishEvent]:
+    events = PublishEvent.objects.filter(user_id=user_id, id__gt=last_id)
+    if object_id:
+        events = events.filter(object_id=object_id)
+    return list(events.order_by('id')[:FETCH_LIMIT])
+
+
+def prune(before: Optional[datetime] = None) -> int:
+    """Delete events older than ``PUBLISH_EVENTS_RETENTION_HOURS``."""
+    hours = getattr(settings, 'PUBLISH_EVENTS_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)
+    before = before or timezone.now() - timedelta(hours=hours)
+    return PublishEvent.objects.filter(created_at__lt=before).delete()[0]
+
+
+class Listener:
+    """Per-process ``LISTEN`` connection waking the streams of notified users."""
+
+    def __init__(self):
+        self._waiters: Dict[int, Set[asyncio.Event]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+        # False: nothing sets the waiters, streams have to poll
+        self.notifies = connection.vendor == 'postgresql'
+
+    def subscribe(self, user_id: int) -> asyncio.Event:
+        if self.notifies and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        waiter = asyncio.Event()
+        self._waiters[user_id].add(waiter)
+        return waiter
+
+    def unsubscribe(self, user_id: int, waiter: asyncio.Event) -> None:
+        waiters = self._waiters.get(user_id)
+        if waiters is not None:
+            waiters.discard(waiter)
+            if not waiters:
+                del self._waiters[user_id]
+
+    async def _listen(self) -> None:
+        import psycopg
+
+        params = settings.DATABASES['default']
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    dbname=params['NAME'],
+                    user=params.get('USER') or None,
+                    password=params.get('PASSWORD') or None,
+                    host=params.get('HOST') or None,
+                    port=params.get('PORT') or None,
+                    autocommit=True,
+                ) as conn:
+                    await conn.execute(f'LISTEN {CHANNEL}')
+                    # notifies sent while (re)connecting are lost, let every stream catch up
+                    self._wake_all()
+                    async for notify in conn.notifies():
+                        for waiter in self._waiters.get(int(notify.payload), ()):
+                            waiter.set()
+            except Exception:
+                logger.exception("publish event listener failed, reconnecting")
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    def _wake_all(self) -> None:
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                waiter.set()
+
+
+_listeners: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Listener]' = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_listener() -> Listener:
+    loop = asyncio.get_running_loop()
+    listener = _listeners.get(loop)
+    if listener is None:
+        listener = _listeners[loop] = Listener()
+    return listener
@@ -0,0 +1,110 @@
+"""``Idempotency-Key`` support for non-idempotent API actions.
+
+The first request with a given key (per user) runs and its response is
+stored. Repeating it with the same key and body replays the stored
+response instead of running the action again. While the first request is
+still running, a repeat gets 409; reusing a key for a different request
+gets 422. Server errors are not stored, so the client may retry them.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from apps.integrations.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL_HOURS = 24
+# a first request running longer than this is presumed dead
+IN_PROGRESS_TIMEOUT = timedelta(minutes=5)
+
+
+def get_ttl() -> timedelta:
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', DEFAULT_TTL_HOURS))
+
+
+def idempotent_response(request: Request, scope: str, action: Callable[[], Response]) -> Response:
+    """Run ``action`` at most once per ``Idempotency-Key`` of the request.
+
+    ``scope`` names what the request acts on (e.g. ``publish-target:<pk>``),
+    so one key can't be replayed against another object.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return action()
+    if len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    fingerprint = request_hash(request, scope)
+    record, created = _claim(request.user, key, fingerprint)
+    if not created:
+        if record.request_hash != fingerprint:
+            return Response(
+                {'detail': f'{HEADER} was already used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if record.response_status is None:
+            return Response(
+                {'detail': f'A request with this {HEADER} is still in progress.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        response = Response(record.response_body, status=record.response_status)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    try:
+        response = action()
+    except Exception:
+        record.delete()
+        raise
+    if response.status_code >= 500:
+        record.delete()
+    else:
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            response_status=response.status_code, response_body=response.data
+        )
+    return response
+
+
+def request_hash(request: Request, scope: str) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {scope} {body}'.encode('utf-8')).hexdigest()
+
+
+def _claim(user, key: str, fingerprint: str):
+    now = timezone.now()
+    record, created = IdempotencyKey.objects.get_or_create(
+        user=user, key=key, defaults={'request_hash': fingerprint}
+    )
+    if created:
+        return record, True
+    # expired keys and first requests that died are taken over, by one caller only
+    takeover = IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).filter(
+        Q(created_at__lt=now - get_ttl())
+        | Q(response_status__isnull=True, created_at__lt=now - IN_PROGRESS_TIMEOUT)
+    ).update(created_at=now, request_hash=fingerprint, response_status=None, response_body=None)
+    if takeover:
+        record.request_hash = fingerprint
+        record.response_status = None
+        return record, True
+    return record, False
+
+
+def prune(before: Optional[datetime] = None) -> int:
+    """Delete keys older than their time to live."""
+    before = before or timezone.now() - get_ttl()
+    return IdempotencyKey.objects.filter(created_at__lt=before).delete()[0]
@@ -0,0 +1,218 @@
+"""Run handler calls in a supervised pool of worker processes.
+
+With ``PUBLISH_HANDLER_ISOLATION = 'process'`` every ``handler.publish``
+runs in a separate process instead of the calling gunicorn or worker
+thread, so a handler that hangs, leaks memory or crashes the interpreter
+can't take the API down with it:
+
+* a call running longer than ``PUBLISH_HANDLER_TIMEOUT`` seconds is killed
+  together with its process and raises :class:`HandlerTimeout`;
+* a process that dies mid-call raises :class:`HandlerCrashed`;
+* a process is replaced after ``PUBLISH_HANDLER_MAX_TASKS`` calls or once
+  its peak RSS exceeds ``PUBLISH_HANDLER_MAX_MEMORY_MB``.
+
+Both errors are retryable and end up in the PublishLog like any other
+handler failure. Processes are started with ``spawn`` (forking a threaded
+gunicorn worker isn't safe) and lazily, so the pool costs nothing until the
+first call. The handler class, integration, target and content are pickled
+to the process: handlers must be importable module-level classes, and
+changes they make to the passed objects don't reach the caller.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Any, Optional, Tuple
+
+from django.conf import settings
+
+from apps.integrations.exceptions import HandlerCrashed, HandlerTimeout, PublishError
+
+logger = logging.getLogger(__name__)
+
+MODE_THREAD = 'thread'
+MODE_PROCESS = 'process'
+DEFAULT_PROCESSES = 4
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_TASKS = 500
+DEFAULT_MAX_MEMORY_MB = 512
+# django.setup() in a fresh process
+STARTUP_TIMEOUT = 60.0
+
+_pool: Optional['HandlerPool'] = None
+_pool_lock = threading.Lock()
+
+
+def get_mode() -> str:
+    return getattr(settings, 'PUBLISH_HANDLER_ISOLATION', MODE_THREAD)
+
+
+def call(handler: Any, integration, publish_target, content: dict) -> Any:
+    """``handler.publish(...)``, in the pool when process isolation is on."""
+    if get_mode() != MODE_PROCESS:
+        return handler.publish(integration, publish_target, content)
+    return get_pool().call(type(handler), (integration, publish_target, content))
+
+
+def call_batch(handler: Any, integration, items: list) -> list:
+    """``handler.publish_batch(...)``, in the pool when process isolation is on."""
+    if get_mode() != MODE_PROCESS:
+        return handler.publish_batch(integration, items)
+    return get_pool().call(type(handler), (integration, items), method='publish_batch')
+
+
+def get_pool() -> 'HandlerPool':
+    """Process-wide pool, recreated in forked children."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = HandlerPool(
+                size=getattr(settings, 'PUBLISH_HANDLER_PROCESSES', DEFAULT_PROCESSES),
+                timeout=getattr(settings, 'PUBLISH_HANDLER_TIMEOUT', DEFAULT_TIMEOUT),
+                max_tasks=getattr(settings, 'PUBLISH_HANDLER_MAX_TASKS', DEFAULT_MAX_TASKS),
+                max_memory_mb=getattr(
+                    settings, 'PUBLISH_HANDLER_MAX_MEMORY_MB', DEFAULT_MAX_MEMORY_MB
+                ),
+            )
+        return _pool
+
+
+class HandlerPool:
+    """At most ``size`` handler processes, each running one call at a time."""
+
+    def __init__(self, size: int, timeout: float, max_tasks: int = 0, max_memory_mb: int = 0):
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.max_memory_mb = max_memory_mb
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: 'queue.LifoQueue[_Worker]' = queue.LifoQueue()
+        self._context = multiprocessing.get_context('spawn')
+
+    def call(self, handler_cls: type, args: Tuple[Any, ...], method: str = 'publish') -> Any:
+        with self._slots:
+            worker = self._take()
+            try:
+                ok, value, recycle = worker.run((handler_cls, method, args), self.timeout)
+            except Exception:
+                worker.stop()
+                raise
+            if recycle:
+                worker.stop()
+            else:
+                self._idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+    def _take(self) -> '_Worker':
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return _Worker(self._context, self.max_tasks, self.max_memory_mb)
+            if worker.process.is_alive():
+                return worker
+            worker.stop()
+
+
+class _Worker:
+    def __init__(self, context, max_tasks: int, max_memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve,
+            args=(child_conn, max_tasks, max_memory_mb),
+            name='publish-handler',
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        if not self.conn.poll(STARTUP_TIMEOUT):
+            self.stop()
+            raise HandlerCrashed('handler process did not start')
+        try:
+            self.conn.recv()
+        except EOFError:
+            self.stop()
+            raise HandlerCrashed(f'handler process exited on startup ({self.process.exitcode})')
+
+    def run(self, message, timeout: float):
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, ConnectionResetError):
+            raise HandlerCrashed('handler process is gone')
+        if not self.conn.poll(timeout):
+            logger.warning("handler call timed out after %ss, killing pid %s", timeout, self.process.pid)
+            raise HandlerTimeout(f'handler timed out after {timeout:g}s')
+        try:
+            return self.conn.recv()
+        except EOFError:
+            self.process.join(1)
+            raise HandlerCrashed(f'handler process died (exit code {self.process.exitcode})')
+
+    def stop(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+
+
+def _serve(conn, max_tasks: int, max_memory_mb: int) -> None:
+    """Handler process main loop: one (handler class, method, args) call per message."""
+    import django
+
+    django.setup()
+    conn.send('ready')
+    handlers = {}
+    tasks = 0
+    while True:
+        try:
+            handler_cls, method, args = conn.recv()
+        except EOFError:
+            return
+        except Exception as exc:
+            # e.g. the handler class can't be imported here
+            conn.send((False, PublishError(f'{type(exc).__name__}: {exc}'), False))
+            continue
+        try:
+            handler = handlers.get(handler_cls)
+            if handler is None:
+                handler = handlers[handler_cls] = handler_cls()
+            reply = (True, getattr(handler, method)(*args))
+        except Exception as exc:
+            reply = (False, exc)
+        tasks += 1
+        recycle = bool(max_tasks and tasks >= max_tasks) or _over_memory(max_memory_mb)
+        try:
+            conn.send((*reply, recycle))
+        except Exception as exc:
+            # unpicklable result or exception
+            conn.send((False, PublishError(f'{type(exc).__name__}: {exc}'), recycle))
+        if recycle:
+            return
+
+
+def _over_memory(max_memory_mb: int) -> bool:
+    if not max_memory_mb:
+        return False
+    try:
+        import resource
+    except ImportError:
+        return False
+    # peak RSS, in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss > max_memory_mb * 1024
+
+
+@atexit.register
+def _shutdown() -> None:
+    if _pool is not None and _pool.pid == os.getpid():
+        _pool.shutdown()
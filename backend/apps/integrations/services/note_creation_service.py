@@ -1,77 +1,128 @@
 """Service for handling post-creation logic with integration defaults.
 
 When a Note is created, automatically create PublishTargets from blog defaults.
+A default added later can be applied to the blog's existing notes as well.
+
+Both paths are set based: an anti-join finds the (default, note) pairs that
+have no PublishTarget yet, and the missing targets are inserted with
+``bulk_create`` in batches. The unique constraint on
+(integration, content_type, object_id) keeps concurrent callers from
+creating duplicates; only the rows actually inserted are returned and
+counted.
 """
 import logging
-from typing import List
+from typing import Iterable, List, Tuple
+from uuid import UUID
 
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 
 from blog.models import BlogIntegrationDefault, Note
 from apps.integrations.models import PublishTarget
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 1000
+
 
 def create_publish_targets_from_defaults(note: Note) -> List[PublishTarget]:
     """Auto-create PublishTargets from blog default integrations.
-    
+
+    Runs a constant number of queries, however many defaults the blog has.
+
     Args:
         note: The newly created Note instance
-        
+
     Returns:
         List of created PublishTarget instances
-        
-    Raises:
-        Exception: If transaction fails
     """
-    blog = note.blog
-    created_targets: List[PublishTarget] = []
-    
-    try:
-        with transaction.atomic():
-            # Fetch all active defaults for the blog
-            defaults = BlogIntegrationDefault.objects.filter(
-                blog=blog,
-                is_enabled=True,
-            ).select_related('integration')
-            
-            logger.debug(f"Creating publish targets for note {note.id} from {defaults.count()} defaults")
-            
-            # Determine content type for Note model
-            content_type = ContentType.objects.get_for_model(Note)
-            
-            # Create PublishTarget for each default
-            for default in defaults:
-                # Check if target already exists (avoid duplicates)
-                existing = PublishTarget.objects.filter(
-                    content_type=content_type,
-                    object_id=note.uuid,
-                    integration=default.integration,
-                ).exists()
-                
-                if existing:
-                    logger.debug(
-                        f"PublishTarget already exists for note {note.id} "
-                        f"and integration {default.integration.id}, skipping"
-                    )
-                    continue
-                
-                # Create the target
-                target = PublishTarget.objects.create(
-                    integration=default.integration,
-                    publish_settings=default.publish_settings.copy(),
-                    is_enabled=default.is_enabled,
-                    status=PublishTarget.STATUS_DRAFT,
+    content_type = ContentType.objects.get_for_model(Note)
+    defaults = BlogIntegrationDefault.objects.filter(blog_id=note.blog_id, is_enabled=True).exclude(
+        Exists(
+            PublishTarget.objects.filter(
+                integration=OuterRef('integration'),
+                content_type=content_type,
+                object_id=note.uuid,
+            )
+        )
+    )
+    with transaction.atomic():
+        targets = _create_targets(((default, note.uuid) for default in defaults), content_type)
+    logger.debug("created %s publish targets for note %s from defaults", len(targets), note.id)
+    return targets
+
+
+def apply_default_to_existing_notes(
+    default: BlogIntegrationDefault, batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Create the default's PublishTarget on every note of the blog that lacks one.
+
+    Notes are processed in primary key order, ``batch_size`` at a time, each
+    batch in its own transaction, so the backfill can be interrupted and
+    simply run again.
+
+    Args:
+        default: The BlogIntegrationDefault to apply
+        batch_size: Notes handled per SELECT and INSERT
+
+    Returns:
+        Number of created PublishTarget rows
+    """
+    if not default.is_enabled:
+        return 0
+    content_type = ContentType.objects.get_for_model(Note)
+    missing = (
+        Note.objects.alive()
+        .filter(blog_id=default.blog_id)
+        .exclude(
+            Exists(
+                PublishTarget.objects.filter(
+                    integration_id=default.integration_id,
                     content_type=content_type,
-                    object_id=note.uuid,
+                    object_id=OuterRef('uuid'),
                 )
-                created_targets.append(target)
-                logger.debug(f"Created PublishTarget {target.id} for note {note.id}")
-            
-            return created_targets
-            
-    except Exception as exc:
-        logger.exception(f"Failed to create publish targets for note {note.id}: {exc}")
-        raise
+            )
+        )
+        .order_by('pk')
+    )
+    created = 0
+    last_pk = 0
+    while True:
+        batch = list(missing.filter(pk__gt=last_pk).values_list('pk', 'uuid')[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        with transaction.atomic():
+            created += len(_create_targets(((default, uuid) for _, uuid in batch), content_type))
+    logger.info(
+        "applied default %s to %s existing notes of blog %s", default.pk, created, default.blog_id
+    )
+    return created
+
+
+def _create_targets(
+    pairs: Iterable[Tuple[BlogIntegrationDefault, UUID]], content_type: ContentType
+) -> List[PublishTarget]:
+    targets = [
+        PublishTarget(
+            integration_id=default.integration_id,
+            publish_settings=default.publish_settings.copy(),
+            is_enabled=default.is_enabled,
+            status=PublishTarget.STATUS_DRAFT,
+            content_type=content_type,
+            object_id=object_id,
+        )
+        for default, object_id in pairs
+    ]
+    if not targets:
+        return []
+    # conflicts only happen when another request created the same target meanwhile
+    PublishTarget.objects.bulk_create(targets, batch_size=DEFAULT_BATCH_SIZE, ignore_conflicts=True)
+    # bulk_create returns the skipped ones too, with a pk that was never inserted
+    inserted = set(
+        PublishTarget.objects.filter(pk__in=[target.pk for target in targets]).values_list(
+            'pk', flat=True
+        )
+    )
+    return [target for target in targets if target.pk in inserted]
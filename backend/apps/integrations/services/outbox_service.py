@@ -0,0 +1,110 @@
+"""Transactional outbox for side effects of note status changes.
+
+Saving a note as published through the API must queue its publish targets,
+but doing so inline would make every PATCH pay for it. Instead the request
+writes an ``OutboxEvent`` in the transaction that saves the note, so the
+event exists exactly when the change was committed, and
+``manage.py publish_outbox_relay`` drains pending events in batches:
+
+* rows are locked with ``SKIP LOCKED``, several relays can run side by side;
+* an event is marked processed in the transaction that queued the targets,
+  a relay that dies half way leaves it pending for the next one;
+* queueing is idempotent (only draft and failed targets move), so an event
+  delivered twice does no harm.
+
+A batch that raises is rolled back and its events get ``attempts`` bumped;
+after ``PUBLISH_OUTBOX_MAX_ATTEMPTS`` they are left for inspection.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+
+from apps.integrations.models import OutboxEvent, PublishTarget
+from apps.integrations.services import queue_service
+from blog.models import Note
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_ATTEMPTS = 10
+DEFAULT_RETENTION_HOURS = 24
+
+
+def get_max_attempts() -> int:
+    return getattr(settings, 'PUBLISH_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def record_note_published(note) -> OutboxEvent:
+    """Append a ``note.published`` event; call inside the transaction saving ``note``."""
+    return OutboxEvent.objects.create(
+        topic=OutboxEvent.TOPIC_NOTE_PUBLISHED,
+        object_id=note.uuid,
+        payload={'published_at': note.published_at},
+    )
+
+
+def pending() -> QuerySet[OutboxEvent]:
+    return OutboxEvent.objects.filter(processed_at__isnull=True, attempts__lt=get_max_attempts())
+
+
+def drain(batch_size: int = DEFAULT_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """Dispatch up to ``batch_size`` pending events. Returns the number processed."""
+    now = now or timezone.now()
+    pks: List[int] = []
+    try:
+        with transaction.atomic():
+            events = pending().order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                events = events.select_for_update(skip_locked=True)
+            events = list(events[:batch_size])
+            if not events:
+                return 0
+            pks = [event.pk for event in events]
+            queued = _dispatch(events, now)
+            OutboxEvent.objects.filter(pk__in=pks).update(processed_at=now, last_error='')
+    except Exception as exc:
+        if not pks:
+            raise
+        logger.exception("outbox batch of %s events failed", len(pks))
+        OutboxEvent.objects.filter(pk__in=pks).update(
+            attempts=F('attempts') + 1, last_error=str(exc)
+        )
+        return 0
+    logger.info("relayed %s outbox events, queued %s targets", len(events), queued)
+    return len(events)
+
+
+def _dispatch(events: List[OutboxEvent], now: datetime) -> int:
+    by_topic: Dict[str, List[Any]] = {}
+    for event in events:
+        by_topic.setdefault(event.topic, []).append(event.object_id)
+    queued = 0
+    for topic, object_ids in by_topic.items():
+        if topic == OutboxEvent.TOPIC_NOTE_PUBLISHED:
+            queued += _queue_note_targets(object_ids, now)
+        else:
+            logger.warning("unknown outbox topic %r, dropping %s events", topic, len(object_ids))
+    return queued
+
+
+def _queue_note_targets(note_uuids: List[Any], now: datetime) -> int:
+    # like scheduled notes: targets with their own future scheduled_at wait for it
+    targets = PublishTarget.objects.filter(
+        Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now),
+        content_type=ContentType.objects.get_for_model(Note),
+        object_id__in=note_uuids,
+    )
+    return queue_service.enqueue_queryset(targets, now=now)
+
+
+def prune(before: Optional[datetime] = None) -> int:
+    """Delete processed events older than ``PUBLISH_OUTBOX_RETENTION_HOURS``."""
+    hours = getattr(settings, 'PUBLISH_OUTBOX_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)
+    before = before or timezone.now() - timedelta(hours=hours)
+    return OutboxEvent.objects.filter(processed_at__lt=before).delete()[0]
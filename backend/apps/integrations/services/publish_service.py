@@ -1,18 +1,51 @@
 import logging
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.db.models import F, Model, QuerySet
 from django.utils import timezone
 
-from apps.integrations import registry
-from apps.integrations.models import PublishLog, PublishTarget
+from apps.integrations import metrics, registry
+from apps.integrations.exceptions import PublishError
+from apps.integrations.models import PublishLog, PublishPayload, PublishTarget
+from apps.integrations.services import (
+    circuit_breaker_service,
+    event_service,
+    isolation_service,
+    rate_limit_service,
+    transition_service,
+)
+from apps.integrations.services.circuit_breaker_service import CircuitOpen
+from apps.integrations.services.rate_limit_service import RateLimited
+from apps.integrations.services.retry_service import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_FANOUT_MAX_WORKERS = 8
 
-def publish_target(publish_target: PublishTarget, content: Dict[str, Any]) -> None:
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def publish_target(
+    publish_target: PublishTarget,
+    content: Dict[str, Any],
+    max_wait: Optional[float] = None,
+    token: Optional[str] = None,
+) -> None:
     """Attempt to publish a target using its integration handler.
 
-    Updates target status, retry counters and logs the attempt.
+    The target is claimed first (see ``transition_service``); when someone
+    else holds it or it was published meanwhile, nothing happens. The worker
+    passes the ``token`` of its batch claim. Updates
+    target status, retry counters and logs the attempt. Raises
+    ``RateLimited`` when the integration's limits stay exhausted for longer
+    than ``max_wait`` seconds; nothing is sent or recorded in that case.
     """
     if not publish_target.is_enabled:
         logger.debug("publish target %s is disabled, skipping", publish_target.pk)
@@ -22,50 +55,266 @@ def publish_target(publish_target: PublishTarget, content: Dict[str, Any]) -> No
         logger.debug("publish target %s already published, skipping", publish_target.pk)
         return
 
-    code = publish_target.integration.definition.code
+    owns_claim = token is None
+    token = token or transition_service.new_token('direct')
+    if not transition_service.claim(publish_target, token):
+        logger.info("publish target %s is claimed elsewhere or published, skipping", publish_target.pk)
+        return
+    try:
+        _publish_claimed(publish_target, token, content, max_wait)
+    finally:
+        if owns_claim and publish_target.claimed_by == token:
+            # no outcome was written (rate limited or an unexpected error)
+            transition_service.release(publish_target, token)
+
+
+def publish_batch(items: List[Tuple[PublishTarget, Dict[str, Any]]],
+                  max_wait: Optional[float] = None) -> None:
+    """Publish claimed targets of one Integration with a single ``publish_batch`` call.
+
+    ``items`` are (target, content) pairs of targets claimed by the worker
+    (see ``batch_service``). The outcome of every item is recorded like that
+    of ``publish_target``; a failed call fails every item. Raises
+    ``RateLimited`` like ``publish_target``, one call takes one token.
+    """
+    items = [
+        (target, content) for target, content in items
+        if target.is_enabled and target.claimed_by
+        and transition_service.claim(target, target.claimed_by)
+    ]
+    if not items:
+        return
+    integration = items[0][0].integration
+    definition = integration.definition
+    handler = _load_handler(items, definition)
+    if handler is None or _short_circuited(items, definition.code):
+        return
+    try:
+        with rate_limit_service.throttle(integration, max_wait=max_wait):
+            _call_batch_handler(handler, items, definition)
+    except RateLimited:
+        metrics.PUBLISH_RATE_LIMITED.labels(definition.code).inc(len(items))
+        raise
+
+
+def _publish_claimed(publish_target: PublishTarget, token: str, content: Dict[str, Any],
+                     max_wait: Optional[float]) -> None:
+    definition = publish_target.integration.definition
+    code = definition.code
+    handler = _load_handler([(publish_target, content)], definition, token)
+    if handler is None or _short_circuited([(publish_target, content)], code, token):
+        return
+
+    # raises RateLimited before anything is sent or recorded
+    try:
+        with rate_limit_service.throttle(publish_target.integration, max_wait=max_wait):
+            _call_handler(handler, publish_target, token, definition, content)
+    except RateLimited:
+        metrics.PUBLISH_RATE_LIMITED.labels(code).inc()
+        raise
+
+
+def _load_handler(items, definition, token: Optional[str] = None) -> Any:
+    """The handler, or None after recording the load failure on every item."""
+    code = definition.code
     try:
-        handler = registry.get_handler(code)
+        return registry.get_handler(code, definition=definition)
     except Exception as exc:
         logger.exception("could not load handler for %s", code)
-        publish_target.retry_count += 1
-        publish_target.status = PublishTarget.STATUS_FAILED
-        publish_target.last_error = str(exc)
-        publish_target.save(update_fields=['retry_count', 'status', 'last_error'])
-        # record log even when handler can't be loaded
-        PublishLog.objects.create(
-            publish_target=publish_target,
-            request_payload=content,
-            response_payload=None,
-            status=PublishLog.STATUS_ERROR,
-            error_message=str(exc),
-        )
-        return
+        metrics.PUBLISH_FAILURES.labels(code).inc(len(items))
+        metrics.PUBLISH_DEAD_LETTERED.labels(code).inc(len(items))
+        for target, content in items:
+            # a missing or broken handler won't fix itself, don't schedule a retry
+            _record(target, token or target.claimed_by, content, {
+                'retry_count': F('retry_count') + 1,
+                'status': PublishTarget.STATUS_DEAD,
+                'last_error': str(exc),
+                'last_error_class': type(exc).__name__,
+                'next_attempt_at': None,
+            }, PublishLog.STATUS_ERROR, error_message=str(exc))
+            target.retry_count += 1
+        return None
 
-    log_kwargs: Dict[str, Any] = {
-        'publish_target': publish_target,
-        'request_payload': content,
-        'response_payload': None,
-        'status': None,
-        'error_message': '',
-    }
 
+def _short_circuited(items, code: str, token: Optional[str] = None) -> bool:
+    """Whether the integration's circuit is open; its targets are parked if so."""
     try:
-        result = handler.publish(publish_target.integration, publish_target, content)
-        # handler may return response payload
-        log_kwargs['response_payload'] = result
-        publish_target.status = PublishTarget.STATUS_PUBLISHED
-        publish_target.last_published_at = timezone.now()
-        publish_target.retry_count = 0
-        publish_target.last_error = ''
+        circuit_breaker_service.before_call(items[0][0].integration)
+    except CircuitOpen as exc:
+        # no handler call and no log row, just park the targets until the probe
+        metrics.PUBLISH_SHORT_CIRCUITED.labels(code).inc(len(items))
+        for target, _ in items:
+            logger.debug("publish target %s short-circuited: %s", target.pk, exc)
+            transition_service.finish(target, token or target.claimed_by, {
+                'status': PublishTarget.STATUS_FAILED,
+                'last_error': str(exc),
+                'next_attempt_at': exc.retry_at,
+            })
+        return True
+    return False
+
+
+def _call_handler(handler, publish_target: PublishTarget, token: str, definition,
+                  content: Dict[str, Any]) -> None:
+    code = definition.code
+    metrics.PUBLISH_ATTEMPTS.labels(code).inc()
+    started = time.perf_counter()
+    try:
+        result = isolation_service.call(handler, publish_target.integration, publish_target, content)
     except Exception as exc:
+        metrics.HANDLER_LATENCY.labels(code).observe(time.perf_counter() - started)
         logger.exception("error publishing target %s", publish_target.pk)
-        publish_target.retry_count += 1
-        publish_target.status = PublishTarget.STATUS_FAILED
-        publish_target.last_error = str(exc)
-        log_kwargs['error_message'] = str(exc)
-        log_kwargs['status'] = PublishLog.STATUS_ERROR
+        circuit_breaker_service.record_failure(publish_target.integration, exc)
+        _record_failure(publish_target, token, definition, content, exc)
+        return
+
+    metrics.HANDLER_LATENCY.labels(code).observe(time.perf_counter() - started)
+    circuit_breaker_service.record_success(publish_target.integration)
+    _record_success(publish_target, token, code, content, result)
+
+
+def _call_batch_handler(handler, items, definition) -> None:
+    integration = items[0][0].integration
+    code = definition.code
+    metrics.PUBLISH_ATTEMPTS.labels(code).inc(len(items))
+    started = time.perf_counter()
+    try:
+        results = isolation_service.call_batch(handler, integration, items)
+        if len(results) != len(items):
+            raise PublishError(f'handler returned {len(results)} results for {len(items)} targets')
+    except Exception as exc:
+        logger.exception("error publishing a batch of %s targets", len(items))
+        circuit_breaker_service.record_failure(integration, exc)
+        results = [exc] * len(items)
+    else:
+        # the provider answered; rejected items don't count against the circuit
+        circuit_breaker_service.record_success(integration)
+    metrics.HANDLER_LATENCY.labels(code).observe(time.perf_counter() - started)
+
+    for (target, content), result in zip(items, results):
+        if isinstance(result, Exception):
+            _record_failure(target, target.claimed_by, definition, content, result)
+        else:
+            _record_success(target, target.claimed_by, code, content, result)
+
+
+def _record_failure(publish_target: PublishTarget, token: str, definition,
+                    content: Dict[str, Any], exc: Exception) -> None:
+    code = definition.code
+    metrics.PUBLISH_FAILURES.labels(code).inc()
+    retry_count = publish_target.retry_count + 1
+    policy = RetryPolicy.from_definition(definition)
+    next_attempt_at = policy.next_attempt_at(retry_count, exc)
+    if next_attempt_at is not None:
+        metrics.PUBLISH_RETRIES.labels(code).inc()
     else:
-        log_kwargs['status'] = PublishLog.STATUS_SUCCESS
+        metrics.PUBLISH_DEAD_LETTERED.labels(code).inc()
+    _record(publish_target, token, content, {
+        'retry_count': F('retry_count') + 1,
+        # given up on: out of the retry sweep until requeued (dead_letter_service)
+        'status': PublishTarget.STATUS_FAILED if next_attempt_at else PublishTarget.STATUS_DEAD,
+        'last_error': str(exc),
+        'last_error_class': type(exc).__name__,
+        'next_attempt_at': next_attempt_at,
+    }, PublishLog.STATUS_ERROR, error_message=str(exc))
+    publish_target.retry_count = retry_count
+
+
+def _record_success(publish_target: PublishTarget, token: str, code: str,
+                    content: Dict[str, Any], result: Any) -> None:
+    metrics.PUBLISH_SUCCESSES.labels(code).inc()
+    # handler may return response payload
+    _record(publish_target, token, content, {
+        'status': PublishTarget.STATUS_PUBLISHED,
+        'last_published_at': timezone.now(),
+        'retry_count': 0,
+        'last_error': '',
+        'pending_payload': None,
+        'next_attempt_at': None,
+    }, PublishLog.STATUS_SUCCESS, response_payload=result)
+
+
+def _record(publish_target: PublishTarget, token: str, content: Dict[str, Any],
+            fields: Dict[str, Any], log_status: str, **log_fields: Any) -> None:
+    with transaction.atomic():
+        if not transition_service.finish(publish_target, token, fields):
+            # lease expired and someone else took over; the send happened, log it
+            logger.warning("publish target %s lost its claim, outcome not saved", publish_target.pk)
+        log = PublishLog.objects.create(
+            publish_target=publish_target,
+            payload_id=PublishPayload.objects.store(content),
+            status=log_status,
+            **log_fields,
+        )
+        event_service.record_log(log)
+
+
+def targets_for_object(obj: Model) -> QuerySet[PublishTarget]:
+    """Enabled publish targets of ``obj``, looked up by (content_type, object_id)."""
+    return PublishTarget.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=obj.uuid,
+        is_enabled=True,
+    ).select_related('integration__definition')
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool bounding how many handlers run at once."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(
+                    settings, 'PUBLISH_FANOUT_MAX_WORKERS', DEFAULT_FANOUT_MAX_WORKERS
+                ),
+                thread_name_prefix='publish',
+            )
+        return _executor
+
+
+def publish_many(
+    targets: Iterable[PublishTarget], content: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Publish several targets concurrently and return a per-target summary.
+
+    Every target runs on a pool thread with its own database connection and
+    transaction, so wall-clock time is that of the slowest handler. Targets
+    must be committed before calling this, pool threads can't see rows of an
+    open transaction.
+    """
+    targets = list(targets)
+    if len(targets) <= 1:
+        return [_publish_and_summarize(target, content) for target in targets]
+    executor = get_executor()
+    futures = [
+        executor.submit(_publish_in_thread, target, content) for target in targets
+    ]
+    return [future.result() for future in futures]
+
+
+def _publish_in_thread(target: PublishTarget, content: Dict[str, Any]) -> Dict[str, Any]:
+    close_old_connections()
+    try:
+        return _publish_and_summarize(target, content)
     finally:
-        publish_target.save()
-        PublishLog.objects.create(**log_kwargs)
+        close_old_connections()
+
+
+def _publish_and_summarize(target: PublishTarget, content: Dict[str, Any]) -> Dict[str, Any]:
+    error = ''
+    try:
+        publish_target(target, content)
+    except RateLimited:
+        # hand it over to the background queue instead of failing it
+        from apps.integrations.services import queue_service
+
+        queue_service.enqueue_target(target, content)
+    except Exception as exc:
+        logger.exception("error publishing target %s", target.pk)
+        error = str(exc)
+    return {
+        'id': str(target.pk),
+        'integration_id': target.integration_id,
+        'status': target.status,
+        'error': error or target.last_error or '',
+    }
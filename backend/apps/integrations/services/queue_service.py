@@ -0,0 +1,239 @@
+"""Background publish queue backed by PublishTarget.STATUS_QUEUED.
+
+The API only moves a target to ``queued``; ``manage.py publish_worker``
+processes claim queued rows and run the handler outside the request cycle.
+
+Claiming is a two step operation so that any number of workers can run in
+parallel without publishing the same target twice:
+
+1. candidate rows are selected with ``SELECT ... FOR UPDATE SKIP LOCKED``
+   where the backend supports it (Postgres), so concurrent workers never
+   block on each other and never see the same candidates;
+2. the candidates are stamped with a per-batch claim token through a
+   conditional UPDATE that only matches rows which are still unclaimed.
+   On SQLite (no row locks) the UPDATE is serialised by the database write
+   lock, so the second worker simply matches zero rows.
+
+A claim is a lease: rows claimed by a worker that died are picked up again
+once ``PUBLISH_WORKER_LEASE_SECONDS`` have passed.
+"""
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from apps.integrations import metrics
+from apps.integrations.models import PublishTarget
+from apps.integrations.services import (
+    batch_service,
+    event_service,
+    publish_service,
+    render_service,
+    retry_service,
+    transition_service,
+)
+from apps.integrations.services.rate_limit_service import RateLimited
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10
+
+
+def enqueue_target(publish_target: PublishTarget, content: Optional[Dict[str, Any]] = None) -> bool:
+    """Mark a target as queued so a publish worker picks it up.
+
+    Returns False when the target is published or claimed by someone else.
+    """
+    queued = transition_service.enqueue(publish_target, content)
+    if queued:
+        logger.debug("publish target %s queued", publish_target.pk)
+    return queued
+
+
+def enqueue_queryset(targets: QuerySet[PublishTarget], now=None) -> int:
+    """Queue every enabled target of ``targets`` in a single UPDATE.
+
+    Only draft and failed targets are moved; queued and published ones are
+    left alone. A payload left from an earlier client request is dropped, so
+    the worker publishes the note as it is now. Returns the number of rows
+    queued.
+    """
+    now = now or timezone.now()
+    movable = (PublishTarget.STATUS_DRAFT, PublishTarget.STATUS_FAILED)
+    with transaction.atomic():
+        candidates = targets.filter(is_enabled=True, status__in=movable)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        # the pks are needed for the change feed
+        pks = list(candidates.values_list('pk', flat=True))
+        if not pks:
+            return 0
+        queued = PublishTarget.objects.filter(pk__in=pks, status__in=movable).update(
+            status=PublishTarget.STATUS_QUEUED,
+            queued_at=now,
+            next_attempt_at=None,
+            claimed_at=None,
+            claimed_by='',
+            pending_payload=None,
+            updated_at=now,
+        )
+        event_service.record_targets(pks)
+    return queued
+
+
+def claimable_targets() -> QuerySet[PublishTarget]:
+    """Queued, enabled targets that are unclaimed or whose lease expired.
+
+    ``queued_at`` in the future means the target was deferred.
+    """
+    now = timezone.now()
+    return PublishTarget.objects.filter(
+        transition_service.unclaimed(now),
+        Q(queued_at__isnull=True) | Q(queued_at__lte=now),
+        status=PublishTarget.STATUS_QUEUED,
+        is_enabled=True,
+    )
+
+
+def defer_target(publish_target: PublishTarget, seconds: float) -> None:
+    """Keep a claimed target queued but out of reach for ``seconds``."""
+    PublishTarget.objects.filter(
+        pk=publish_target.pk, claimed_by=publish_target.claimed_by
+    ).update(
+        queued_at=timezone.now() + timedelta(seconds=seconds),
+        claimed_at=None,
+        claimed_by='',
+    )
+
+
+def claim_targets(
+    worker_id: str, batch_size: int = DEFAULT_BATCH_SIZE, integration_id: Optional[int] = None
+) -> List[PublishTarget]:
+    """Claim up to ``batch_size`` queued targets for ``worker_id``.
+
+    ``integration_id`` restricts the claim to one Integration's targets.
+    """
+    token = transition_service.new_token(worker_id)
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = claimable_targets().order_by('queued_at')
+        if integration_id is not None:
+            candidates = candidates.filter(integration_id=integration_id)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        candidate_ids = list(candidates.values_list('pk', flat=True)[:batch_size])
+        if not candidate_ids:
+            return []
+        # conditional update: only rows still claimable are stamped
+        claimable_targets().filter(pk__in=candidate_ids).update(
+            claimed_at=now,
+            claimed_by=token,
+        )
+    targets = list(
+        PublishTarget.objects.filter(claimed_by=token)
+        .select_related('integration__definition')
+        .order_by('queued_at')
+    )
+    # one Integration instance per batch, so a circuit tripped by the first
+    # target short-circuits the rest of the batch
+    integrations = {}
+    for target in targets:
+        target.integration = integrations.setdefault(target.integration_id, target.integration)
+    return targets
+
+
+def process_target(publish_target: PublishTarget) -> None:
+    """Run the publish for a claimed target and release the claim."""
+    token = publish_target.claimed_by
+    _observe_queue_wait(publish_target)
+    try:
+        # targets queued without a payload publish the rendered object
+        content = publish_target.pending_payload or render_service.content_for_target(
+            publish_target
+        )
+        publish_service.publish_target(publish_target, content, token=token)
+    except RateLimited as exc:
+        logger.debug("publish target %s rate limited, deferring", publish_target.pk)
+        defer_target(publish_target, exc.retry_after)
+    finally:
+        transition_service.release(publish_target, token)
+
+
+def _observe_queue_wait(publish_target: PublishTarget) -> None:
+    if publish_target.queued_at:
+        metrics.QUEUE_WAIT.labels(publish_target.integration.definition.code).observe(
+            max((timezone.now() - publish_target.queued_at).total_seconds(), 0)
+        )
+
+
+def process_batch(targets: List[PublishTarget]) -> None:
+    """Publish claimed targets of one Integration with one handler call, then release them."""
+    for target in targets:
+        _observe_queue_wait(target)
+    try:
+        items = [
+            (target, target.pending_payload or render_service.content_for_target(target))
+            for target in targets
+        ]
+        publish_service.publish_batch(items)
+    except RateLimited as exc:
+        logger.debug("batch of %s targets rate limited, deferring", len(targets))
+        for target in targets:
+            defer_target(target, exc.retry_after)
+    finally:
+        for target in targets:
+            if target.claimed_by:
+                transition_service.release(target, target.claimed_by)
+
+
+def coalesce(worker_id: str, targets: List[PublishTarget]):
+    """Split claimed targets into single targets and batches (see ``batch_service``).
+
+    Targets of a batching integration are topped up to its ``max_size``
+    with more of its queued targets; while fewer are queued and the oldest
+    is younger than ``window_seconds`` they are released to wait for more.
+    Returns (singles, batches).
+    """
+    singles: List[PublishTarget] = []
+    groups: Dict[int, Any] = {}
+    for target in targets:
+        policy = batch_service.policy_for(target.integration)
+        if policy is None:
+            singles.append(target)
+        else:
+            groups.setdefault(target.integration_id, (policy, []))[1].append(target)
+
+    batches: List[List[PublishTarget]] = []
+    now = timezone.now()
+    for integration_id, (policy, group) in groups.items():
+        if len(group) < policy.max_size:
+            group += claim_targets(worker_id, policy.max_size - len(group), integration_id)
+        oldest = min(target.queued_at or now for target in group)
+        if len(group) < policy.max_size and now - oldest < timedelta(seconds=policy.window_seconds):
+            for target in group:
+                transition_service.release(target, target.claimed_by)
+            continue
+        batches.extend(
+            group[start:start + policy.max_size] for start in range(0, len(group), policy.max_size)
+        )
+    return singles, batches
+
+
+def run_once(worker_id: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Claim and process a single batch. Returns the number of targets handled."""
+    retry_service.requeue_due_retries()
+    singles, batches = coalesce(worker_id, claim_targets(worker_id, batch_size))
+    for target in singles:
+        try:
+            process_target(target)
+        except Exception:
+            logger.exception("worker %s failed processing target %s", worker_id, target.pk)
+    for batch in batches:
+        try:
+            process_batch(batch)
+        except Exception:
+            logger.exception("worker %s failed processing a batch of %s targets", worker_id, len(batch))
+    return len(singles) + sum(len(batch) for batch in batches)
@@ -0,0 +1,179 @@
+"""Rate limits and concurrency caps for integration handlers.
+
+Limits come from the IntegrationDefinition (the provider as a whole) and
+from the Integration (one user's credentials); both apply when set:
+
+* ``rate_limit_per_minute`` / ``rate_limit_burst`` form a token bucket;
+* ``max_concurrency`` caps handler calls in flight at the same time.
+
+State lives in ``RateLimitBucket`` rows so every gunicorn and worker
+process sees the same buckets. Taking a token is a single conditional
+UPDATE that refills and debits the bucket at once, so it is atomic on
+Postgres (row lock) and SQLite (database write lock) alike.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+
+from apps.integrations.models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+# wait this long for a free slot when the in-flight cap is reached
+CONCURRENCY_RETRY_SECONDS = 0.5
+DEFAULT_MAX_WAIT = 5.0
+
+# buckets known to exist, saves a query per acquisition
+_known_buckets: Set[str] = set()
+
+
+class RateLimited(Exception):
+    """No token or concurrency slot is available right now."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Limit:
+    key: str
+    per_minute: Optional[int]
+    burst: int
+    max_concurrency: Optional[int]
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return (self.per_minute or 0) / 60.0
+
+
+def _limit(key: str, source) -> Optional[Limit]:
+    per_minute = getattr(source, 'rate_limit_per_minute', None)
+    max_concurrency = getattr(source, 'max_concurrency', None)
+    if not per_minute and not max_concurrency:
+        return None
+    burst = getattr(source, 'rate_limit_burst', None) or 1
+    return Limit(key, per_minute or None, burst, max_concurrency or None)
+
+
+def limits_for(integration) -> List[Limit]:
+    definition = getattr(integration, 'definition', None)
+    limits = [
+        _limit(f'definition:{definition.pk}', definition) if definition else None,
+        _limit(f'integration:{integration.pk}', integration),
+    ]
+    # fixed order so concurrent acquisitions lock rows in the same order
+    return sorted((limit for limit in limits if limit), key=lambda limit: limit.key)
+
+
+def get_max_wait() -> float:
+    return float(getattr(settings, 'PUBLISH_RATE_LIMIT_MAX_WAIT', DEFAULT_MAX_WAIT))
+
+
+@contextmanager
+def throttle(integration, max_wait: Optional[float] = None) -> Iterator[None]:
+    """Hold a token and a concurrency slot of every limit for the block.
+
+    Waits up to ``max_wait`` seconds, then raises :class:`RateLimited` so
+    the caller can defer the publish instead of sending and failing it.
+    """
+    limits = limits_for(integration)
+    if not limits:
+        yield
+        return
+    max_wait = get_max_wait() if max_wait is None else max_wait
+    deadline = time.monotonic() + max_wait
+    while True:
+        retry_after = try_acquire(limits)
+        if retry_after is None:
+            break
+        if time.monotonic() + retry_after > deadline:
+            raise RateLimited(retry_after)
+        time.sleep(retry_after)
+    try:
+        yield
+    finally:
+        release(limits)
+
+
+def try_acquire(limits: List[Limit], now: Optional[float] = None) -> Optional[float]:
+    """Take one token and slot from every limit, all or nothing.
+
+    Returns None on success, otherwise the seconds to wait before retrying.
+    """
+    now = time.time() if now is None else now
+    for limit in limits:
+        _ensure_bucket(limit, now)
+    try:
+        with transaction.atomic():
+            for limit in limits:
+                retry_after = _take(limit, now)
+                if retry_after is not None:
+                    raise RateLimited(retry_after)
+    except RateLimited as exc:
+        return exc.retry_after
+    return None
+
+
+def release(limits: List[Limit]) -> None:
+    keys = [limit.key for limit in limits if limit.max_concurrency]
+    if keys:
+        RateLimitBucket.objects.filter(key__in=keys).update(
+            in_flight=Greatest(F('in_flight') - 1, Value(0)),
+            touched_at=time.time(),
+        )
+
+
+def _ensure_bucket(limit: Limit, now: float) -> None:
+    if limit.key in _known_buckets:
+        return
+    RateLimitBucket.objects.get_or_create(
+        key=limit.key,
+        defaults={'tokens': limit.burst, 'refilled_at': now, 'touched_at': now},
+    )
+    _known_buckets.add(limit.key)
+
+
+def _take(limit: Limit, now: float) -> Optional[float]:
+    updates = {'touched_at': now}
+    conditions = [Q(key=limit.key)]
+    if limit.per_minute:
+        refilled = Least(
+            Value(float(limit.burst)),
+            F('tokens') + (Value(now) - F('refilled_at')) * Value(limit.rate),
+        )
+        updates['tokens'] = refilled - Value(1.0)
+        updates['refilled_at'] = now
+        conditions.append(GreaterThanOrEqual(refilled, Value(1.0)))
+    if limit.max_concurrency:
+        # a slot not touched for a whole lease was leaked by a dead process
+        stale_before = now - float(getattr(settings, 'PUBLISH_WORKER_LEASE_SECONDS', 300))
+        updates['in_flight'] = Case(
+            When(touched_at__lt=stale_before, then=Value(1)),
+            default=F('in_flight') + 1,
+        )
+        conditions.append(
+            Q(in_flight__lt=limit.max_concurrency) | Q(touched_at__lt=stale_before)
+        )
+    if RateLimitBucket.objects.filter(*conditions).update(**updates):
+        return None
+    bucket = RateLimitBucket.objects.filter(key=limit.key).first()
+    if bucket is None:
+        # deleted behind our back, start over with a full bucket
+        _known_buckets.discard(limit.key)
+        _ensure_bucket(limit, now)
+        return _take(limit, now)
+    if limit.per_minute:
+        tokens = min(limit.burst, bucket.tokens + (now - bucket.refilled_at) * limit.rate)
+        if tokens < 1.0:
+            return (1.0 - tokens) / limit.rate
+    return CONCURRENCY_RETRY_SECONDS
@@ -0,0 +1,187 @@
+"""Render a Note's blocks into publishable content.
+
+A note's body is made of two ordered block streams, ``NoteHeader`` and
+``NoteTextContent``. They are merged by ``order`` (a header goes first when
+both share a position) into one document with an HTML and a markdown
+variant::
+
+    {'title': ..., 'html': ..., 'markdown': ...}
+
+Rendering is cached. The key is derived from the note's ``updated_at`` and
+the count and latest ``updated_at`` of both block streams. Any edit,
+addition or deletion of a block changes the key, so fanning a note out to N
+integrations and retrying failed targets renders it once.
+"""
+import heapq
+import html
+import logging
+import re
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Subquery
+
+from apps.integrations.models import PublishTarget
+from blog.models import Note, NoteHeader, NoteTextContent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TIMEOUT = 3600
+CACHE_PREFIX = 'note-render:v1'
+
+
+def get_cache_timeout() -> int:
+    return int(getattr(settings, 'NOTE_RENDER_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+
+
+def render_note(note: Note) -> Dict[str, Any]:
+    """Rendered content of ``note``, from the cache when nothing changed."""
+    key = cache_key(note)
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = _render(note)
+        cache.set(key, rendered, get_cache_timeout())
+        logger.debug("rendered note %s", note.uuid)
+    return rendered
+
+
+def content_for_target(target: PublishTarget) -> Dict[str, Any]:
+    """Content to publish for a target queued without an explicit payload."""
+    if target.content_type_id != ContentType.objects.get_for_model(Note).pk:
+        return {}
+    note = Note.objects.alive().filter(uuid=target.object_id).first()
+    return render_note(note) if note is not None else {}
+
+
+def cache_key(note: Note) -> str:
+    # one query; reads updated_at from the database in case ``note`` is stale
+    row = (
+        Note.objects.filter(pk=note.pk)
+        .annotate(**_block_stats('headers', NoteHeader), **_block_stats('texts', NoteTextContent))
+        .values_list(
+            'updated_at', 'headers_count', 'headers_last', 'texts_count', 'texts_last'
+        )
+        .get()
+    )
+    return ':'.join([CACHE_PREFIX, str(note.uuid), *(_key_part(value) for value in row)])
+
+
+def _key_part(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return f'{value.timestamp():.6f}'
+    return str(value)
+
+
+def _block_stats(prefix: str, model) -> Dict[str, Subquery]:
+    blocks = model.objects.filter(note=OuterRef('pk')).order_by().values('note')
+    return {
+        f'{prefix}_count': Subquery(blocks.annotate(n=Count('pk')).values('n')),
+        f'{prefix}_last': Subquery(blocks.annotate(last=Max('updated_at')).values('last')),
+    }
+
+
+def _render(note: Note) -> Dict[str, Any]:
+    # heapq.merge needs both streams sorted by the merge key
+    headers = (
+        (h.order, 0, h.created_at, h)
+        for h in NoteHeader.objects.filter(note=note).order_by('order', 'created_at')
+    )
+    texts = (
+        (t.order, 1, t.created_at, t)
+        for t in NoteTextContent.objects.filter(note=note).order_by('order', 'created_at')
+    )
+    html_parts: List[str] = []
+    markdown_parts: List[str] = []
+    for _, _, _, block in heapq.merge(headers, texts, key=lambda item: item[:3]):
+        if isinstance(block, NoteHeader):
+            if not block.text:
+                continue
+            html_parts.append(f'<h{block.level}>{html.escape(block.text)}</h{block.level}>')
+            markdown_parts.append(f"{'#' * block.level} {block.text}")
+        elif block.html.strip():
+            html_parts.append(block.html)
+            markdown_parts.append(html_to_markdown(block.html))
+    return {
+        'title': note.title,
+        'html': '\n'.join(html_parts),
+        'markdown': '\n\n'.join(part for part in markdown_parts if part),
+    }
+
+
+def html_to_markdown(value: str) -> str:
+    converter = _MarkdownConverter()
+    converter.feed(value)
+    converter.close()
+    return converter.result()
+
+
+class _MarkdownConverter(HTMLParser):
+    """Markdown for the small subset of HTML produced by the note editor."""
+
+    INLINE = {'strong': '**', 'b': '**', 'em': '_', 'i': '_', 'code': '`', 's': '~~'}
+    BLOCK = {'p', 'div', 'blockquote', 'ul', 'ol', 'pre', 'h1', 'h2', 'h3', 'h4'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: List[str] = []
+        self.lists: List[Optional[int]] = []
+        self.links: List[Optional[str]] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.INLINE:
+            self.out.append(self.INLINE[tag])
+        elif tag == 'br':
+            self.out.append('\n')
+        elif tag == 'a':
+            self.links.append(dict(attrs).get('href'))
+            self.out.append('[')
+        elif tag in ('ul', 'ol'):
+            self._break()
+            self.lists.append(0 if tag == 'ol' else None)
+        elif tag == 'li':
+            self.out.append('\n' + '  ' * (len(self.lists) - 1))
+            if self.lists and self.lists[-1] is not None:
+                self.lists[-1] += 1
+                self.out.append(f'{self.lists[-1]}. ')
+            else:
+                self.out.append('- ')
+        elif tag in ('h1', 'h2', 'h3', 'h4'):
+            self._break()
+            self.out.append('#' * int(tag[1]) + ' ')
+        elif tag == 'blockquote':
+            self._break()
+            self.out.append('> ')
+        elif tag in self.BLOCK:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in self.INLINE:
+            self.out.append(self.INLINE[tag])
+        elif tag == 'a':
+            href = self.links.pop() if self.links else None
+            self.out.append(f']({href})' if href else ']')
+        elif tag in ('ul', 'ol'):
+            if self.lists:
+                self.lists.pop()
+            self._break()
+        elif tag in self.BLOCK:
+            self._break()
+
+    def handle_data(self, data):
+        if not data.strip() and (not self.out or self.out[-1].endswith((' ', '\n'))):
+            return
+        self.out.append(re.sub(r'\s+', ' ', data))
+
+    def _break(self):
+        self.out.append('\n\n')
+
+    def result(self) -> str:
+        text = ''.join(self.out)
+        text = re.sub(r'[ \t]+\n', '\n', text)
+        return re.sub(r'\n{3,}', '\n\n', text).strip()
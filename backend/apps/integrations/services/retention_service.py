@@ -0,0 +1,244 @@
+"""Retention of PublishLog rows.
+
+Logs older than ``PUBLISH_LOG_RETENTION_DAYS`` are removed by
+``manage.py prune_publish_logs``, optionally after being archived to gzipped
+JSONL.
+
+On Postgres the log table is partitioned by month on ``created_at`` (see
+migration 0009). Months that expired entirely are detached and dropped,
+which costs no row deletes and leaves no bloat. Rows left over in the
+partially expired month, in the default partition, or on a database without
+partitions are deleted in bounded batches so no single statement holds
+locks for long. Payloads no longer referenced by any log are removed last.
+"""
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import IO, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from apps.integrations.models import PublishLog, PublishPayload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 1000
+# monthly partitions created in advance so rows never land in the default one
+PARTITIONS_AHEAD = 3
+
+
+def get_retention_days() -> int:
+    return int(getattr(settings, 'PUBLISH_LOG_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+
+
+def cutoff(now: Optional[datetime] = None, days: Optional[int] = None) -> datetime:
+    days = get_retention_days() if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+class LogArchive:
+    """Gzipped JSONL file receiving logs before they are deleted."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._file: Optional[IO[str]] = None
+
+    def __enter__(self) -> 'LogArchive':
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.close()
+
+    def write(self, logs: Iterable[PublishLog]) -> None:
+        for log in logs:
+            self._file.write(json.dumps({
+                'id': log.pk,
+                'publish_target_id': log.publish_target_id,
+                'status': log.status,
+                'error_message': log.error_message,
+                'payload_hash': log.payload_id,
+                'request_payload': log.payload.content,
+                'response_payload': log.response_payload,
+                'created_at': log.created_at,
+            }, cls=DjangoJSONEncoder))
+            self._file.write('\n')
+            self.written += 1
+
+
+def prune_logs(
+    before: Optional[datetime] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    archive: Optional[LogArchive] = None,
+) -> int:
+    """Remove logs created before ``before``; returns the number removed."""
+    before = before or cutoff()
+    removed = 0
+    if is_partitioned():
+        for name, lower, upper in partitions():
+            if lower is not None and upper <= before:
+                removed += drop_partition(name, lower, upper, archive)
+    expired = PublishLog.objects.filter(created_at__lt=before)
+    while True:
+        ids = list(expired.order_by('created_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        batch = expired.filter(pk__in=ids)
+        if archive is not None:
+            archive.write(batch.select_related('payload').order_by('created_at'))
+        removed += batch.delete()[0]
+        logger.debug("pruned %s publish logs", len(ids))
+    prune_payloads(before, batch_size)
+    return removed
+
+
+def prune_payloads(before: datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Delete payloads created before ``before`` that no log references.
+
+    Candidates are locked first. A publish reusing one of them at the same
+    moment either holds its row (skipped here) or waits for this delete and
+    stores the payload again; its ``created_at`` is refreshed either way,
+    see ``PublishPayloadManager.store``.
+    """
+    orphans = PublishPayload.objects.filter(created_at__lt=before).filter(
+        ~Exists(PublishLog.objects.filter(payload=OuterRef('pk')))
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        orphans = orphans.select_for_update(skip_locked=True)
+    removed = 0
+    while True:
+        with transaction.atomic():
+            hashes = list(orphans.values_list('pk', flat=True)[:batch_size])
+            if not hashes:
+                return removed
+            removed += PublishPayload.objects.filter(pk__in=hashes).delete()[0]
+
+
+# Postgres partitions
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [PublishLog._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value: datetime, months: int = 0) -> datetime:
+    value = value.astimezone(dt_timezone.utc)
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(lower: datetime) -> str:
+    return f"{PublishLog._meta.db_table}_p{lower:%Y%m}"
+
+
+def partitions() -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """``(name, lower, upper)`` of every partition; bounds are None for the default one."""
+    table = PublishLog._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    result = []
+    for name in names:
+        suffix = name[len(table) + 2:]
+        if name.startswith(f"{table}_p") and len(suffix) == 6 and suffix.isdigit():
+            lower = datetime(int(suffix[:4]), int(suffix[4:]), 1, tzinfo=dt_timezone.utc)
+            result.append((name, lower, month_start(lower, 1)))
+        else:
+            result.append((name, None, None))
+    return result
+
+
+def ensure_partitions(now: Optional[datetime] = None, ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """Create the monthly partitions from this month to ``ahead`` months on.
+
+    When maintenance did not run for a while, the rows of a missing month are
+    already in the default partition and Postgres refuses to create that
+    month over them; they are moved into the new partition instead.
+    """
+    current = month_start(now or timezone.now())
+    existing = partitions()
+    names = {name for name, _, _ in existing}
+    default = next((name for name, lower, _ in existing if lower is None), None)
+    created = []
+    for offset in range(ahead + 1):
+        lower = month_start(current, offset)
+        name = partition_name(lower)
+        if name in names:
+            continue
+        create_partition(name, lower, month_start(lower, 1), default)
+        created.append(name)
+    return created
+
+
+def create_partition(name: str, lower: datetime, upper: datetime, default: Optional[str]) -> None:
+    table = PublishLog._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        if default is not None:
+            cursor.execute(
+                f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE created_at >= %s AND created_at < %s)',
+                [lower, upper],
+            )
+            stranded = cursor.fetchone()[0]
+        else:
+            stranded = False
+        if not stranded:
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            return
+        # fill a plain table, then attach it: ATTACH only checks that the
+        # default partition no longer holds rows of the month
+        columns = ', '.join(f'"{field.column}"' for field in PublishLog._meta.concrete_fields)
+        cursor.execute(
+            f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE created_at >= %s AND created_at < %s '
+            f'RETURNING {columns}) INSERT INTO "{name}" ({columns}) SELECT {columns} FROM moved',
+            [lower, upper],
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+            [lower, upper],
+        )
+    logger.warning(
+        "publish log partition %s was missing, moved %s rows out of %s", name, moved, default
+    )
+
+
+def drop_partition(
+    name: str,
+    lower: datetime,
+    upper: datetime,
+    archive: Optional[LogArchive] = None,
+) -> int:
+    """Archive, detach and drop one expired monthly partition."""
+    rows = PublishLog.objects.filter(created_at__gte=lower, created_at__lt=upper)
+    count = rows.count()
+    if archive is not None:
+        archive.write(rows.select_related('payload').order_by('created_at').iterator())
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{PublishLog._meta.db_table}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+    logger.info("dropped publish log partition %s (%s rows)", name, count)
+    return count
@@ -0,0 +1,102 @@
+"""Exponential-backoff retry policy for failed publish targets.
+
+Each IntegrationDefinition may override the defaults through its
+``retry_policy`` JSON, e.g.::
+
+    {
+        "max_attempts": 5,        # attempts before giving up
+        "base_delay": 30,         # seconds before the first retry
+        "max_delay": 3600,        # upper bound for a single delay
+        "jitter": 0.2,            # +/- fraction applied to every delay
+        "retryable": ["RetryableError", "TimeoutError"]
+    }
+
+``retryable`` lists exception class names; when omitted every error except
+:class:`~apps.integrations.exceptions.PermanentError` is retried.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.integrations.exceptions import PermanentError, RetryableError
+from apps.integrations.models import IntegrationDefinition, PublishTarget
+from apps.integrations.services import event_service
+
+DEFAULT_REQUEUE_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 5
+    base_delay: float = 30.0
+    max_delay: float = 3600.0
+    jitter: float = 0.2
+    retryable: Optional[Sequence[str]] = None
+
+    @classmethod
+    def from_definition(cls, definition: Optional[IntegrationDefinition]) -> 'RetryPolicy':
+        raw: Dict[str, Any] = (definition.retry_policy if definition else None) or {}
+        known = {key: raw[key] for key in cls.__dataclass_fields__ if key in raw}
+        return cls(**known)
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        if isinstance(exc, PermanentError):
+            return False
+        if self.retryable is None or isinstance(exc, RetryableError):
+            return True
+        names = {klass.__name__ for klass in type(exc).__mro__}
+        return bool(names.intersection(self.retryable))
+
+    def delay_for(self, attempt: int) -> float:
+        """Seconds to wait before retry number ``attempt`` (1-based)."""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempt - 1, 0)))
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0.0)
+
+    def next_attempt_at(
+        self, attempt: int, exc: BaseException, now: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """When to retry after failed attempt number ``attempt``, or None to give up."""
+        if attempt >= self.max_attempts or not self.is_retryable(exc):
+            return None
+        now = now or timezone.now()
+        return now + timedelta(seconds=self.delay_for(attempt))
+
+
+def requeue_due_retries(
+    now: Optional[datetime] = None, batch_size: int = DEFAULT_REQUEUE_BATCH_SIZE
+) -> int:
+    """Move failed targets whose ``next_attempt_at`` passed back to the queue.
+
+    Reads at most ``batch_size`` rows through the partial ``pt_retry_due_idx``
+    index and flips them with one UPDATE.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = PublishTarget.objects.filter(
+            status=PublishTarget.STATUS_FAILED,
+            is_enabled=True,
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        pks = list(due.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return 0
+        requeued = PublishTarget.objects.filter(
+            pk__in=pks, status=PublishTarget.STATUS_FAILED
+        ).update(
+            status=PublishTarget.STATUS_QUEUED,
+            queued_at=now,
+            next_attempt_at=None,
+            claimed_at=None,
+            claimed_by='',
+            updated_at=now,
+        )
+        event_service.record_targets(pks)
+    return requeued
@@ -0,0 +1,186 @@
+"""Dispatch of scheduled notes and publish targets.
+
+``manage.py publish_scheduler`` keeps the upcoming due times in an
+in-memory min-heap instead of scanning ``blog_note`` on every tick:
+
+* every refresh loads only the ``(pk, scheduled_at)`` pairs that fall into
+  the next lookahead window, using the ``(status, scheduled_at)`` indexes;
+* rows rescheduled or created inside an already loaded window are picked up
+  through a delta query on ``updated_at``;
+* stale heap entries are dropped lazily: each entry is re-checked by a
+  conditional UPDATE when it comes due, so a note that was rescheduled or
+  cancelled meanwhile simply matches zero rows.
+
+Due rows locked by another transaction are skipped rather than waited for.
+Those, and every item of a dispatch that raised, go back on the heap and
+are tried again ``RETRY_SECONDS`` later.
+"""
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.integrations.models import PublishTarget
+from apps.integrations.services import queue_service
+from blog.models import Note
+
+logger = logging.getLogger(__name__)
+
+KIND_NOTE = 'note'
+KIND_TARGET = 'target'
+
+DEFAULT_LOOKAHEAD_SECONDS = 60
+# rows committed slightly after a refresh query ran must still be seen
+SYNC_SLACK_SECONDS = 30
+DISPATCH_CHUNK_SIZE = 500
+# delay before due items that could not be fired are tried again
+RETRY_SECONDS = 5
+
+
+def scheduled_notes() -> QuerySet[Note]:
+    return Note.objects.alive().filter(
+        status=Note.STATUS_SCHEDULED, scheduled_at__isnull=False
+    )
+
+
+def scheduled_targets() -> QuerySet[PublishTarget]:
+    return PublishTarget.objects.filter(
+        status=PublishTarget.STATUS_DRAFT,
+        is_enabled=True,
+        scheduled_at__isnull=False,
+    )
+
+
+def publish_due_notes(pks: Iterable[Any], now: datetime) -> int:
+    """Move due scheduled notes to published and queue their targets."""
+    pks = list(pks)
+    with transaction.atomic():
+        due = scheduled_notes().filter(pk__in=pks, scheduled_at__lte=now)
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        rows = list(due.values_list('pk', 'uuid'))
+        if not rows:
+            return 0
+        Note.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+            status=Note.STATUS_PUBLISHED,
+            published_at=Coalesce('published_at', Value(now)),
+            updated_at=now,
+        )
+        # targets with their own future scheduled_at wait for it
+        targets = PublishTarget.objects.filter(
+            Q(scheduled_at__isnull=True) | Q(scheduled_at__lte=now),
+            content_type=ContentType.objects.get_for_model(Note),
+            object_id__in=[note_uuid for _, note_uuid in rows],
+        )
+        queued = queue_service.enqueue_queryset(targets, now=now)
+    logger.info("published %s scheduled notes, queued %s targets", len(rows), queued)
+    return len(rows)
+
+
+def queue_due_targets(pks: Iterable[Any], now: datetime) -> int:
+    """Queue scheduled publish targets that came due."""
+    return queue_service.enqueue_queryset(
+        scheduled_targets().filter(pk__in=list(pks), scheduled_at__lte=now),
+        now=now,
+    )
+
+
+class Scheduler:
+    """Min-heap of upcoming due times, refreshed incrementally."""
+
+    def __init__(self, lookahead_seconds: int = DEFAULT_LOOKAHEAD_SECONDS):
+        self.lookahead = timedelta(seconds=lookahead_seconds)
+        self._heap: List[Tuple[datetime, str, Any]] = []
+        # latest known due time per item; heap entries that disagree are stale
+        self._due: Dict[Tuple[str, Any], datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._synced_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _sources(self):
+        return ((KIND_NOTE, scheduled_notes()), (KIND_TARGET, scheduled_targets()))
+
+    def _push(self, kind: str, pk: Any, due_at: datetime) -> None:
+        key = (kind, pk)
+        if self._due.get(key) == due_at:
+            return
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, kind, pk))
+
+    def refresh(self, now: Optional[datetime] = None) -> int:
+        """Load due times up to ``now + lookahead``. Returns rows loaded."""
+        now = now or timezone.now()
+        horizon = now + self.lookahead
+        loaded = 0
+        for kind, qs in self._sources():
+            if self._loaded_until is None:
+                # first load also picks up everything overdue
+                window = qs.filter(scheduled_at__lte=horizon)
+            else:
+                window = qs.filter(
+                    Q(scheduled_at__gt=self._loaded_until, scheduled_at__lte=horizon)
+                    | Q(
+                        scheduled_at__lte=self._loaded_until,
+                        updated_at__gte=self._synced_at - timedelta(seconds=SYNC_SLACK_SECONDS),
+                    )
+                )
+            for pk, due_at in window.values_list('pk', 'scheduled_at').iterator():
+                self._push(kind, pk, due_at)
+                loaded += 1
+        self._loaded_until = horizon
+        self._synced_at = now
+        return loaded
+
+    def next_due_at(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> Dict[str, List[Any]]:
+        due: Dict[str, List[Any]] = {KIND_NOTE: [], KIND_TARGET: []}
+        while self._heap and self._heap[0][0] <= now:
+            due_at, kind, pk = heapq.heappop(self._heap)
+            if self._due.get((kind, pk)) != due_at:
+                continue  # superseded by a newer due time
+            del self._due[(kind, pk)]
+            due[kind].append(pk)
+        return due
+
+    def dispatch_due(self, now: Optional[datetime] = None) -> int:
+        """Fire everything due by ``now``. Returns the number of items fired."""
+        now = now or timezone.now()
+        due = self.pop_due(now)
+        handlers = {KIND_NOTE: publish_due_notes, KIND_TARGET: queue_due_targets}
+        chunks = [
+            (kind, due[kind][start:start + DISPATCH_CHUNK_SIZE])
+            for kind in (KIND_NOTE, KIND_TARGET)
+            for start in range(0, len(due[kind]), DISPATCH_CHUNK_SIZE)
+        ]
+        fired = 0
+        for index, (kind, pks) in enumerate(chunks):
+            try:
+                count = handlers[kind](pks, now)
+            except Exception:
+                for pending_kind, pending in chunks[index:]:
+                    self._retry(pending_kind, pending, now)
+                raise
+            fired += count
+            if count < len(pks):
+                # skipped as locked, or stale; only the former are still due
+                self._retry(kind, self._still_due(kind, pks, now), now)
+        return fired
+
+    def _still_due(self, kind: str, pks: List[Any], now: datetime) -> List[Any]:
+        qs = dict(self._sources())[kind]
+        return list(qs.filter(pk__in=pks, scheduled_at__lte=now).values_list('pk', flat=True))
+
+    def _retry(self, kind: str, pks: Iterable[Any], now: datetime) -> None:
+        retry_at = now + timedelta(seconds=RETRY_SECONDS)
+        for pk in pks:
+            self._push(kind, pk, retry_at)
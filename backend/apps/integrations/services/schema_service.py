@@ -0,0 +1,78 @@
+"""Validation of credentials and publish settings against definition schemas.
+
+``config_schema`` applies to ``Integration.credentials`` and
+``publish_schema`` to the ``publish_settings`` of publish targets and blog
+defaults. Compiled validators are kept per process, keyed by definition id,
+version and schema field; an entry is rebuilt when the definition's
+``updated_at`` moves on (so edits saved by other processes are picked up)
+and dropped right away on save in this process (see signals).
+
+Without the optional ``jsonschema`` package nothing is validated.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import jsonschema
+except ImportError:  # no dependency, skip validation
+    jsonschema = None
+
+CONFIG_SCHEMA = 'config_schema'
+PUBLISH_SCHEMA = 'publish_schema'
+# messages reported per field
+MAX_ERRORS = 5
+
+_validators: Dict[Tuple[Any, str, str], Tuple[Any, Any]] = {}
+_lock = threading.Lock()
+
+
+def credentials_errors(definition, credentials: Any) -> List[str]:
+    return errors(definition, CONFIG_SCHEMA, credentials)
+
+
+def publish_settings_errors(definition, publish_settings: Any) -> List[str]:
+    return errors(definition, PUBLISH_SCHEMA, publish_settings)
+
+
+def errors(definition, field: str, instance: Any) -> List[str]:
+    """Messages for ``instance`` not matching the definition's ``field`` schema."""
+    try:
+        validator = get_validator(definition, field)
+    except jsonschema.SchemaError as exc:
+        return [f'the definition schema is invalid: {exc.message}']
+    if validator is None:
+        return []
+    found = sorted(validator.iter_errors(instance), key=lambda error: list(error.path))
+    return [_message(error) for error in found[:MAX_ERRORS]]
+
+
+def get_validator(definition, field: str) -> Optional[Any]:
+    """Compiled validator of the definition's schema, None without a schema."""
+    schema = getattr(definition, field)
+    if jsonschema is None or not schema:
+        return None
+    key = (definition.pk, definition.version, field)
+    cached = _validators.get(key)
+    if cached is not None and cached[0] == definition.updated_at:
+        return cached[1]
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = cls(schema)
+    with _lock:
+        _validators[key] = (definition.updated_at, validator)
+    return validator
+
+
+def invalidate(definition_id: Optional[Any] = None) -> None:
+    """Forget compiled validators, for one definition or all of them."""
+    with _lock:
+        if definition_id is None:
+            _validators.clear()
+            return
+        for key in [key for key in _validators if key[0] == definition_id]:
+            del _validators[key]
+
+
+def _message(error) -> str:
+    path = '.'.join(str(part) for part in error.absolute_path)
+    return f'invalid: {path}: {error.message}' if path else f'invalid: {error.message}'
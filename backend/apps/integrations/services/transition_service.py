@@ -0,0 +1,122 @@
+"""Compare-and-set status transitions of PublishTarget.
+
+Every change is a conditional UPDATE that only matches while the row is
+still in the expected state, and reports whether it won::
+
+    draft/failed/dead  --enqueue-->  queued  --claim-->  queued, claimed_by=<token>
+    queued, claimed_by=<token>  --finish-->  published/failed/dead
+
+Only the holder of the claim token sends to the provider and records the
+outcome. Two publish clicks, or a worker and an API call, racing for the
+same target therefore never both send, and never overwrite each other's
+fields. A claim is a lease: one older than ``PUBLISH_WORKER_LEASE_SECONDS``
+is considered abandoned by a dead process and may be taken over.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.expressions import Combinable
+from django.utils import timezone
+
+from apps.integrations.models import PublishTarget
+from apps.integrations.services import event_service
+
+DEFAULT_LEASE_SECONDS = 300
+
+# states a target may be (re)queued from
+ENQUEUEABLE = (
+    PublishTarget.STATUS_DRAFT,
+    PublishTarget.STATUS_FAILED,
+    PublishTarget.STATUS_DEAD,
+    PublishTarget.STATUS_QUEUED,
+)
+
+
+def get_lease_seconds() -> int:
+    return int(getattr(settings, 'PUBLISH_WORKER_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+
+
+def unclaimed(now: Optional[datetime] = None) -> Q:
+    """Rows nobody holds a live claim on."""
+    stale_before = (now or timezone.now()) - timedelta(seconds=get_lease_seconds())
+    return Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale_before)
+
+
+def new_token(owner: str) -> str:
+    return f"{owner}:{uuid.uuid4().hex}"
+
+
+def enqueue(target: PublishTarget, content: Optional[Dict[str, Any]] = None) -> bool:
+    """draft/failed/dead/queued -> queued with ``content`` as the pending payload."""
+    now = timezone.now()
+    fields = {
+        'status': PublishTarget.STATUS_QUEUED,
+        'pending_payload': content or {},
+        'queued_at': now,
+        'claimed_at': None,
+        'claimed_by': '',
+        'next_attempt_at': None,
+    }
+    with transaction.atomic():
+        won = PublishTarget.objects.filter(
+            unclaimed(now), pk=target.pk, is_enabled=True, status__in=ENQUEUEABLE
+        ).update(updated_at=now, **fields)
+        if won:
+            _apply(target, fields)
+            event_service.record_target(target)
+    return bool(won)
+
+
+def claim(target: PublishTarget, token: str) -> bool:
+    """Take the right to send ``target``.
+
+    A target already claimed with ``token`` (by the worker's batch claim) only
+    has its lease renewed, which also proves the claim was not lost to
+    another worker in the meantime.
+    """
+    now = timezone.now()
+    if target.claimed_by == token:
+        won = PublishTarget.objects.filter(
+            pk=target.pk, status=PublishTarget.STATUS_QUEUED, claimed_by=token
+        ).update(claimed_at=now)
+    else:
+        won = PublishTarget.objects.filter(
+            unclaimed(now), pk=target.pk, is_enabled=True, status__in=ENQUEUEABLE
+        ).update(status=PublishTarget.STATUS_QUEUED, claimed_by=token, claimed_at=now)
+    if won:
+        _apply(target, {'status': PublishTarget.STATUS_QUEUED, 'claimed_by': token, 'claimed_at': now})
+    return bool(won)
+
+
+def finish(target: PublishTarget, token: str, fields: Dict[str, Any]) -> bool:
+    """Write the outcome of an attempt and drop the claim, if still held."""
+    now = timezone.now()
+    with transaction.atomic():
+        won = PublishTarget.objects.filter(pk=target.pk, claimed_by=token).update(
+            claimed_at=None, claimed_by='', updated_at=now, **fields
+        )
+        if won:
+            _apply(target, {'claimed_at': None, 'claimed_by': '', **fields})
+            event_service.record_target(target)
+    return bool(won)
+
+
+def release(target: PublishTarget, token: str) -> bool:
+    """Drop the claim without changing the status."""
+    won = PublishTarget.objects.filter(pk=target.pk, claimed_by=token).update(
+        claimed_at=None, claimed_by=''
+    )
+    if won:
+        _apply(target, {'claimed_at': None, 'claimed_by': ''})
+    return bool(won)
+
+
+def _apply(target: PublishTarget, fields: Dict[str, Any]) -> None:
+    for name, value in fields.items():
+        # expressions such as F('retry_count') + 1 are left to the caller
+        if not isinstance(value, Combinable):
+            setattr(target, name, value)
@@ -0,0 +1,32 @@
+import logging
+
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import registry
+from .models import IntegrationDefinition
+from .services import catalogue_service, schema_service
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=IntegrationDefinition)
+@receiver(post_delete, sender=IntegrationDefinition)
+def invalidate_cached_handler(sender, instance, **kwargs):
+    registry.invalidate(instance.code)
+    schema_service.invalidate(instance.pk)
+    # after commit, so no process caches the old rows under the new version
+    transaction.on_commit(catalogue_service.bump)
+
+
+@receiver(post_migrate)
+def invalidate_catalogue(sender, **kwargs):
+    # data migrations write definitions without model signals
+    if sender.name != 'apps.integrations':
+        return
+    try:
+        catalogue_service.bump()
+    except DatabaseError:
+        # the database cache table is created after migrate
+        logger.warning("integration catalogue cache not reset, run createcachetable")
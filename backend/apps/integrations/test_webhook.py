@@ -0,0 +1,320 @@
+"""Webhook handler and keep-alive pool tests against a local HTTP server."""
+import asyncio
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from apps.integrations import http_client
+from apps.integrations.handlers.webhook import WebhookHandler
+from apps.integrations.models import IntegrationDefinition, PublishLog, PublishTarget
+from apps.integrations.services.publish_service import publish_target
+from blog.models import Blog, Integration, Note
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # one write per response, unbuffered writes stall keep-alive on delayed ACKs
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+            self.server.requests.append(body)
+        try:
+            if self.path == '/hangup':
+                # processed, but the connection drops before the response
+                self.close_connection = True
+                return
+            if self.server.barrier is not None:
+                self.server.barrier.wait()
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            status = {'/fail': 500, '/bad': 400, '/busy': 429}.get(self.path, 200)
+            if self.path == '/batch':
+                payload = json.dumps({'results': [
+                    {'ok': not item['content'].get('reject'), 'error': 'rejected'}
+                    for item in json.loads(body)['items']
+                ]}).encode()
+            else:
+                payload = json.dumps({'received': len(body)}).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            # hang up without announcing it, like an idle timeout on the server
+            self.close_connection = self.server.drop_connections
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def allow_private_webhooks(settings):
+    # the stand-in server listens on loopback
+    settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES = True
+
+
+@pytest.fixture
+def stand_in_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.active = 0
+    server.max_active = 0
+    server.delay = 0
+    # set by a test: requests wait there until that many are in flight
+    server.barrier = None
+    server.drop_connections = False
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuses_one_connection(stand_in_server):
+    pool = http_client.ConnectionPool()
+    for i in range(50):
+        response = pool.post_json(f'{stand_in_server.url}/ok', {'i': i})
+        assert response.status == 200
+        assert response.json() == {'received': len(json.dumps({'i': i}))}
+    assert pool.connections_opened == 1
+    assert stand_in_server.connections == 1
+    pool.close()
+
+
+def test_pool_limits_concurrency_per_host(stand_in_server):
+    stand_in_server.delay = 0.02
+    pool = http_client.ConnectionPool(max_per_host=3)
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        statuses = list(
+            executor.map(lambda i: pool.post_json(f'{stand_in_server.url}/ok', {}).status, range(24))
+        )
+    assert statuses == [200] * 24
+    assert stand_in_server.max_active <= 3
+    assert pool.connections_opened <= 3
+    pool.close()
+
+
+def test_pool_recovers_from_server_closed_connection(stand_in_server):
+    stand_in_server.drop_connections = True
+    pool = http_client.ConnectionPool()
+    assert pool.post_json(f'{stand_in_server.url}/ok', {}).ok
+    time.sleep(0.05)
+    assert pool.post_json(f'{stand_in_server.url}/ok', {}).ok
+    assert pool.connections_opened == 2
+    assert len(stand_in_server.requests) == 2
+    pool.close()
+
+
+def test_pool_does_not_resend_post_after_server_hangs_up(stand_in_server):
+    pool = http_client.ConnectionPool()
+    assert pool.post_json(f'{stand_in_server.url}/ok', {}).ok
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.post_json(f'{stand_in_server.url}/hangup', {})
+    assert len(stand_in_server.requests) == 2
+    assert pool.connections_opened == 1
+    pool.close()
+
+
+def _webhook_target(url):
+    User = get_user_model()
+    user = User.objects.create_user(username=f'wh{url[-6:]}', password='pass')
+    note = Note.objects.create(blog=Blog.objects.create(owner=user, title='b'), title='n')
+    definition = IntegrationDefinition.objects.get_or_create(
+        code='webhook-test',
+        defaults={
+            'name': 'Webhook',
+            'category': 'automation',
+            'config_schema': {'type': 'object'},
+            'handler_path': 'apps.integrations.handlers.webhook.WebhookHandler',
+        },
+    )[0]
+    integration = Integration.objects.create(
+        owner=user,
+        definition=definition,
+        name='wh',
+        title='wh',
+        provider='telegram',
+        credentials={'url': url},
+    )
+    return PublishTarget.objects.create(
+        integration=integration,
+        content_type=ContentType.objects.get_for_model(Note),
+        object_id=note.uuid,
+    )
+
+
+@pytest.mark.django_db
+def test_webhook_publish_success(stand_in_server):
+    target = _webhook_target(f'{stand_in_server.url}/ok')
+    publish_target(target, {'title': 'hello'})
+    target.refresh_from_db()
+    assert target.status == PublishTarget.STATUS_PUBLISHED
+    log = target.logs.get()
+    assert log.status == PublishLog.STATUS_SUCCESS
+    assert log.response_payload['status'] == 200
+    sent = json.loads(stand_in_server.requests[-1])
+    assert sent['content'] == {'title': 'hello'}
+    assert sent['target_id'] == str(target.pk)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path,retried', [('/fail', True), ('/busy', True), ('/bad', False)])
+def test_webhook_errors_are_classified(stand_in_server, path, retried):
+    target = _webhook_target(f'{stand_in_server.url}{path}')
+    publish_target(target, {'title': 'hello'})
+    target.refresh_from_db()
+    expected = PublishTarget.STATUS_FAILED if retried else PublishTarget.STATUS_DEAD
+    assert target.status == expected
+    assert (target.next_attempt_at is not None) is retried
+
+
+@pytest.mark.parametrize('address,public', [
+    ('127.0.0.1', False),
+    ('10.1.2.3', False),
+    ('169.254.169.254', False),
+    ('::1', False),
+    ('::ffff:192.168.0.1', False),
+    ('8.8.8.8', True),
+])
+def test_resolve_refuses_non_public_addresses(address, public):
+    if public:
+        assert http_client.resolve(address, 80, public_only=True) == address
+    else:
+        with pytest.raises(http_client.UnsafeAddress):
+            http_client.resolve(address, 80, public_only=True)
+        assert http_client.resolve(address, 80) == address
+
+
+@pytest.mark.django_db
+def test_webhook_refuses_private_urls(stand_in_server, settings):
+    settings.WEBHOOK_ALLOW_PRIVATE_ADDRESSES = False
+    target = _webhook_target(f'{stand_in_server.url}/ok')
+    publish_target(target, {'title': 'hello'})
+    target.refresh_from_db()
+    assert target.status == PublishTarget.STATUS_DEAD
+    assert 'non-public address' in target.last_error
+    assert stand_in_server.requests == []
+
+
+def test_webhook_apublish_runs_concurrently(stand_in_server):
+    # delivered one after another, the requests would time out on the barrier
+    stand_in_server.barrier = threading.Barrier(5, timeout=10)
+
+    class Integ:
+        credentials = {'url': f'{stand_in_server.url}/ok'}
+
+    class Target:
+        pk = 'pk'
+        object_id = 'obj'
+        publish_settings = {}
+
+    handler = WebhookHandler()
+
+    async def deliver_all():
+        return await asyncio.gather(
+            *(handler.apublish(Integ(), Target(), {'i': i}) for i in range(5))
+        )
+
+    results = asyncio.run(deliver_all())
+    assert [r['status'] for r in results] == [200] * 5
+    assert not stand_in_server.barrier.broken
+    assert stand_in_server.max_active == 5
+
+
+def _deliver(server, pooled, deliveries, threads=8):
+    """POST ``deliveries`` times from ``threads`` threads; ``(seconds, connections)``."""
+    url = f'{server.url}/ok'
+    body = json.dumps({'title': 'hello'}).encode()
+    headers = {'Content-Type': 'application/json'}
+    pool = http_client.ConnectionPool(max_per_host=threads)
+
+    def send():
+        if pooled:
+            return pool.request('POST', url, body, headers)
+        return http_client.request_once('POST', url, body, headers)
+
+    before = server.connections
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        statuses = list(executor.map(lambda _: send().status, range(deliveries)))
+    elapsed = time.monotonic() - started
+    pool.close()
+    assert statuses == [200] * deliveries
+    return elapsed, server.connections - before
+
+
+def test_pool_reuses_connections_across_deliveries(stand_in_server):
+    assert _deliver(stand_in_server, pooled=False, deliveries=200)[1] == 200
+    assert _deliver(stand_in_server, pooled=True, deliveries=200)[1] <= 8
+
+
+@pytest.mark.skipif(not os.getenv('WEBHOOK_BENCHMARK'), reason='set WEBHOOK_BENCHMARK=1 to run')
+def test_delivery_throughput_pooled_vs_unpooled(stand_in_server, capsys):
+    deliveries = 1000
+    results = {
+        mode: _deliver(stand_in_server, pooled=mode == 'pooled', deliveries=deliveries)
+        for mode in ('unpooled', 'pooled')
+    }
+    assert results['unpooled'][1] == deliveries
+    assert results['pooled'][1] <= 8
+    with capsys.disabled():
+        for mode, (elapsed, connections) in results.items():
+            print(f'\n{mode}: {deliveries / elapsed:.0f} deliveries/s, {connections} connections')
+
+
+@pytest.mark.django_db
+def test_webhook_batches_queued_targets(stand_in_server):
+    from apps.integrations.services import queue_service
+    target = _webhook_target(f'{stand_in_server.url}/batch')
+    definition = target.integration.definition
+    definition.batch_policy = {'max_size': 5, 'window_seconds': 0}
+    definition.save()
+    blog = Note.objects.get(uuid=target.object_id).blog
+    targets = [target] + [
+        PublishTarget.objects.create(
+            integration=target.integration,
+            content_type=target.content_type,
+            object_id=Note.objects.create(blog=blog, title=f'n{i}').uuid,
+        )
+        for i in range(11)
+    ]
+    for i, item in enumerate(targets):
+        queue_service.enqueue_target(item, {'i': i, 'reject': i == 3})
+
+    while queue_service.run_once('w1'):
+        pass
+
+    # 12 targets in batches of 5, 5 and 2
+    assert [len(json.loads(body)['items']) for body in stand_in_server.requests] == [5, 5, 2]
+    statuses = {
+        item.pk: item.status for item in PublishTarget.objects.filter(pk__in=[t.pk for t in targets])
+    }
+    assert statuses.pop(targets[3].pk) == PublishTarget.STATUS_DEAD
+    assert set(statuses.values()) == {PublishTarget.STATUS_PUBLISHED}
+    assert PublishLog.objects.filter(publish_target__in=targets).count() == 12
+    assert 'rejected' in PublishTarget.objects.get(pk=targets[3].pk).last_error
@@ -1,5 +1,6 @@
 import pytest
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from django.urls import reverse
 
@@ -186,6 +187,7 @@ def api_client():
 
 @pytest.mark.django_db
 def test_list_integration_definitions(api_client):
+    cache.clear()
     IntegrationDefinition.objects.create(
         code='a1',
         name='Active',
@@ -214,6 +216,53 @@ def test_list_integration_definitions(api_client):
     assert 'a1' in codes and 'i1' not in codes
 
 
+@pytest.mark.django_db
+def test_integration_definitions_cached_per_catalogue_version(
+    api_client, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    from django.contrib.auth import get_user_model
+    from apps.integrations.services import catalogue_service
+    cache.clear()
+    definition = IntegrationDefinition.objects.create(
+        code='cv1', name='Cached', category='cat', config_schema={'type': 'object'}, handler_path='h'
+    )
+    api_client.force_authenticate(user=get_user_model().objects.create_user(username='ucv', password='pass'))
+    list_url = reverse('integration-definitions-list')
+    detail_url = reverse('integration-definitions-detail', args=[definition.pk])
+
+    def listed():
+        # the seeded definitions are listed too
+        return {item['code']: item for item in api_client.get(list_url).json()}
+
+    assert listed()['cv1']['name'] == 'Cached'
+    assert api_client.get(detail_url).json()['name'] == 'Cached'
+
+    # bypasses the signals and keeps updated_at, so the cached bytes stay
+    IntegrationDefinition.objects.filter(pk=definition.pk).update(name='Stale')
+    with django_assert_num_queries(1):  # the ETag version only
+        resp = api_client.get(list_url, {'unknown': 'param'})
+    assert {item['code']: item for item in resp.json()}['cv1']['name'] == 'Cached'
+    assert resp['Content-Type'] == 'application/json'
+    with django_assert_num_queries(1):
+        assert api_client.get(detail_url).json()['name'] == 'Cached'
+
+    catalogue_service.bump()
+    assert listed()['cv1']['name'] == 'Stale'
+    assert api_client.get(detail_url).json()['name'] == 'Stale'
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        definition.name = 'Renamed'
+        definition.save()
+    assert catalogue_service.bump in callbacks
+    assert listed()['cv1']['name'] == 'Renamed'
+    assert api_client.get(detail_url).json()['name'] == 'Renamed'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        definition.delete()
+    assert 'cv1' not in listed()
+    assert api_client.get(detail_url).status_code == 404
+
+
 @pytest.mark.django_db
 def test_integration_crud(api_client):
     from django.contrib.auth import get_user_model
@@ -284,8 +333,1138 @@ def test_publish_target_api_and_permissions(api_client):
     api_client.force_authenticate(user=user1)
     registry.register(defn.code, DummyHandler)
     resp = api_client.post(f"{url_detail}publish/", {}, format='json')
-    assert resp.status_code == 200
+    assert resp.status_code == 202
+    assert resp.json()['status'] == PublishTarget.STATUS_QUEUED
+    from apps.integrations.services import queue_service
+    assert queue_service.run_once('test-worker') == 1
+    assert PublishTarget.objects.get(pk=target_id).status == PublishTarget.STATUS_PUBLISHED
     resp = api_client.get(f"{url_detail}logs/")
     assert resp.status_code == 200
     data = resp.json()
-    assert isinstance(data, list)
+    assert len(data['results']) == 1
+    assert data['next'] is None
+
+
+@pytest.mark.django_db
+def test_publish_target_update_leaves_worker_fields_alone(api_client):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    user = get_user_model().objects.create_user(username='u7p', password='pass')
+    api_client.force_authenticate(user=user)
+    note = Note.objects.create(blog=Blog.objects.create(owner=user, title='b7p'), title='n7p')
+    defn = IntegrationDefinition.objects.create(
+        code='c3p', name='Def3p', category='cat', config_schema={}, handler_path='h'
+    )
+    integ = Integration.objects.create(owner=user, definition=defn, name='n', title='t', provider='x')
+    target = PublishTarget.objects.create(
+        integration=integ,
+        content_type=ContentType.objects.get_for_model(note),
+        object_id=note.uuid,
+        status=PublishTarget.STATUS_QUEUED,
+    )
+    url = reverse('publish-targets-detail', args=[target.pk])
+    with CaptureQueriesContext(connection) as queries:
+        resp = api_client.patch(url, {'is_enabled': False, 'status': 'published'}, format='json')
+    assert resp.status_code == 200
+    target.refresh_from_db()
+    assert target.is_enabled is False
+    assert target.status == PublishTarget.STATUS_QUEUED
+    (update,) = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+    assert 'is_enabled' in update
+    assert 'status' not in update and 'retry_count' not in update and 'claimed_by' not in update
+
+
+# publish worker tests
+
+
+def _make_queued_targets(username, code, count):
+    from django.contrib.auth import get_user_model
+    from apps.integrations.services import queue_service
+    User = get_user_model()
+    user = User.objects.create_user(username=username, password='pass')
+    blog = Blog.objects.create(owner=user, title='bq')
+    definition = IntegrationDefinition.objects.create(
+        code=code,
+        name=code,
+        category='feed',
+        config_schema={'type': 'object'},
+        handler_path='unused',
+    )
+    integ = Integration.objects.create(
+        owner=user,
+        definition=definition,
+        name='nq',
+        title='tq',
+        provider='telegram',
+    )
+    ct = ContentType.objects.get_for_model(Note)
+    targets = []
+    for i in range(count):
+        note = Note.objects.create(blog=blog, title=f'n{i}')
+        target = PublishTarget.objects.create(
+            integration=integ,
+            content_type=ct,
+            object_id=note.uuid,
+        )
+        queue_service.enqueue_target(target, {'i': i})
+        targets.append(target)
+    return targets
+
+
+@pytest.mark.django_db
+def test_workers_do_not_claim_same_targets():
+    from apps.integrations.services import queue_service
+    _make_queued_targets('uq1', 'q1', 5)
+    first = queue_service.claim_targets('w1', batch_size=3)
+    second = queue_service.claim_targets('w2', batch_size=10)
+    assert len(first) == 3
+    assert len(second) == 2
+    assert not {t.pk for t in first} & {t.pk for t in second}
+    assert queue_service.claim_targets('w3') == []
+
+
+@pytest.mark.django_db
+def test_expired_claim_is_reclaimed(settings):
+    from apps.integrations.services import queue_service
+    _make_queued_targets('uq2', 'q2', 1)
+    assert len(queue_service.claim_targets('w1')) == 1
+    assert queue_service.claim_targets('w2') == []
+    settings.PUBLISH_WORKER_LEASE_SECONDS = -1
+    assert len(queue_service.claim_targets('w2')) == 1
+
+
+@pytest.mark.django_db
+def test_enqueue_queryset_drops_stale_client_payload():
+    from apps.integrations.services import queue_service
+    (target,) = _make_queued_targets('uq3', 'q3', 1)
+    PublishTarget.objects.filter(pk=target.pk).update(status=PublishTarget.STATUS_FAILED)
+    assert queue_service.enqueue_queryset(PublishTarget.objects.filter(pk=target.pk)) == 1
+    target.refresh_from_db()
+    assert target.status == PublishTarget.STATUS_QUEUED
+    assert target.pending_payload is None
+
+
+@pytest.mark.django_db
+def test_worker_publishes_queued_payload():
+    from django.core.management import call_command
+    targets = _make_queued_targets('uq3', 'q3', 2)
+    registry.register('q3', DummyHandler)
+    call_command('publish_worker', '--once')
+    for target in targets:
+        target.refresh_from_db()
+        assert target.status == PublishTarget.STATUS_PUBLISHED
+        assert target.claimed_by == ''
+        assert target.logs.get().request_payload == {'i': targets.index(target)}
+
+
+# scheduler tests
+
+
+@pytest.mark.django_db
+def test_scheduler_publishes_due_notes_and_queues_targets():
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.services.scheduler_service import Scheduler
+    targets = _make_queued_targets('us1', 's1', 2)
+    PublishTarget.objects.update(status=PublishTarget.STATUS_DRAFT)
+    now = timezone.now()
+    due_note = Note.objects.get(uuid=targets[0].object_id)
+    later_note = Note.objects.get(uuid=targets[1].object_id)
+    Note.objects.filter(pk=due_note.pk).update(
+        status=Note.STATUS_SCHEDULED, scheduled_at=now - timedelta(seconds=5)
+    )
+    Note.objects.filter(pk=later_note.pk).update(
+        status=Note.STATUS_SCHEDULED, scheduled_at=now + timedelta(hours=1)
+    )
+    scheduler = Scheduler(lookahead_seconds=60)
+    assert scheduler.refresh(now) == 1
+    assert scheduler.dispatch_due(now) == 1
+    due_note.refresh_from_db()
+    assert due_note.status == Note.STATUS_PUBLISHED
+    assert due_note.published_at is not None
+    assert PublishTarget.objects.get(pk=targets[0].pk).status == PublishTarget.STATUS_QUEUED
+    assert PublishTarget.objects.get(pk=targets[1].pk).status == PublishTarget.STATUS_DRAFT
+    later_note.refresh_from_db()
+    assert later_note.status == Note.STATUS_SCHEDULED
+
+
+@pytest.mark.django_db
+def test_scheduler_picks_up_rescheduled_items():
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.services.scheduler_service import Scheduler
+    targets = _make_queued_targets('us2', 's2', 1)
+    now = timezone.now()
+    PublishTarget.objects.update(
+        status=PublishTarget.STATUS_DRAFT, scheduled_at=now + timedelta(seconds=30)
+    )
+    scheduler = Scheduler(lookahead_seconds=60)
+    scheduler.refresh(now)
+    # moved earlier inside the already loaded window
+    target = PublishTarget.objects.get(pk=targets[0].pk)
+    target.scheduled_at = now + timedelta(seconds=10)
+    target.save()
+    scheduler.refresh(now + timedelta(seconds=1))
+    assert len(scheduler) == 1
+    assert scheduler.dispatch_due(now + timedelta(seconds=11)) == 1
+    assert PublishTarget.objects.get(pk=target.pk).status == PublishTarget.STATUS_QUEUED
+    # the superseded heap entry is dropped without firing again
+    assert scheduler.dispatch_due(now + timedelta(seconds=31)) == 0
+
+
+@pytest.mark.django_db
+def test_scheduler_retries_items_it_could_not_fire(monkeypatch):
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.services import scheduler_service
+    (target,) = _make_queued_targets('us3', 's3', 1)
+    now = timezone.now()
+    note = Note.objects.get(uuid=target.object_id)
+    Note.objects.filter(pk=note.pk).update(status=Note.STATUS_SCHEDULED, scheduled_at=now)
+    publish_due_notes = scheduler_service.publish_due_notes
+    scheduler = scheduler_service.Scheduler(lookahead_seconds=60)
+    scheduler.refresh(now)
+
+    def failing(pks, when):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(scheduler_service, 'publish_due_notes', failing)
+    with pytest.raises(RuntimeError):
+        scheduler.dispatch_due(now)
+    assert len(scheduler) == 1
+    # a row locked by an edit is skipped, not lost
+    monkeypatch.setattr(scheduler_service, 'publish_due_notes', lambda pks, when: 0)
+    retry_at = now + timedelta(seconds=scheduler_service.RETRY_SECONDS)
+    assert scheduler.dispatch_due(retry_at) == 0
+    assert len(scheduler) == 1
+    monkeypatch.setattr(scheduler_service, 'publish_due_notes', publish_due_notes)
+    assert scheduler.dispatch_due(retry_at) == 0
+    assert scheduler.dispatch_due(retry_at + timedelta(seconds=scheduler_service.RETRY_SECONDS)) == 1
+    note.refresh_from_db()
+    assert note.status == Note.STATUS_PUBLISHED
+    assert len(scheduler) == 0
+
+
+# retry policy tests
+
+
+def test_retry_policy_backoff_and_classification():
+    from apps.integrations.exceptions import PermanentError, RetryableError
+    from apps.integrations.services.retry_service import RetryPolicy
+    policy = RetryPolicy(base_delay=10, max_delay=100, jitter=0)
+    assert [policy.delay_for(n) for n in (1, 2, 3, 5)] == [10, 20, 40, 100]
+    assert policy.is_retryable(RuntimeError('x'))
+    assert not policy.is_retryable(PermanentError('x'))
+    strict = RetryPolicy(retryable=['TimeoutError'])
+    assert strict.is_retryable(TimeoutError())
+    assert strict.is_retryable(RetryableError())
+    assert not strict.is_retryable(RuntimeError())
+    assert policy.next_attempt_at(policy.max_attempts, RuntimeError()) is None
+
+
+@pytest.mark.django_db
+def test_failed_publish_is_retried_until_exhausted():
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.services import queue_service, retry_service
+    targets = _make_queued_targets('ur1', 'r1', 1)
+    IntegrationDefinition.objects.filter(code='r1').update(
+        retry_policy={'max_attempts': 2, 'base_delay': 60, 'jitter': 0}
+    )
+    registry.register('r1', ErrorHandler)
+    queue_service.run_once('w1')
+    target = PublishTarget.objects.get(pk=targets[0].pk)
+    assert target.status == PublishTarget.STATUS_FAILED
+    assert target.next_attempt_at is not None
+    assert target.pending_payload == {'i': 0}
+    # not due yet
+    assert retry_service.requeue_due_retries() == 0
+    PublishTarget.objects.filter(pk=target.pk).update(
+        next_attempt_at=timezone.now() - timedelta(seconds=1)
+    )
+    assert retry_service.requeue_due_retries() == 1
+    assert PublishTarget.objects.get(pk=target.pk).status == PublishTarget.STATUS_QUEUED
+    queue_service.run_once('w1')
+    target.refresh_from_db()
+    assert target.status == PublishTarget.STATUS_DEAD
+    assert target.retry_count == 2
+    assert target.next_attempt_at is None
+    assert target.logs.count() == 2
+
+
+@pytest.mark.django_db
+def test_dead_targets_are_grouped_and_requeued(api_client):
+    from io import StringIO
+    from django.core.management import call_command
+    from apps.integrations.services import queue_service
+    targets = _make_queued_targets('ud1', 'd1', 3)
+    IntegrationDefinition.objects.filter(code='d1').update(retry_policy={'max_attempts': 1})
+    registry.register('d1', ErrorHandler)
+    queue_service.run_once('w1')
+    integ = targets[0].integration
+    assert set(
+        PublishTarget.objects.filter(pk__in=[t.pk for t in targets]).values_list('status', flat=True)
+    ) == {PublishTarget.STATUS_DEAD}
+
+    api_client.force_authenticate(user=integ.owner)
+    resp = api_client.get('/api/publish-targets/dead/')
+    assert resp.status_code == 200
+    (group,) = resp.json()
+    assert group['integration_id'] == integ.pk
+    assert group['error_class'] == 'RuntimeError'
+    assert group['count'] == 3
+    assert group['last_error'] == 'fail'
+    out = StringIO()
+    call_command('publish_dead_letters', stdout=out)
+    assert f'integration {integ.pk} (tq) RuntimeError: 3 targets' in out.getvalue()
+
+    # requeue needs a scope; another error class matches nothing
+    assert api_client.post('/api/publish-targets/dead/requeue/', {}, format='json').status_code == 400
+    resp = api_client.post(
+        '/api/publish-targets/dead/requeue/', {'error_class': 'TimeoutError'}, format='json'
+    )
+    assert resp.json() == {'requeued': 0}
+    resp = api_client.post(
+        '/api/publish-targets/dead/requeue/',
+        {'integration_id': integ.pk, 'error_class': 'RuntimeError'},
+        format='json',
+    )
+    assert resp.json() == {'requeued': 3}
+    target = PublishTarget.objects.get(pk=targets[0].pk)
+    assert target.status == PublishTarget.STATUS_QUEUED
+    assert target.retry_count == 0
+    assert target.pending_payload == {'i': 0}
+
+
+# registry tests
+
+
+@pytest.mark.django_db
+def test_registry_reuses_handlers_without_queries(django_assert_num_queries):
+    definition = IntegrationDefinition.objects.create(
+        code='reg1',
+        name='Reg1',
+        category='feed',
+        config_schema={'type': 'object'},
+        handler_path='apps.integrations.tests.DummyHandler',
+    )
+    registry.invalidate()
+    with django_assert_num_queries(1):
+        first = registry.get_handler('reg1')
+        assert registry.get_handler('reg1') is first
+    with django_assert_num_queries(0):
+        assert registry.get_handler('reg1', definition=definition) is first
+    assert isinstance(first, DummyHandler)
+
+
+@pytest.mark.django_db
+def test_registry_warm_imports_handlers(monkeypatch, django_assert_num_queries):
+    IntegrationDefinition.objects.create(
+        code='reg3',
+        name='Reg3',
+        category='feed',
+        config_schema={'type': 'object'},
+        handler_path='apps.integrations.tests.DummyHandler',
+    )
+    registry.invalidate()
+    registry.warm()
+
+    def no_imports(path):
+        raise AssertionError(f'{path} imported after warm-up')
+
+    monkeypatch.setattr(registry, 'import_string', no_imports)
+    with django_assert_num_queries(0):
+        assert isinstance(registry.get_handler('reg3'), DummyHandler)
+
+
+@pytest.mark.django_db
+def test_registry_notices_definition_changes():
+    definition = IntegrationDefinition.objects.create(
+        code='reg2',
+        name='Reg2',
+        category='feed',
+        config_schema={'type': 'object'},
+        handler_path='apps.integrations.tests.DummyHandler',
+    )
+    assert isinstance(registry.get_handler('reg2'), DummyHandler)
+    # saved in this process: dropped by the post_save signal
+    definition.handler_path = 'apps.integrations.tests.ErrorHandler'
+    definition.version = '2.0'
+    definition.save()
+    assert isinstance(registry.get_handler('reg2'), ErrorHandler)
+    # saved elsewhere: the loaded definition carries the new path
+    IntegrationDefinition.objects.filter(pk=definition.pk).update(
+        handler_path='apps.integrations.tests.DummyHandler', version='3.0'
+    )
+    definition.refresh_from_db()
+    assert isinstance(registry.get_handler('reg2', definition=definition), DummyHandler)
+
+
+# fan-out publish tests
+
+
+class SlowHandler:
+    # staggered delays: the in-memory test database can't take concurrent writes
+    delay = 0.3
+    # set by a test: every handler waits there until all of them are running
+    barrier = None
+
+    def publish(self, integration, publish_target, content):
+        import time
+        if SlowHandler.barrier is not None:
+            SlowHandler.barrier.wait()
+        time.sleep(self.delay)
+        return {'ok': True}
+
+
+class SlowerHandler(SlowHandler):
+    delay = 0.4
+
+
+class SlowErrorHandler(SlowHandler):
+    delay = 0.2
+
+    def publish(self, integration, publish_target, content):
+        super().publish(integration, publish_target, content)
+        raise RuntimeError('fail')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_note_publish_fans_out_concurrently(api_client, monkeypatch):
+    import threading
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    user = User.objects.create_user(username='uf1', password='pass')
+    blog = Blog.objects.create(owner=user, title='bf')
+    note = Note.objects.create(blog=blog, title='nf')
+    ct = ContentType.objects.get_for_model(Note)
+    for code, handler in (('f1', SlowHandler), ('f2', SlowerHandler), ('f3', SlowErrorHandler)):
+        definition = IntegrationDefinition.objects.create(
+            code=code,
+            name=code,
+            category='feed',
+            config_schema={'type': 'object'},
+            handler_path='unused',
+        )
+        registry.register(code, handler)
+        integ = Integration.objects.create(
+            owner=user, definition=definition, name=code, title=code, provider='telegram'
+        )
+        PublishTarget.objects.create(integration=integ, content_type=ct, object_id=note.uuid)
+    api_client.force_authenticate(user=user)
+    url = reverse('notes-detail', kwargs={'uuid': note.uuid})
+    # run one after another, the handlers would time out on the barrier
+    monkeypatch.setattr(SlowHandler, 'barrier', threading.Barrier(3, timeout=10))
+    resp = api_client.post(f"{url}publish/", {'title': 'x'}, format='json')
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert sorted(r['status'] for r in results) == ['failed', 'published', 'published']
+    assert [r['error'] for r in results if r['status'] == 'failed'] == ['fail']
+    assert PublishLog.objects.filter(publish_target__object_id=note.uuid).count() == 3
+    # all three handlers were running at the same time
+    assert not SlowHandler.barrier.broken
+
+
+def test_async_only_handler_can_be_called_sync():
+    from apps.integrations.registry import BaseIntegrationHandler
+
+    class AsyncHandler(BaseIntegrationHandler):
+        async def apublish(self, integration, publish_target, content):
+            return {'async': content}
+
+    assert AsyncHandler().publish(None, None, {'a': 1}) == {'async': {'a': 1}}
+    with pytest.raises(NotImplementedError):
+        BaseIntegrationHandler().publish(None, None, {})
+
+
+# rate limit tests
+
+
+@pytest.mark.django_db
+def test_token_bucket_refills_over_time():
+    from apps.integrations.services.rate_limit_service import Limit, try_acquire
+    limits = [Limit('test:bucket', per_minute=60, burst=2, max_concurrency=None)]
+    assert try_acquire(limits, now=1000.0) is None
+    assert try_acquire(limits, now=1000.0) is None
+    retry_after = try_acquire(limits, now=1000.0)
+    assert retry_after == pytest.approx(1.0)
+    assert try_acquire(limits, now=1000.5) == pytest.approx(0.5)
+    assert try_acquire(limits, now=1001.0) is None
+
+
+@pytest.mark.django_db
+def test_all_limits_must_allow_the_call():
+    from apps.integrations.models import RateLimitBucket
+    from apps.integrations.services.rate_limit_service import Limit, release, try_acquire
+    provider = Limit('test:provider', per_minute=600, burst=5, max_concurrency=None)
+    creds = Limit('test:creds', per_minute=None, burst=1, max_concurrency=1)
+    assert try_acquire([creds, provider], now=1.0) is None
+    # concurrency slot taken: nothing is debited from the provider bucket
+    assert try_acquire([creds, provider], now=1.0) is not None
+    assert RateLimitBucket.objects.get(key='test:provider').tokens == pytest.approx(4)
+    release([creds, provider])
+    assert try_acquire([creds, provider], now=1.0) is None
+
+
+@pytest.mark.django_db
+def test_worker_defers_rate_limited_targets(settings):
+    from apps.integrations.services import queue_service
+    settings.PUBLISH_RATE_LIMIT_MAX_WAIT = 0
+    targets = _make_queued_targets('ul1', 'l1', 3)
+    IntegrationDefinition.objects.filter(code='l1').update(
+        rate_limit_per_minute=1, rate_limit_burst=2
+    )
+    registry.register('l1', DummyHandler)
+    assert queue_service.run_once('w1') == 3
+    statuses = sorted(
+        PublishTarget.objects.filter(pk__in=[t.pk for t in targets]).values_list('status', flat=True)
+    )
+    assert statuses == ['published', 'published', 'queued']
+    deferred = PublishTarget.objects.get(status=PublishTarget.STATUS_QUEUED, pk__in=[t.pk for t in targets])
+    assert deferred.claimed_by == ''
+    assert not deferred.logs.exists()
+    # deferred targets are not claimable until their time comes
+    assert queue_service.claim_targets('w2') == []
+
+
+@pytest.mark.django_db
+def test_identical_payloads_are_stored_once(api_client):
+    from apps.integrations.models import PublishPayload
+    from apps.integrations.services.publish_service import publish_target
+    targets = _make_queued_targets('up1', 'p1', 3)
+    registry.register('p1', ErrorHandler)
+    content = {'title': 'same', 'body': 'x' * 1000}
+    for target in targets:
+        publish_target(target, content)
+    publish_target(targets[0], content)
+    logs = PublishLog.objects.filter(publish_target__in=targets)
+    assert logs.count() == 4
+    assert logs.values('payload').distinct().count() == 1
+    payload = PublishPayload.objects.get()
+    assert payload.content == content
+    assert len(bytes(payload.data)) < payload.size
+
+    api_client.force_authenticate(targets[0].integration.owner)
+    url = reverse('publish-targets-detail', args=[targets[0].pk])
+    entry = api_client.get(f"{url}logs/").json()['results'][0]
+    assert entry['payload_hash'] == payload.hash
+    assert 'request_payload' not in entry
+    entry = api_client.get(f"{url}logs/", {'include': 'payload'}).json()['results'][0]
+    assert entry['request_payload'] == content
+
+
+@pytest.mark.django_db
+def test_reused_payload_is_not_pruned():
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.models import PublishPayload
+    from apps.integrations.services import retention_service
+    digest = PublishPayload.objects.store({'title': 'again'})
+    PublishPayload.objects.update(created_at=timezone.now() - timedelta(days=100))
+    # stored again before its first log was written
+    assert PublishPayload.objects.store({'title': 'again'}) == digest
+    assert retention_service.prune_payloads(timezone.now() - timedelta(days=90)) == 0
+    assert PublishPayload.objects.filter(pk=digest).exists()
+
+
+# retention tests
+
+
+@pytest.mark.django_db
+def test_prune_publish_logs_archives_and_deletes_expired(tmp_path):
+    import gzip
+    import json
+    from datetime import timedelta
+    from django.core.management import call_command
+    from django.utils import timezone
+    from apps.integrations.models import PublishPayload
+    from apps.integrations.services.publish_service import publish_target
+    targets = _make_queued_targets('ut1', 't1', 2)
+    registry.register('t1', ErrorHandler)
+    publish_target(targets[0], {'old': True})
+    publish_target(targets[0], {'shared': True})
+    publish_target(targets[1], {'shared': True})
+    old = timezone.now() - timedelta(days=100)
+    PublishLog.objects.filter(publish_target=targets[0]).update(created_at=old)
+    PublishPayload.objects.update(created_at=old)
+
+    call_command('prune_publish_logs', days=90, batch_size=1, archive_dir=str(tmp_path))
+
+    assert list(PublishLog.objects.values_list('publish_target', flat=True)) == [targets[1].pk]
+    # the shared payload is still referenced, the other one is gone
+    assert [p.content for p in PublishPayload.objects.all()] == [{'shared': True}]
+    (archive,) = tmp_path.iterdir()
+    with gzip.open(archive, 'rt') as fh:
+        rows = [json.loads(line) for line in fh]
+    assert len(rows) == 2
+    assert {tuple(row['request_payload']) for row in rows} == {('old',), ('shared',)}
+    assert {row['publish_target_id'] for row in rows} == {str(targets[0].pk)}
+
+
+@pytest.mark.django_db
+def test_publish_logs_are_cursor_paginated(api_client):
+    from apps.integrations.services.publish_service import publish_target
+    (target,) = _make_queued_targets('ut2', 't2', 1)
+    registry.register('t2', ErrorHandler)
+    for i in range(5):
+        publish_target(target, {'i': i})
+    api_client.force_authenticate(target.integration.owner)
+    url = f"{reverse('publish-targets-detail', args=[target.pk])}logs/"
+    seen = []
+    page = api_client.get(url, {'page_size': 2}).json()
+    while True:
+        seen.extend(entry['id'] for entry in page['results'])
+        if not page['next']:
+            break
+        page = api_client.get(page['next']).json()
+    expected = list(target.logs.order_by('-created_at').values_list('id', flat=True))
+    assert seen == [str(pk) for pk in expected]
+
+
+# circuit breaker tests
+
+
+@pytest.mark.django_db
+def test_circuit_opens_after_consecutive_failures(settings):
+    from apps.integrations.services import queue_service
+    settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD = 2
+    targets = _make_queued_targets('uc1', 'c1', 4)
+    registry.register('c1', ErrorHandler)
+    assert queue_service.run_once('w1') == 4
+    integ = Integration.objects.get(definition__code='c1')
+    assert integ.status == Integration.STATUS_ERROR
+    assert integ.consecutive_failures == 2
+    assert integ.last_error
+    assert integ.circuit_opened_at is not None
+    # only the first two reached the handler and were logged
+    assert PublishLog.objects.filter(publish_target__in=targets).count() == 2
+    skipped = PublishTarget.objects.get(pk=targets[3].pk)
+    assert skipped.status == PublishTarget.STATUS_FAILED
+    assert skipped.retry_count == 0
+    assert skipped.next_attempt_at >= integ.circuit_opened_at
+
+
+@pytest.mark.django_db
+def test_half_open_probe_closes_circuit(settings):
+    from datetime import timedelta
+    from django.utils import timezone
+    from apps.integrations.services import circuit_breaker_service
+    from apps.integrations.services.publish_service import publish_target
+    settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD = 1
+    targets = _make_queued_targets('uc2', 'c2', 2)
+    registry.register('c2', ErrorHandler)
+    publish_target(PublishTarget.objects.get(pk=targets[0].pk), {})
+    integ = Integration.objects.get(definition__code='c2')
+    assert integ.status == Integration.STATUS_ERROR
+
+    registry.register('c2', DummyHandler)
+    publish_target(PublishTarget.objects.get(pk=targets[1].pk), {})
+    assert not targets[1].logs.exists()
+
+    # cooldown over: one probe goes through and closes the circuit
+    Integration.objects.filter(pk=integ.pk).update(
+        circuit_opened_at=timezone.now() - timedelta(hours=1)
+    )
+    stale = Integration.objects.get(pk=integ.pk)
+    circuit_breaker_service.before_call(stale)
+    with pytest.raises(circuit_breaker_service.CircuitOpen):
+        circuit_breaker_service.before_call(Integration.objects.get(pk=integ.pk))
+    Integration.objects.filter(pk=integ.pk).update(
+        circuit_opened_at=timezone.now() - timedelta(hours=1)
+    )
+    publish_target(PublishTarget.objects.get(pk=targets[1].pk), {})
+    integ.refresh_from_db()
+    assert integ.status == Integration.STATUS_ACTIVE
+    assert integ.consecutive_failures == 0
+    assert PublishTarget.objects.get(pk=targets[1].pk).status == PublishTarget.STATUS_PUBLISHED
+
+
+@pytest.mark.django_db
+def test_success_resets_failures_counted_by_other_workers(settings):
+    from apps.integrations.services import circuit_breaker_service
+    settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+    _make_queued_targets('uc4', 'c4', 1)
+    integ = Integration.objects.get(definition__code='c4')
+    # loaded at claim time, before the other workers' failures
+    claimed = Integration.objects.get(pk=integ.pk)
+    for _ in range(2):
+        circuit_breaker_service.record_failure(Integration.objects.get(pk=integ.pk), RuntimeError('x'))
+    circuit_breaker_service.record_success(claimed)
+    integ.refresh_from_db()
+    assert integ.consecutive_failures == 0
+
+    # alternating failures and successes never trip the circuit
+    for _ in range(3):
+        circuit_breaker_service.record_failure(Integration.objects.get(pk=integ.pk), RuntimeError('x'))
+        circuit_breaker_service.record_success(claimed)
+    integ.refresh_from_db()
+    assert integ.status == Integration.STATUS_ACTIVE
+
+    # the circuit opened meanwhile: a success closes it
+    for _ in range(3):
+        circuit_breaker_service.record_failure(Integration.objects.get(pk=integ.pk), RuntimeError('x'))
+    circuit_breaker_service.record_success(claimed)
+    integ.refresh_from_db()
+    assert integ.status == Integration.STATUS_ACTIVE
+    assert integ.circuit_opened_at is None
+
+
+@pytest.mark.django_db
+def test_updating_credentials_closes_circuit(api_client):
+    from django.contrib.auth import get_user_model
+    user = get_user_model().objects.create_user(username='uc3', password='pass')
+    definition = IntegrationDefinition.objects.create(
+        code='c3', name='c3', category='feed', config_schema={'type': 'object'}, handler_path='unused'
+    )
+    integ = Integration.objects.create(
+        owner=user, definition=definition, name='n', title='t', provider='telegram',
+        status=Integration.STATUS_ERROR, consecutive_failures=5, last_error='401',
+    )
+    api_client.force_authenticate(user)
+    url = reverse('integrations-detail', args=[integ.pk])
+    resp = api_client.patch(url, {'credentials': {'token': 'new'}}, format='json')
+    assert resp.status_code == 200
+    integ.refresh_from_db()
+    assert integ.status == Integration.STATUS_ACTIVE
+    assert integ.consecutive_failures == 0
+
+
+# note rendering tests
+
+
+@pytest.mark.django_db
+def test_render_note_merges_blocks_and_caches(django_assert_num_queries):
+    from django.contrib.auth import get_user_model
+    from blog.models import NoteHeader, NoteTextContent
+    from apps.integrations.services import render_service
+    user = get_user_model().objects.create_user(username='urn1', password='pass')
+    note = Note.objects.create(blog=Blog.objects.create(owner=user, title='b'), title='Title')
+    NoteTextContent.objects.create(note=note, order=2, html='<p>Second <strong>part</strong></p>')
+    NoteHeader.objects.create(note=note, order=0, text='Intro & more', level=2)
+    NoteTextContent.objects.create(note=note, order=0, html='<p>First</p>')
+    NoteHeader.objects.create(note=note, order=1, text='Details', level=3)
+
+    rendered = render_service.render_note(note)
+    assert rendered == {
+        'title': 'Title',
+        'html': '<h2>Intro &amp; more</h2>\n<p>First</p>\n<h3>Details</h3>\n'
+                '<p>Second <strong>part</strong></p>',
+        'markdown': '## Intro & more\n\nFirst\n\n### Details\n\nSecond **part**',
+    }
+    # cached: only the version lookup runs
+    with django_assert_num_queries(1):
+        assert render_service.render_note(note) == rendered
+
+    NoteHeader.objects.filter(note=note, order=1).delete()
+    assert 'Details' not in render_service.render_note(note)['html']
+    text = NoteTextContent.objects.get(note=note, order=0)
+    text.html = '<p>Changed</p>'
+    text.save()
+    assert render_service.render_note(note)['markdown'].startswith('## Intro & more\n\nChanged')
+
+
+@pytest.mark.django_db
+def test_render_note_orders_blocks_sharing_a_position_by_creation():
+    from datetime import timedelta
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from blog.models import NoteTextContent
+    from apps.integrations.services import render_service
+    user = get_user_model().objects.create_user(username='urn2', password='pass')
+    note = Note.objects.create(blog=Blog.objects.create(owner=user, title='b'), title='Title')
+    later = NoteTextContent.objects.create(note=note, order=0, html='<p>Later</p>')
+    NoteTextContent.objects.create(note=note, order=0, html='<p>Earlier</p>')
+    # inserted first, created last
+    NoteTextContent.objects.filter(pk=later.pk).update(created_at=timezone.now() + timedelta(minutes=1))
+    assert render_service.render_note(note)['html'] == '<p>Earlier</p>\n<p>Later</p>'
+
+
+@pytest.mark.django_db
+def test_worker_publishes_rendered_note_when_queued_without_payload():
+    from blog.models import NoteTextContent
+    from apps.integrations.services import queue_service
+
+    class RecordingHandler:
+        sent = []
+
+        def publish(self, integration, publish_target, content):
+            self.sent.append(content)
+
+    (target,) = _make_queued_targets('urn2', 'rn2', 1)
+    NoteTextContent.objects.create(note_id=Note.objects.get(uuid=target.object_id).pk, html='<p>Body</p>')
+    queue_service.enqueue_target(target, {})
+    registry.register('rn2', RecordingHandler)
+    queue_service.run_once('w1')
+    assert RecordingHandler.sent == [{'title': 'n0', 'html': '<p>Body</p>', 'markdown': 'Body'}]
+
+
+# idempotency and state transition tests
+
+
+class CountingHandler:
+    calls = 0
+
+    def publish(self, integration, publish_target, content):
+        CountingHandler.calls += 1
+        return {'ok': True}
+
+
+@pytest.mark.django_db
+def test_publish_action_honours_idempotency_key(api_client):
+    (target,) = _make_queued_targets('ui1', 'i1', 1)
+    PublishTarget.objects.filter(pk=target.pk).update(status=PublishTarget.STATUS_DRAFT)
+    api_client.force_authenticate(target.integration.owner)
+    url = f"{reverse('publish-targets-detail', args=[target.pk])}publish/"
+    headers = {'HTTP_IDEMPOTENCY_KEY': 'click-1'}
+
+    first = api_client.post(url, {'title': 'x'}, format='json', **headers)
+    assert first.status_code == 202
+    queued_at = PublishTarget.objects.get(pk=target.pk).queued_at
+    again = api_client.post(url, {'title': 'x'}, format='json', **headers)
+    assert again.status_code == 202
+    assert again['Idempotent-Replayed'] == 'true'
+    assert again.json() == first.json()
+    # not queued a second time
+    assert PublishTarget.objects.get(pk=target.pk).queued_at == queued_at
+    other = api_client.post(url, {'title': 'y'}, format='json', **headers)
+    assert other.status_code == 422
+
+
+@pytest.mark.django_db
+def test_published_target_is_not_requeued(api_client):
+    (target,) = _make_queued_targets('ui2', 'i2', 1)
+    PublishTarget.objects.filter(pk=target.pk).update(status=PublishTarget.STATUS_PUBLISHED)
+    api_client.force_authenticate(target.integration.owner)
+    url = f"{reverse('publish-targets-detail', args=[target.pk])}publish/"
+    assert api_client.post(url, {}, format='json').status_code == 409
+    assert PublishTarget.objects.get(pk=target.pk).status == PublishTarget.STATUS_PUBLISHED
+
+
+@pytest.mark.django_db
+def test_claimed_target_is_sent_once():
+    from apps.integrations.services import queue_service, transition_service
+    from apps.integrations.services.publish_service import publish_target
+    registry.register('i3', CountingHandler)
+    CountingHandler.calls = 0
+    (target,) = _make_queued_targets('ui3', 'i3', 1)
+    (claimed,) = queue_service.claim_targets('w1')
+    # a stale copy published directly while the worker holds the claim
+    publish_target(PublishTarget.objects.get(pk=target.pk), {})
+    assert CountingHandler.calls == 0
+    queue_service.process_target(claimed)
+    assert CountingHandler.calls == 1
+    # the API click arriving late neither resends nor overwrites
+    publish_target(target, {})
+    assert CountingHandler.calls == 1
+    assert PublishTarget.objects.get(pk=target.pk).status == PublishTarget.STATUS_PUBLISHED
+
+    # a worker whose lease was taken over can't write its outcome
+    (other,) = _make_queued_targets('ui4', 'i4', 1)
+    assert transition_service.claim(other, 'w2:old')
+    assert transition_service.enqueue(other) is False
+    PublishTarget.objects.filter(pk=other.pk).update(claimed_by='w3:new')
+    assert not transition_service.finish(other, 'w2:old', {'status': PublishTarget.STATUS_FAILED})
+    assert PublishTarget.objects.get(pk=other.pk).status == PublishTarget.STATUS_QUEUED
+
+
+# metrics tests
+
+
+def _sample(text, name, code):
+    prefix = f'{name}{{integration="{code}"}} '
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0.0
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_counts_publishes(api_client, settings):
+    from apps.integrations.services import queue_service
+    registry.register('m1', DummyHandler)
+    registry.register('m2', ErrorHandler)
+    settings.METRICS_PUBLIC = True
+    before = api_client.get('/api/metrics/').content.decode()
+    _make_queued_targets('um1', 'm1', 2)
+    _make_queued_targets('um2', 'm2', 1)
+    for target in queue_service.claim_targets('w1'):
+        queue_service.process_target(target)
+
+    response = api_client.get('/api/metrics/')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    text = response.content.decode()
+
+    def delta(name, code):
+        return _sample(text, name, code) - _sample(before, name, code)
+
+    assert delta('scrapp_publish_attempts_total', 'm1') == 2
+    assert delta('scrapp_publish_successes_total', 'm1') == 2
+    assert delta('scrapp_publish_failures_total', 'm2') == 1
+    assert delta('scrapp_publish_retries_scheduled_total', 'm2') == 1
+    assert delta('scrapp_publish_handler_seconds_count', 'm1') == 2
+    assert delta('scrapp_publish_queue_wait_seconds_count', 'm1') == 2
+
+    settings.METRICS_TOKEN = 'secret'
+    assert api_client.get('/api/metrics/').status_code == 403
+    response = api_client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == 200
+
+    # closed by default without a token
+    settings.METRICS_TOKEN = ''
+    settings.METRICS_PUBLIC = False
+    assert api_client.get('/api/metrics/').status_code == 403
+    settings.DEBUG = True
+    assert api_client.get('/api/metrics/').status_code == 200
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    import os
+    import subprocess
+    import sys
+    from apps.integrations import metrics
+
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    script = (
+        "from apps.integrations import metrics; "
+        "metrics.PUBLISH_ATTEMPTS.labels('mp').inc(); "
+        "metrics.HANDLER_LATENCY.labels('mp').observe(0.2)"
+    )
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', script], env=env, cwd=backend_dir, check=True)
+
+    text = metrics.render(str(tmp_path))[0].decode()
+    assert _sample(text, 'scrapp_publish_attempts_total', 'mp') == 2
+    assert _sample(text, 'scrapp_publish_handler_seconds_count', 'mp') == 2
+
+
+# benchmark tests
+
+
+@pytest.mark.django_db
+def test_benchmark_command_writes_json_report(tmp_path):
+    import json
+    from django.core.management import call_command
+    output = tmp_path / 'bench.json'
+    call_command(
+        'benchmark_publish', '--integrations', '2', '--targets', '5', '--latency-ms', '1',
+        '--error-rate', '0.5', '--seed', '1', '--output', str(output),
+    )
+    report = json.loads(output.read_text())
+    result = report['result']
+    assert report['parameters']['targets'] == 5
+    assert result['publishes'] == 5
+    assert sum(result['statuses'].values()) == 5
+    assert set(result['latency_ms']) == {'mean', 'p50', 'p95', 'p99', 'max'}
+    assert result['queries_per_publish']['p50'] > 0
+    # seeded rows are removed again
+    assert not IntegrationDefinition.objects.filter(code__startswith='bench-').exists()
+    assert not PublishTarget.objects.exists()
+
+
+# handler isolation tests
+
+
+class PidHandler:
+    def publish(self, integration, publish_target, content):
+        import os
+        return {'pid': os.getpid()}
+
+
+class HangingHandler:
+    def publish(self, integration, publish_target, content):
+        import time
+        time.sleep(30)
+
+
+class CrashingHandler:
+    def publish(self, integration, publish_target, content):
+        import os
+        os._exit(3)
+
+
+def test_handler_pool_recycles_and_kills_workers():
+    from apps.integrations.exceptions import HandlerCrashed, HandlerTimeout
+    from apps.integrations.services.isolation_service import HandlerPool
+    import os
+    pool = HandlerPool(size=1, timeout=2, max_tasks=2)
+    try:
+        pids = [pool.call(PidHandler, (None, None, {}))['pid'] for _ in range(3)]
+        assert os.getpid() not in pids
+        # replaced after two calls
+        assert pids[0] == pids[1] != pids[2]
+        with pytest.raises(HandlerTimeout):
+            pool.call(HangingHandler, (None, None, {}))
+        with pytest.raises(HandlerCrashed):
+            pool.call(CrashingHandler, (None, None, {}))
+        with pytest.raises(RuntimeError):
+            pool.call(ErrorHandler, (None, None, {}))
+        # the pool keeps working after all of that
+        assert pool.call(PidHandler, (None, None, {}))['pid'] not in pids
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.django_db
+def test_isolated_timeout_is_logged(settings, monkeypatch):
+    from apps.integrations.services import isolation_service
+    from apps.integrations.services.publish_service import publish_target
+    settings.PUBLISH_HANDLER_ISOLATION = 'process'
+    settings.PUBLISH_HANDLER_TIMEOUT = 1
+    monkeypatch.setattr(isolation_service, '_pool', None)
+    registry.register('iso1', HangingHandler)
+    (target,) = _make_queued_targets('uiso1', 'iso1', 1)
+    try:
+        publish_target(target, {'title': 'x'})
+    finally:
+        isolation_service.get_pool().shutdown()
+    target.refresh_from_db()
+    assert target.status == PublishTarget.STATUS_FAILED
+    assert target.next_attempt_at is not None
+    assert target.logs.get().error_message == 'handler timed out after 1s'
+
+
+# publish events tests
+
+
+def _read_events(response):
+    import json
+    # consumes the async stream synchronously, it ends after PUBLISH_EVENTS_STREAM_SECONDS
+    body = b''.join(response).decode()
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.mark.django_db
+def test_publish_events_stream(client, settings):
+    from rest_framework_simplejwt.tokens import AccessToken
+    from apps.integrations.services import queue_service
+    settings.PUBLISH_EVENTS_STREAM_SECONDS = 0.3
+    settings.PUBLISH_EVENTS_POLL_INTERVAL = 0.1
+    registry.register('ev1', DummyHandler)
+    (target,) = _make_queued_targets('uev1', 'ev1', 1)
+    _make_queued_targets('uev2', 'ev2', 1)
+    for claimed in queue_service.claim_targets('w1'):
+        if claimed.pk == target.pk:
+            queue_service.process_target(claimed)
+    token = str(AccessToken.for_user(target.integration.owner))
+    ticket = client.post(
+        '/api/publish-events/ticket/', HTTP_AUTHORIZATION=f'Bearer {token}'
+    ).json()['ticket']
+
+    assert client.get('/api/publish-events/').status_code == 401
+    # the access token itself is not accepted in the URL
+    assert client.get('/api/publish-events/', {'ticket': token}).status_code == 401
+    response = client.get('/api/publish-events/', {'ticket': ticket}, HTTP_LAST_EVENT_ID='0')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/event-stream'
+    events = _read_events(response)
+    assert [(kind, data.get('status')) for _, kind, data in events] == [
+        ('target', PublishTarget.STATUS_QUEUED),
+        ('target', PublishTarget.STATUS_PUBLISHED),
+        ('log', PublishLog.STATUS_SUCCESS),
+    ]
+    assert {data.get('object_id', str(target.object_id)) for _, _, data in events} == {
+        str(target.object_id)
+    }
+
+    # resumes after the last seen event, and starts at the newest one by default
+    response = client.get(
+        '/api/publish-events/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_LAST_EVENT_ID=str(events[0][0])
+    )
+    assert [event[0] for event in _read_events(response)] == [events[1][0], events[2][0]]
+    assert _read_events(client.get('/api/publish-events/', {'ticket': ticket})) == []
+    # a client re-opening the stream passes the last id in the URL
+    response = client.get('/api/publish-events/', {'ticket': ticket, 'last_event_id': events[1][0]})
+    assert [event[0] for event in _read_events(response)] == [events[2][0]]
+    settings.PUBLISH_EVENTS_TICKET_SECONDS = 0
+    import time
+    time.sleep(1)
+    assert client.get('/api/publish-events/', {'ticket': ticket}).status_code == 401
+
+
+def test_publish_events_stream_queries_only_after_notify(monkeypatch, settings):
+    import asyncio
+    from apps.integrations.api import streams
+    from apps.integrations.services import event_service
+    settings.PUBLISH_EVENTS_STREAM_SECONDS = 0.5
+    settings.PUBLISH_EVENTS_POLL_INTERVAL = 0.05
+    reads = []
+    monkeypatch.setattr(event_service, 'events_after', lambda *args: reads.append(args) or [])
+
+    class Connection:
+        in_atomic_block = False
+        closed = 0
+
+        def close(self):
+            self.closed += 1
+
+    monkeypatch.setattr(streams, 'connection', Connection())
+
+    class QuietListener(event_service.Listener):
+        # a LISTEN connection that receives nothing
+        def __init__(self, notifies):
+            super().__init__()
+            self.notifies = notifies
+
+        def subscribe(self, user_id):
+            waiter = asyncio.Event()
+            self._waiters[user_id].add(waiter)
+            return waiter
+
+    async def consume(listener, wake_after=None):
+        monkeypatch.setattr(event_service, 'get_listener', lambda: listener)
+        if wake_after is not None:
+            asyncio.get_running_loop().call_later(wake_after, listener._wake_all)
+        return [chunk async for chunk in streams._stream(1, 0, None)]
+
+    asyncio.run(consume(QuietListener(notifies=True)))
+    assert len(reads) == 1
+    # no connection is held between reads
+    assert streams.connection.closed == 1
+    reads.clear()
+    asyncio.run(consume(QuietListener(notifies=True), wake_after=0.1))
+    assert len(reads) == 2
+    reads.clear()
+    asyncio.run(consume(QuietListener(notifies=False)))
+    assert len(reads) > 3
+
+
+# schema validation tests
+
+
+@pytest.mark.django_db
+def test_publish_settings_validated_with_cached_schema(api_client):
+    from apps.integrations.services import schema_service
+    (target,) = _make_queued_targets('usv1', 'sv1', 1)
+    definition = target.integration.definition
+    definition.config_schema = {'type': 'object', 'required': ['token']}
+    definition.publish_schema = {
+        'type': 'object', 'properties': {'channel': {'type': 'string'}}, 'required': ['channel'],
+    }
+    definition.save()
+    api_client.force_authenticate(target.integration.owner)
+    url = reverse('publish-targets-detail', args=[target.pk])
+
+    resp = api_client.patch(url, {'publish_settings': {'channel': 5}}, format='json')
+    assert resp.status_code == 400
+    assert resp.json()['publish_settings'] == ["invalid: channel: 5 is not of type 'string'"]
+    assert api_client.patch(url, {'publish_settings': {'channel': '@news'}}, format='json').status_code == 200
+    resp = api_client.patch(
+        reverse('integrations-detail', args=[target.integration.pk]), {'credentials': {}}, format='json'
+    )
+    assert resp.status_code == 400
+    assert 'token' in resp.json()['credentials'][0]
+
+    # compiled once, recompiled after the definition changed
+    validator = schema_service.get_validator(definition, schema_service.PUBLISH_SCHEMA)
+    assert schema_service.get_validator(definition, schema_service.PUBLISH_SCHEMA) is validator
+    definition.publish_schema = {'type': 'object'}
+    definition.save()
+    assert schema_service.get_validator(definition, schema_service.PUBLISH_SCHEMA) is not validator
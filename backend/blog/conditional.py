@@ -0,0 +1,136 @@
+"""Conditional requests (ETag / If-None-Match / If-Match) for API viewsets.
+
+A viewset using ``ConditionalMixin`` describes the version of an object (or
+of its whole list) as a tuple of cheap values, e.g. ``updated_at`` and
+the newest ``updated_at``/count of its children, read with a single
+aggregate query. The strong ETag is a hash of that tuple, so:
+
+* ``GET`` with a matching ``If-None-Match`` answers 304 without loading or
+  serializing the object;
+* ``PUT``/``PATCH`` with ``If-Match`` answer 412 when the object
+  changed since the client read it. The check and the write run in one
+  transaction with the row locked.
+
+Responses carry ``Cache-Control: private, no-cache``: browsers keep them but
+revalidate on every request instead of guessing a freshness lifetime.
+"""
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, QuerySet, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(version: Sequence[Any]) -> str:
+    digest = hashlib.sha256('|'.join(str(part) for part in version).encode()).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def children_version(children: QuerySet, fk: str, outer: str = 'pk') -> Dict[str, Subquery]:
+    """Annotations with the newest ``updated_at`` and the number of ``children``.
+
+    The count catches deletions, which don't move any ``updated_at``.
+    """
+    rows = children.filter(**{fk: OuterRef(outer)}).order_by().values(fk)
+    name = children.model._meta.model_name
+    return {
+        f'{name}_at': Subquery(rows.annotate(latest=Max('updated_at')).values('latest')[:1]),
+        f'{name}_count': Subquery(rows.annotate(total=Count('pk')).values('total')[:1]),
+    }
+
+
+def row_version(queryset: QuerySet, fields: Sequence[str], **children: Subquery) -> Optional[Tuple]:
+    """``fields`` and the ``children_version`` annotations of the single row of ``queryset``."""
+    return queryset.annotate(**children).values_list(*fields, *children).first()
+
+
+class ConditionalMixin:
+    """ETag support for ``retrieve`` and optionally ``list``.
+
+    Subclasses implement ``get_object_version()`` and may implement
+    ``get_list_version()``; both return None when there is nothing to tag.
+    """
+
+    def get_object_version(self) -> Optional[Sequence[Any]]:
+        raise NotImplementedError
+
+    def get_list_version(self) -> Optional[Sequence[Any]]:
+        return None
+
+    def lookup_value(self) -> Any:
+        return self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+
+    def _object_version(self) -> Optional[Sequence[Any]]:
+        try:
+            return self.get_object_version()
+        except (ValidationError, ValueError, TypeError):
+            # malformed lookup, get_object() answers 404
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        respond = super().retrieve
+        return self._conditional_read(self._object_version(), lambda: respond(request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        respond = super().list
+        return self._conditional_read(self.get_list_version(), lambda: respond(request, *args, **kwargs))
+
+    def _conditional_read(self, version, respond):
+        # for ``respond``, e.g. to key a response cache
+        self.resource_version = version
+        if version is None:
+            return respond()
+        etag = make_etag(version)
+        response = get_conditional_response(self.request, etag=etag)
+        if response is None:
+            response = respond()
+        return self._tag(response, etag, version)
+
+    def _tag(self, response, etag: str, version: Sequence[Any]):
+        response['ETag'] = etag
+        last_modified = max((part for part in version if isinstance(part, datetime)), default=None)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ConditionalUpdateMixin(ConditionalMixin):
+    """``ConditionalMixin`` plus ``If-Match`` on ``update``/``partial_update``."""
+
+    def update(self, request, *args, **kwargs):
+        respond = super().update
+        return self._conditional_write(lambda: respond(request, *args, **kwargs))
+
+    def _conditional_write(self, respond):
+        if 'HTTP_IF_MATCH' not in self.request.META:
+            response = respond()
+        else:
+            with transaction.atomic():
+                version = self._locked_version()
+                failed = get_conditional_response(
+                    self.request, etag=make_etag(version) if version else None
+                )
+                if failed is not None:
+                    return failed
+                response = respond()
+        if 200 <= response.status_code < 300:
+            version = self._object_version()
+            if version is not None:
+                self._tag(response, make_etag(version), version)
+        return response
+
+    def _locked_version(self) -> Optional[Sequence[Any]]:
+        """The object version, with its row locked until the transaction ends."""
+        model = self.get_queryset().model
+        try:
+            list(model.objects.select_for_update().filter(
+                **{self.lookup_field: self.lookup_value()}
+            ).values_list('pk'))
+        except (ValidationError, ValueError, TypeError):
+            return None
+        return self._object_version()
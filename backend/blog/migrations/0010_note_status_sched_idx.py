@@ -0,0 +1,17 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_merge_20260320_1657'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['status', 'scheduled_at'], name='note_status_sched_idx'),
+        ),
+    ]
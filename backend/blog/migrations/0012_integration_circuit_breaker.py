@@ -0,0 +1,23 @@
+# Generated by Django 6.0.3 on 2026-10-17 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_integration_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='integration',
+            name='circuit_opened_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='integration',
+            name='consecutive_failures',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
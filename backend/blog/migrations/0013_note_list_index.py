@@ -0,0 +1,17 @@
+# Generated by Django 6.0.3 on 2026-10-17 15:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_integration_circuit_breaker'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['blog', '-updated_at', '-id'], name='note_blog_updated_idx'),
+        ),
+    ]
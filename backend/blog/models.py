@@ -25,7 +25,7 @@ class SoftDeleteModel(models.Model):
     def delete(self, using=None, keep_parents=False):
         self.is_deleted = True
         self.deleted_at = timezone.now()
-        self.save(update_fields=['is_deleted', 'deleted_at'])
+        self.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
 
 
 class Blog(SoftDeleteModel):
@@ -93,6 +93,13 @@ class Integration(SoftDeleteModel):
         db_index=True,
     )
     last_error = models.TextField(null=True, blank=True)
+    # per-credentials limits, on top of the definition's ones
+    rate_limit_per_minute = models.PositiveIntegerField(null=True, blank=True)
+    rate_limit_burst = models.PositiveIntegerField(null=True, blank=True)
+    max_concurrency = models.PositiveIntegerField(null=True, blank=True)
+    # circuit breaker state, see apps.integrations.services.circuit_breaker_service
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    circuit_opened_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -140,6 +147,14 @@ class Note(SoftDeleteModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # range scans of the publish scheduler
+            models.Index(fields=['status', 'scheduled_at'], name='note_status_sched_idx'),
+            # cursor pages of the notes list
+            models.Index(fields=['blog', '-updated_at', '-id'], name='note_blog_updated_idx'),
+        ]
+
     def __str__(self) -> str:
         return self.title
 
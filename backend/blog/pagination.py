@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NoteCursorPagination(CursorPagination):
+    """Keyset pages of notes, most recently updated first.
+
+    ``id`` breaks ties between notes saved in the same instant; pages are
+    read through ``note_blog_updated_idx`` (blog, updated_at, id).
+    """
+
+    ordering = ('-updated_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
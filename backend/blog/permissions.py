@@ -3,15 +3,16 @@ from rest_framework.permissions import BasePermission
 
 class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        owner = getattr(obj, 'owner', None)
-        if owner is not None:
-            return owner == request.user
+        # compare ids, the owner row itself is never needed
+        owner_id = getattr(obj, 'owner_id', None)
+        if owner_id is not None:
+            return owner_id == request.user.pk
         blog = getattr(obj, 'blog', None)
         if blog is not None:
-            return getattr(blog, 'owner', None) == request.user
+            return blog.owner_id == request.user.pk
         note = getattr(obj, 'note', None)
         if note is not None:
             blog = getattr(note, 'blog', None)
             if blog is not None:
-                return getattr(blog, 'owner', None) == request.user
+                return blog.owner_id == request.user.pk
         return False
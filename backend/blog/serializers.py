@@ -1,13 +1,32 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
 
 from .models import Blog, Note, Integration, BlogIntegration, NoteIntegration, NoteHeader, NoteTextContent, BlogIntegrationDefault
+from apps.integrations.api.serializers import validate_publish_settings
 from apps.integrations.models import IntegrationDefinition
+from apps.integrations.services import outbox_service
 
 User = get_user_model()
 
 
+class SparseFieldsMixin:
+    """Limit the representation to ``?fields=a,b,c``; unknown names are ignored."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return fields
+        # only the serializer of the view (or its list children), not nested ones
+        if self.parent is not None and not isinstance(self.parent, serializers.ListSerializer):
+            return fields
+        requested = request.query_params['fields']
+        wanted = {name.strip() for name in requested.split(',')}
+        return {name: field for name, field in fields.items() if name in wanted or field.write_only}
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -89,6 +108,8 @@ class BlogIntegrationDefaultSerializer(serializers.ModelSerializer):
         queryset=Integration.objects.alive(),
         write_only=True,
     )
+    # also create the targets on the blog's existing notes
+    apply_to_existing = serializers.BooleanField(write_only=True, required=False, default=False)
 
     class Meta:
         model = BlogIntegrationDefault
@@ -98,11 +119,17 @@ class BlogIntegrationDefaultSerializer(serializers.ModelSerializer):
             'integration_id',
             'publish_settings',
             'is_enabled',
+            'apply_to_existing',
             'created_at',
             'updated_at',
         )
         read_only_fields = ('created_at', 'updated_at')
 
+    def validate(self, attrs):
+        integration = attrs.get('integration') or getattr(self.instance, 'integration', None)
+        validate_publish_settings(attrs, integration)
+        return super().validate(attrs)
+
 
 class NoteIntegrationSerializer(serializers.ModelSerializer):
     integration = IntegrationSerializer(read_only=True)
@@ -177,7 +204,7 @@ class NoteTextContentSerializer(serializers.ModelSerializer):
         read_only_fields = ('uuid', 'created_at', 'updated_at')
 
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     blog = BlogSerializer(read_only=True)
     blog_uuid = serializers.SlugRelatedField(
         source='blog',
@@ -225,4 +252,38 @@ class NoteSerializer(serializers.ModelSerializer):
             instance.published_at = timezone.now()
         if status == Note.STATUS_ARCHIVED and instance.archived_at is None:
             instance.archived_at = timezone.now()
-        return super().update(instance, validated_data)
+        published = status == Note.STATUS_PUBLISHED and instance.status != Note.STATUS_PUBLISHED
+        with transaction.atomic():
+            note = super().update(instance, validated_data)
+            if published:
+                # the relay queues the note's publish targets after commit
+                outbox_service.record_note_published(note)
+        return note
+
+
+class BlogSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Blog
+        fields = ('id', 'uuid', 'title')
+
+
+class NoteListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Notes list: no body, blocks or integrations, see NoteSerializer for those."""
+
+    blog = BlogSummarySerializer(read_only=True)
+
+    class Meta:
+        model = Note
+        fields = (
+            'id',
+            'uuid',
+            'blog',
+            'title',
+            'status',
+            'scheduled_at',
+            'published_at',
+            'archived_at',
+            'created_at',
+            'updated_at',
+        )
+        read_only_fields = fields
@@ -4,7 +4,8 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from apps.integrations.models import IntegrationDefinition, PublishTarget
+from apps.integrations.models import IntegrationDefinition, OutboxEvent, PublishTarget
+from apps.integrations.services import outbox_service
 from blog.models import Blog, Integration, BlogIntegrationDefault, Note
 
 User = get_user_model()
@@ -168,6 +169,46 @@ class BlogDefaultIntegrationsAPITestCase(TestCase):
         self.assertTrue(target.is_enabled)
         self.assertEqual(target.status, PublishTarget.STATUS_DRAFT)
 
+    def test_publishing_note_queues_targets_through_outbox(self):
+        """Test that publishing a note writes an outbox event the relay dispatches."""
+        BlogIntegrationDefault.objects.create(
+            blog=self.blog,
+            integration=self.integration,
+            publish_settings={'target': 'https://example.com'},
+            is_enabled=True,
+        )
+        response = self.client.post('/api/notes/', {
+            'blog_uuid': self.blog.uuid,
+            'title': 'Test Note',
+            'body': 'Test content',
+        }, format='json')
+        note_uuid = response.data['uuid']
+
+        response = self.client.patch(
+            f'/api/notes/{note_uuid}/', {'status': Note.STATUS_PUBLISHED}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the request only writes the event
+        event = OutboxEvent.objects.get()
+        self.assertEqual(str(event.object_id), note_uuid)
+        self.assertIsNone(event.processed_at)
+        target = PublishTarget.objects.get(object_id=note_uuid)
+        self.assertEqual(target.status, PublishTarget.STATUS_DRAFT)
+
+        self.assertEqual(outbox_service.drain(), 1)
+        target.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(target.status, PublishTarget.STATUS_QUEUED)
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(outbox_service.drain(), 0)
+
+        # saving an already published note again doesn't add another event
+        self.client.patch(
+            f'/api/notes/{note_uuid}/', {'status': Note.STATUS_PUBLISHED}, format='json'
+        )
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
     def test_permission_denied_for_other_user(self):
         """Test that other users cannot access blog defaults."""
         other_user = User.objects.create_user(
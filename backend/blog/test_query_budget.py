@@ -0,0 +1,168 @@
+"""Query budgets of the API endpoints.
+
+Every list and detail endpoint routed in ``blog/urls.py`` runs against
+seeded fan-out (notes with blocks, blog and note integrations, publish
+targets) and must stay within a fixed number of queries, whatever the
+amount of data. A failing budget usually means a nested serializer lost its
+``select_related``/``Prefetch``.
+"""
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.integrations.models import (
+    IntegrationDefinition,
+    PublishLog,
+    PublishPayload,
+    PublishTarget,
+)
+from blog.models import (
+    Blog,
+    BlogIntegration,
+    BlogIntegrationDefault,
+    Integration,
+    Note,
+    NoteHeader,
+    NoteIntegration,
+    NoteTextContent,
+)
+
+User = get_user_model()
+
+NOTES_PER_BLOG = 12
+BLOCKS_PER_NOTE = 3
+INTEGRATIONS = 4
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budget', password='pass')
+        cls.definitions = [
+            IntegrationDefinition.objects.create(
+                code=f'qb{i}',
+                name=f'QB{i}',
+                category='feed',
+                config_schema={'type': 'object'},
+                handler_path='unused',
+            )
+            for i in range(INTEGRATIONS)
+        ]
+        cls.integrations = [
+            Integration.objects.create(
+                owner=cls.user,
+                definition=definition,
+                name=definition.code,
+                title=definition.name,
+                provider='telegram',
+            )
+            for definition in cls.definitions
+        ]
+        spare = Integration.objects.create(
+            owner=cls.user, definition=cls.definitions[0], name='spare', title='spare', provider='telegram'
+        )
+        note_ct = ContentType.objects.get_for_model(Note)
+        cls.blogs = [Blog.objects.create(owner=cls.user, title=f'blog {i}') for i in range(2)]
+        for blog in cls.blogs:
+            for integration in cls.integrations:
+                BlogIntegration.objects.create(blog=blog, integration=integration)
+                BlogIntegrationDefault.objects.create(blog=blog, integration=integration)
+            # soft-deleted rows must not show up, nor cost queries
+            BlogIntegration.objects.create(blog=blog, integration=spare, is_deleted=True)
+            for n in range(NOTES_PER_BLOG):
+                note = Note.objects.create(blog=blog, title=f'note {n}', body='text')
+                for order in range(BLOCKS_PER_NOTE):
+                    NoteHeader.objects.create(note=note, text=f'h{order}', order=order)
+                    NoteTextContent.objects.create(note=note, html=f'<p>{order}</p>', order=order)
+                for integration in cls.integrations:
+                    NoteIntegration.objects.create(note=note, integration=integration)
+                    target = PublishTarget.objects.create(
+                        integration=integration, content_type=note_ct, object_id=note.uuid
+                    )
+                    PublishLog.objects.create(
+                        publish_target=target,
+                        payload_id=PublishPayload.objects.store({'title': note.title}),
+                        status=PublishLog.STATUS_SUCCESS,
+                    )
+        cls.note = Note.objects.filter(blog=cls.blogs[0]).first()
+        cls.target = PublishTarget.objects.filter(object_id=cls.note.uuid).first()
+
+    def setUp(self):
+        # budgets are for a cold cache
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @contextmanager
+    def assertMaxQueries(self, budget, url):
+        with CaptureQueriesContext(connection) as captured:
+            yield
+        self.assertLessEqual(
+            len(captured),
+            budget,
+            f'{url} ran {len(captured)} queries, budget is {budget}:\n'
+            + '\n'.join(query['sql'] for query in captured.captured_queries),
+        )
+
+    def get(self, url, budget, **params):
+        with self.assertMaxQueries(budget, url):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        if response.has_header('ETag'):
+            # revalidation only reads the version
+            with self.assertMaxQueries(1, url):
+                revalidated = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+        return response.json()
+
+    def test_blogs(self):
+        self.get('/api/blogs/', 2)
+        # one of them reads the ETag version
+        self.get(f'/api/blogs/{self.blogs[0].uuid}/', 3)
+
+    def test_notes(self):
+        page = self.get('/api/notes/', 1)
+        self.assertEqual(len(page['results']), 2 * NOTES_PER_BLOG)
+        self.get('/api/notes/', 1, fields='uuid,title,status')
+        note = self.get(f'/api/notes/{self.note.uuid}/', 6)
+        self.assertEqual(len(note['blog']['blog_integrations']), INTEGRATIONS)
+        self.assertEqual(len(note['note_integrations']), INTEGRATIONS)
+
+    def test_integrations(self):
+        self.get('/api/integrations/', 1)
+        self.get(f'/api/integrations/{self.integrations[0].pk}/', 1)
+        self.get('/api/integration-definitions/', 2)
+        self.get(f'/api/integration-definitions/{self.definitions[0].pk}/', 2)
+
+    def test_publish_targets(self):
+        self.get('/api/publish-targets/', 1)
+        self.get('/api/publish-targets/', 1, object_id=str(self.note.uuid))
+        self.get(f'/api/publish-targets/{self.target.pk}/', 1)
+        self.get(f'/api/publish-targets/{self.target.pk}/logs/', 2)
+        self.get('/api/publish-targets/dead/', 1)
+
+    def test_blog_and_note_integrations(self):
+        record = BlogIntegration.objects.alive().filter(blog=self.blogs[0]).first()
+        self.get('/api/blog-integrations/', 1)
+        self.get(f'/api/blog-integrations/{record.pk}/', 1)
+        record = NoteIntegration.objects.filter(note=self.note).first()
+        self.get('/api/note-integrations/', 1)
+        self.get(f'/api/note-integrations/{record.pk}/', 1)
+
+    def test_note_blocks(self):
+        self.get('/api/note-headers/', 1)
+        self.get('/api/note-headers/', 1, note_uuid=str(self.note.uuid))
+        self.get('/api/note-text-contents/', 1)
+        self.get('/api/note-text-contents/', 1, note_uuid=str(self.note.uuid))
+
+    def test_blog_default_integrations(self):
+        default = BlogIntegrationDefault.objects.filter(blog=self.blogs[0]).first()
+        self.get('/api/blog-default-integrations/', 1)
+        self.get('/api/blog-default-integrations/', 1, blog_uuid=str(self.blogs[0].uuid))
+        self.get(f'/api/blog-default-integrations/{default.pk}/', 1)
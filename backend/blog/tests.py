@@ -7,9 +7,11 @@ from rest_framework.test import APIClient
 
 from apps.integrations.models import IntegrationDefinition, PublishTarget
 from apps.integrations.services.note_creation_service import (
+    _create_targets,
+    apply_default_to_existing_notes,
     create_publish_targets_from_defaults,
 )
-from blog.models import Blog, Integration, BlogIntegrationDefault, Note
+from blog.models import Blog, Integration, BlogIntegrationDefault, Note, NoteHeader
 
 User = get_user_model()
 
@@ -200,6 +202,83 @@ class BlogIntegrationDefaultTestCase(TestCase):
         )
         self.assertEqual(all_targets.count(), 1)
 
+    def test_note_creation_queries_do_not_grow_with_defaults(self):
+        """Creating targets costs the same queries for one or many defaults."""
+        ContentType.objects.get_for_model(Note)
+        BlogIntegrationDefault.objects.create(blog=self.blog, integration=self.integration)
+        for i in range(5):
+            integration = Integration.objects.create(
+                owner=self.user,
+                definition=self.definition,
+                name=f'extra-{i}',
+                title=f'Extra {i}',
+                provider='medium',
+            )
+            BlogIntegrationDefault.objects.create(blog=self.blog, integration=integration)
+        note = Note.objects.create(blog=self.blog, title='Many defaults')
+
+        # anti-join + bulk insert + inserted pks, inside a savepoint
+        with self.assertNumQueries(5):
+            targets = create_publish_targets_from_defaults(note)
+        self.assertEqual(len(targets), 6)
+
+    def test_targets_lost_to_a_concurrent_insert_are_not_returned(self):
+        default = BlogIntegrationDefault.objects.create(blog=self.blog, integration=self.integration)
+        notes = [Note.objects.create(blog=self.blog, title=f'n{i}') for i in range(2)]
+        content_type = ContentType.objects.get_for_model(Note)
+        # created by another request after the anti-join ran
+        PublishTarget.objects.create(
+            integration=self.integration, content_type=content_type, object_id=notes[0].uuid
+        )
+        targets = _create_targets(((default, note.uuid) for note in notes), content_type)
+        self.assertEqual([target.object_id for target in targets], [notes[1].uuid])
+        self.assertTrue(PublishTarget.objects.filter(pk=targets[0].pk).exists())
+
+    def test_apply_default_to_existing_notes(self):
+        """A default added later is applied to all existing notes, in batches."""
+        notes = [Note.objects.create(blog=self.blog, title=f'n{i}') for i in range(7)]
+        deleted = Note.objects.create(blog=self.blog, title='gone')
+        deleted.delete()
+        default = BlogIntegrationDefault.objects.create(
+            blog=self.blog,
+            integration=self.integration,
+            publish_settings={'target': 'https://example.com'},
+        )
+        content_type = ContentType.objects.get_for_model(Note)
+        PublishTarget.objects.create(
+            integration=self.integration, content_type=content_type, object_id=notes[0].uuid
+        )
+
+        self.assertEqual(apply_default_to_existing_notes(default, batch_size=3), 6)
+        self.assertEqual(apply_default_to_existing_notes(default, batch_size=3), 0)
+        targets = PublishTarget.objects.filter(integration=self.integration)
+        self.assertEqual(
+            set(targets.values_list('object_id', flat=True)), {note.uuid for note in notes}
+        )
+        self.assertEqual(targets.filter(publish_settings={'target': 'https://example.com'}).count(), 6)
+
+    def test_apply_default_api(self):
+        """apply_to_existing on create and the apply action backfill notes."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        Note.objects.create(blog=self.blog, title='existing')
+        response = client.post(
+            '/api/blog-default-integrations/',
+            {
+                'blog_uuid': self.blog.uuid,
+                'integration_id': self.integration.id,
+                'apply_to_existing': True,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(PublishTarget.objects.filter(integration=self.integration).count(), 1)
+
+        Note.objects.create(blog=self.blog, title='added without defaults')
+        response = client.post(f"/api/blog-default-integrations/{response.data['id']}/apply/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'created': 1})
+
 
 class NoteAPITest(TestCase):
     def setUp(self):
@@ -224,3 +303,68 @@ class NoteAPITest(TestCase):
         resp = self.client.patch(url, {'title': ''}, format='json')
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(resp.json()['title'], '')
+
+    def test_list_notes_in_cursor_pages(self):
+        notes = [Note.objects.create(blog=self.blog, title=f'n{i}', body='x' * 100) for i in range(5)]
+        url = reverse('notes-list')
+        resp = self.client.get(url, {'page_size': 2, 'blog_uuid': self.blog.uuid})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        page = resp.json()
+        self.assertEqual([item['title'] for item in page['results']], ['n4', 'n3'])
+        self.assertNotIn('body', page['results'][0])
+        self.assertNotIn('text_contents', page['results'][0])
+        self.assertEqual(page['results'][0]['blog']['uuid'], str(self.blog.uuid))
+
+        titles = [item['title'] for item in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            titles += [item['title'] for item in page['results']]
+        self.assertEqual(titles, [note.title for note in reversed(notes)])
+
+    def test_list_notes_sparse_fields(self):
+        note = Note.objects.create(blog=self.blog, title='foo')
+        resp = self.client.get(reverse('notes-list'), {'fields': 'uuid,status'})
+        self.assertEqual(resp.json()['results'], [{'uuid': str(note.uuid), 'status': 'draft'}])
+        resp = self.client.get(
+            reverse('notes-detail', kwargs={'uuid': note.uuid}), {'fields': 'title,body'}
+        )
+        self.assertEqual(resp.json(), {'title': 'foo', 'body': ''})
+
+    def test_note_etag_follows_blocks(self):
+        note = Note.objects.create(blog=self.blog, title='foo')
+        url = reverse('notes-detail', kwargs={'uuid': note.uuid})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        header = NoteHeader.objects.create(note=note, text='h', order=0)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+        etag = resp['ETag']
+        # a deleted block moves no updated_at, the count changes
+        header.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_note_etag_after_archive(self):
+        note = Note.objects.create(blog=self.blog, title='foo')
+        url = reverse('notes-detail', kwargs={'uuid': note.uuid})
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('notes-archive', kwargs={'uuid': note.uuid}))
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['status'], Note.STATUS_ARCHIVED)
+        resp = self.client.patch(url, {'title': 'bar'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_note_patch_if_match(self):
+        note = Note.objects.create(blog=self.blog, title='foo')
+        url = reverse('notes-detail', kwargs={'uuid': note.uuid})
+        etag = self.client.get(url)['ETag']
+        resp = self.client.patch(url, {'title': 'bar'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+        # the second writer read the note before the first one saved it
+        resp = self.client.patch(url, {'title': 'baz'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        note.refresh_from_db()
+        self.assertEqual(note.title, 'bar')
@@ -18,9 +18,12 @@ from .views import (
 )
 
 # import new API viewsets
+from apps.integrations.api.streams import publish_events
 from apps.integrations.api.views import (
     IntegrationDefinitionViewSet,
     IntegrationViewSet as NewIntegrationViewSet,
+    MetricsView,
+    PublishEventTicketView,
     PublishTargetViewSet,
 )
 
@@ -60,6 +63,9 @@ urlpatterns = [
         name='token_obtain_pair',
     ),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('publish-events/', publish_events, name='publish-events'),
+    path('publish-events/ticket/', PublishEventTicketView.as_view(), name='publish-events-ticket'),
     path('', include(router.urls)),
 ]
 
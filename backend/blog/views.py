@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from django.utils import timezone
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
@@ -6,14 +7,21 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 from .models import Blog, Note, Integration, BlogIntegration, NoteIntegration, NoteHeader, NoteTextContent, BlogIntegrationDefault
+from .conditional import ConditionalUpdateMixin, children_version, row_version
+from .pagination import NoteCursorPagination
 from .permissions import IsOwner
-from apps.integrations.services.note_creation_service import create_publish_targets_from_defaults
+from apps.integrations.services import idempotency_service, publish_service, render_service
+from apps.integrations.services.note_creation_service import (
+    apply_default_to_existing_notes,
+    create_publish_targets_from_defaults,
+)
 from .serializers import (
     BlogIntegrationSerializer,
     BlogSerializer,
     IntegrationSerializer,
     NoteHeaderSerializer,
     NoteIntegrationSerializer,
+    NoteListSerializer,
     NoteSerializer,
     NoteTextContentSerializer,
     RegisterSerializer,
@@ -21,18 +29,38 @@ from .serializers import (
 )
 
 
+def alive_blog_integrations(prefix=''):
+    """Prefetch of a blog's ``blog_integrations`` as BlogSerializer shows them."""
+    return Prefetch(
+        f'{prefix}blog_integrations',
+        queryset=BlogIntegration.objects.alive().select_related('integration'),
+    )
+
+
 class RegisterViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
 
 
-class BlogViewSet(viewsets.ModelViewSet):
+class BlogViewSet(ConditionalUpdateMixin, viewsets.ModelViewSet):
     serializer_class = BlogSerializer
     permission_classes = [IsOwner]
     lookup_field = 'uuid'
 
+    def get_object_version(self):
+        return row_version(
+            Blog.objects.alive().filter(owner=self.request.user, uuid=self.lookup_value()),
+            ('updated_at',),
+            **children_version(BlogIntegration.objects.alive(), 'blog'),
+        )
+
     def get_queryset(self):
-        return Blog.objects.alive().filter(owner=self.request.user)
+        return (
+            Blog.objects.alive()
+            .filter(owner=self.request.user)
+            .select_related('owner')
+            .prefetch_related(alive_blog_integrations())
+        )
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -41,25 +69,57 @@ class BlogViewSet(viewsets.ModelViewSet):
         blog = self.get_object()
         blog.is_deleted = True
         blog.deleted_at = timezone.now()
-        blog.save(update_fields=['is_deleted', 'deleted_at'])
+        blog.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ConditionalUpdateMixin, viewsets.ModelViewSet):
     serializer_class = NoteSerializer
     permission_classes = [IsOwner]
     lookup_field = 'uuid'
+    pagination_class = NoteCursorPagination
+
+    def get_object_version(self):
+        # everything the detail representation shows
+        return row_version(
+            Note.objects.alive().filter(blog__owner=self.request.user, uuid=self.lookup_value()),
+            ('updated_at', 'blog__updated_at'),
+            **children_version(NoteHeader.objects.all(), 'note'),
+            **children_version(NoteTextContent.objects.all(), 'note'),
+            **children_version(NoteIntegration.objects.alive(), 'note'),
+            **children_version(BlogIntegration.objects.alive(), 'blog', outer='blog_id'),
+        )
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return NoteListSerializer
+        return NoteSerializer
 
     def get_queryset(self):
         queryset = (
             Note.objects.alive()
             .filter(blog__owner=self.request.user)
             .select_related('blog')
-            .prefetch_related('headers', 'text_contents')
         )
+        if self.action == 'list':
+            # the list serializer skips body and blocks
+            queryset = queryset.defer('body')
+        else:
+            queryset = queryset.select_related('blog__owner').prefetch_related(
+                'headers',
+                'text_contents',
+                Prefetch(
+                    'note_integrations',
+                    queryset=NoteIntegration.objects.alive().select_related('integration'),
+                ),
+                alive_blog_integrations('blog__'),
+            )
         blog_uuid = self.request.query_params.get('blog_uuid')
         if blog_uuid:
             queryset = queryset.filter(blog__uuid=blog_uuid)
+        status_param = self.request.query_params.get('status')
+        if status_param:
+            queryset = queryset.filter(status=status_param)
         return queryset
 
     def perform_create(self, serializer):
@@ -75,7 +135,7 @@ class NoteViewSet(viewsets.ModelViewSet):
         note.status = Note.STATUS_DELETED
         note.is_deleted = True
         note.deleted_at = timezone.now()
-        note.save(update_fields=['status', 'is_deleted', 'deleted_at'])
+        note.save(update_fields=['status', 'is_deleted', 'deleted_at', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'])
@@ -83,10 +143,25 @@ class NoteViewSet(viewsets.ModelViewSet):
         note = self.get_object()
         note.status = Note.STATUS_ARCHIVED
         note.archived_at = timezone.now()
-        note.save(update_fields=['status', 'archived_at'])
+        note.save(update_fields=['status', 'archived_at', 'updated_at'])
         serializer = self.get_serializer(note)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['post'])
+    def publish(self, request, *args, **kwargs):
+        """Publish the note to all its enabled targets concurrently.
+
+        Without a request body the note's rendered blocks are published.
+        """
+        note = self.get_object()
+
+        def publish():
+            targets = publish_service.targets_for_object(note)
+            content = request.data or render_service.render_note(note)
+            return Response({'results': publish_service.publish_many(targets, content)})
+
+        return idempotency_service.idempotent_response(request, f'note-publish:{note.uuid}', publish)
+
 
 class IntegrationViewSet(viewsets.ModelViewSet):
     serializer_class = IntegrationSerializer
@@ -102,7 +177,7 @@ class IntegrationViewSet(viewsets.ModelViewSet):
         integration = self.get_object()
         integration.is_deleted = True
         integration.deleted_at = timezone.now()
-        integration.save(update_fields=['is_deleted', 'deleted_at'])
+        integration.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -128,7 +203,7 @@ class BlogIntegrationViewSet(viewsets.ModelViewSet):
         record = self.get_object()
         record.is_deleted = True
         record.deleted_at = timezone.now()
-        record.save(update_fields=['is_deleted', 'deleted_at'])
+        record.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -140,7 +215,7 @@ class NoteIntegrationViewSet(viewsets.ModelViewSet):
         return (
             NoteIntegration.objects.alive()
             .filter(note__blog__owner=self.request.user)
-            .select_related('note', 'integration')
+            .select_related('note__blog', 'integration')
         )
 
     def perform_create(self, serializer):
@@ -157,7 +232,7 @@ class NoteIntegrationViewSet(viewsets.ModelViewSet):
         record = self.get_object()
         record.is_deleted = True
         record.deleted_at = timezone.now()
-        record.save(update_fields=['is_deleted', 'deleted_at'])
+        record.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -223,6 +298,10 @@ class BlogIntegrationDefaultViewSet(viewsets.ModelViewSet):
     POST   /api/blog-default-integrations/
     PATCH  /api/blog-default-integrations/{id}/
     DELETE /api/blog-default-integrations/{id}/
+    POST   /api/blog-default-integrations/{id}/apply/
+
+    Create and update accept ``apply_to_existing: true`` to also add the
+    publish target to every existing note of the blog, like ``apply/``.
     """
     serializer_class = BlogIntegrationDefaultSerializer
     permission_classes = [IsOwner]
@@ -255,11 +334,23 @@ class BlogIntegrationDefaultViewSet(viewsets.ModelViewSet):
         if integration.owner_id != self.request.user.id:
             raise PermissionDenied('Invalid integration owner')
         
-        serializer.save(blog=blog)
+        apply_to_existing = serializer.validated_data.pop('apply_to_existing', False)
+        default = serializer.save(blog=blog)
+        if apply_to_existing:
+            apply_default_to_existing_notes(default)
 
     def perform_update(self, serializer):
         """Validate ownership on update."""
         integration = serializer.validated_data.get('integration')
         if integration and integration.owner_id != self.request.user.id:
             raise PermissionDenied('Invalid integration owner')
-        serializer.save()
+        apply_to_existing = serializer.validated_data.pop('apply_to_existing', False)
+        default = serializer.save()
+        if apply_to_existing:
+            apply_default_to_existing_notes(default)
+
+    @action(detail=True, methods=['post'])
+    def apply(self, request, *args, **kwargs):
+        """Create this default's publish targets on the blog's existing notes."""
+        default = self.get_object()
+        return Response({'created': apply_default_to_existing_notes(default)})
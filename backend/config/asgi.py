@@ -14,3 +14,15 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# resolve integration handlers now rather than on the first request; not in
+# AppConfig.ready(), which also runs for migrate and before the test database
+from django.db import DatabaseError  # noqa: E402
+
+from apps.integrations import registry  # noqa: E402
+
+try:
+    registry.warm()
+except DatabaseError:
+    # not migrated yet or unreachable: handlers are loaded on first use
+    pass
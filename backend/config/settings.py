@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -105,6 +107,16 @@ else:
         }
     }
 
+# With Postgres the cache is a table shared by all processes (create it with
+# `manage.py createcachetable`), otherwise it is local to each process.
+if os.getenv('DB_HOST'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -166,6 +178,9 @@ CORS_ALLOWED_ORIGINS = [
     ).split(',')
     if origin.strip()
 ]
+# conditional requests on notes and blogs (blog.conditional)
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -180,3 +195,76 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
+
+# Background publishing (manage.py publish_worker)
+PUBLISH_WORKER_BATCH_SIZE = int(os.getenv('PUBLISH_WORKER_BATCH_SIZE', '10'))
+PUBLISH_WORKER_POLL_INTERVAL = float(os.getenv('PUBLISH_WORKER_POLL_INTERVAL', '1.0'))
+PUBLISH_WORKER_LEASE_SECONDS = int(os.getenv('PUBLISH_WORKER_LEASE_SECONDS', '300'))
+# longer waits for a rate limit token defer the publish instead
+PUBLISH_RATE_LIMIT_MAX_WAIT = float(os.getenv('PUBLISH_RATE_LIMIT_MAX_WAIT', '5'))
+# threads per process for POST /notes/{uuid}/publish/
+PUBLISH_FANOUT_MAX_WORKERS = int(os.getenv('PUBLISH_FANOUT_MAX_WORKERS', '8'))
+
+# Outgoing HTTP calls of integration handlers (apps.integrations.http_client)
+HTTP_POOL_MAX_PER_HOST = int(os.getenv('HTTP_POOL_MAX_PER_HOST', '10'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '10'))
+# webhook URLs come from users; only enable for webhooks on a trusted network
+WEBHOOK_ALLOW_PRIVATE_ADDRESSES = os.getenv('WEBHOOK_ALLOW_PRIVATE_ADDRESSES', 'false').lower() == 'true'
+
+# Scheduled publishing (manage.py publish_scheduler)
+PUBLISH_SCHEDULER_LOOKAHEAD_SECONDS = int(os.getenv('PUBLISH_SCHEDULER_LOOKAHEAD_SECONDS', '60'))
+PUBLISH_SCHEDULER_REFRESH_SECONDS = float(os.getenv('PUBLISH_SCHEDULER_REFRESH_SECONDS', '5'))
+
+# Circuit breaker per Integration: consecutive failures before it opens,
+# seconds before a single probe publish is let through
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_FAILURE_THRESHOLD', '5'))
+CIRCUIT_BREAKER_COOLDOWN_SECONDS = int(os.getenv('CIRCUIT_BREAKER_COOLDOWN_SECONDS', '300'))
+
+# PublishLog retention (manage.py prune_publish_logs, run it daily)
+PUBLISH_LOG_RETENTION_DAYS = int(os.getenv('PUBLISH_LOG_RETENTION_DAYS', '90'))
+PUBLISH_LOG_PRUNE_BATCH_SIZE = int(os.getenv('PUBLISH_LOG_PRUNE_BATCH_SIZE', '1000'))
+# empty: pruned logs are not archived
+PUBLISH_LOG_ARCHIVE_DIR = os.getenv('PUBLISH_LOG_ARCHIVE_DIR', '')
+
+# Rendered note content (apps.integrations.services.render_service)
+NOTE_RENDER_CACHE_TIMEOUT = int(os.getenv('NOTE_RENDER_CACHE_TIMEOUT', '3600'))
+
+# Stored responses of requests sent with an Idempotency-Key header
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Prometheus metrics on /api/metrics/ (apps.integrations.metrics). Set the
+# PROMETHEUS_MULTIPROC_DIR environment variable to a directory shared by all
+# gunicorn, worker and scheduler processes to aggregate their metrics.
+# Scrapers must send "Authorization: Bearer <METRICS_TOKEN>". Without a token
+# the endpoint answers 403, unless DEBUG or METRICS_PUBLIC is on.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'false').lower() == 'true'
+
+# Where handler.publish runs: 'thread' (in the calling process) or 'process'
+# (a supervised pool, apps.integrations.services.isolation_service).
+# Timeout, task and memory limits only apply to 'process'.
+PUBLISH_HANDLER_ISOLATION = os.getenv('PUBLISH_HANDLER_ISOLATION', 'thread')
+PUBLISH_HANDLER_PROCESSES = int(os.getenv('PUBLISH_HANDLER_PROCESSES', '4'))
+PUBLISH_HANDLER_TIMEOUT = float(os.getenv('PUBLISH_HANDLER_TIMEOUT', '60'))
+PUBLISH_HANDLER_MAX_TASKS = int(os.getenv('PUBLISH_HANDLER_MAX_TASKS', '500'))
+PUBLISH_HANDLER_MAX_MEMORY_MB = int(os.getenv('PUBLISH_HANDLER_MAX_MEMORY_MB', '512'))
+
+# Server-sent publish events on /api/publish-events/ (served through config.asgi).
+# Without Postgres LISTEN/NOTIFY streams poll for new events at this interval.
+PUBLISH_EVENTS_POLL_INTERVAL = float(os.getenv('PUBLISH_EVENTS_POLL_INTERVAL', '2'))
+# a stream is closed after this long, the browser reconnects
+PUBLISH_EVENTS_STREAM_SECONDS = int(os.getenv('PUBLISH_EVENTS_STREAM_SECONDS', '300'))
+PUBLISH_EVENTS_RETENTION_HOURS = int(os.getenv('PUBLISH_EVENTS_RETENTION_HOURS', '24'))
+# lifetime of the ?ticket= a browser opens a stream with
+PUBLISH_EVENTS_TICKET_SECONDS = int(os.getenv('PUBLISH_EVENTS_TICKET_SECONDS', '60'))
+
+# Outbox of note status changes, relayed to the publish queue by
+# `manage.py publish_outbox_relay` (apps.integrations.services.outbox_service)
+PUBLISH_OUTBOX_BATCH_SIZE = int(os.getenv('PUBLISH_OUTBOX_BATCH_SIZE', '100'))
+PUBLISH_OUTBOX_POLL_INTERVAL = float(os.getenv('PUBLISH_OUTBOX_POLL_INTERVAL', '1'))
+PUBLISH_OUTBOX_MAX_ATTEMPTS = int(os.getenv('PUBLISH_OUTBOX_MAX_ATTEMPTS', '10'))
+PUBLISH_OUTBOX_RETENTION_HOURS = int(os.getenv('PUBLISH_OUTBOX_RETENTION_HOURS', '24'))
+
+# Rendered responses of /api/integration-definitions/
+# (apps.integrations.services.catalogue_service)
+INTEGRATION_CATALOGUE_CACHE_TIMEOUT = int(os.getenv('INTEGRATION_CATALOGUE_CACHE_TIMEOUT', '3600'))
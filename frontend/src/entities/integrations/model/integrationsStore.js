@@ -209,6 +209,20 @@ export const useIntegrationsStore = defineStore('integrations', () => {
     }
   }
 
+  // Apply a `target` event of the /publish-events/ stream
+  const applyPublishTargetEvent = (event) => {
+    const index = publishTargets.value.findIndex(pt => pt.id === event.id)
+    if (index !== -1) {
+      publishTargets.value[index] = { ...publishTargets.value[index], ...event }
+    }
+  }
+
+  // Short-lived ticket to open the /publish-events/ stream with
+  const fetchPublishEventsTicket = async () => {
+    const { data } = await api.post('/publish-events/ticket/')
+    return data.ticket
+  }
+
   // Actions - Publish Logs
   const fetchPublishLogs = async (publishTargetId, params = {}) => {
     loading.value = true
@@ -259,6 +273,8 @@ export const useIntegrationsStore = defineStore('integrations', () => {
     updatePublishTarget,
     deletePublishTarget,
     publishTarget,
+    applyPublishTargetEvent,
+    fetchPublishEventsTicket,
     fetchPublishLogs
   }
 })
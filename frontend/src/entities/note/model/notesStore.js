@@ -5,13 +5,36 @@ import { api } from '~/src/shared/api'
 export const useNotesStore = defineStore('notes', () => {
   const notes = ref([])
   const loading = ref(false)
+  // query of the next page of the list, null after the last one
+  const nextPage = ref(null)
 
-  const fetchNotes = async (blogUuid) => {
+  // the API returns an absolute URL, keep its query and go through our base URL
+  const pageQuery = (url) => (url ? Object.fromEntries(new URL(url).searchParams) : null)
+
+  // the lists only show these, the editor loads the full note
+  const LIST_FIELDS = 'id,uuid,blog,title,status,updated_at'
+
+  const fetchNotes = async (blogUuid, status) => {
     loading.value = true
     try {
-      const params = blogUuid ? { blog_uuid: blogUuid } : undefined
+      const params = { fields: LIST_FIELDS }
+      if (blogUuid) params.blog_uuid = blogUuid
+      if (status) params.status = status
       const { data } = await api.get('/notes/', { params })
-      notes.value = data
+      notes.value = data.results
+      nextPage.value = pageQuery(data.next)
+    } finally {
+      loading.value = false
+    }
+  }
+
+  const fetchMoreNotes = async () => {
+    if (!nextPage.value || loading.value) return
+    loading.value = true
+    try {
+      const { data } = await api.get('/notes/', { params: nextPage.value })
+      notes.value.push(...data.results)
+      nextPage.value = pageQuery(data.next)
     } finally {
       loading.value = false
     }
@@ -38,12 +61,15 @@ export const useNotesStore = defineStore('notes', () => {
   const getById = (id) => notes.value.find((note) => note.id === Number(id))
 
   const total = computed(() => notes.value.length)
+  const hasMore = computed(() => Boolean(nextPage.value))
 
   return {
     notes,
     loading,
     total,
+    hasMore,
     fetchNotes,
+    fetchMoreNotes,
     createNote,
     updateNote,
     deleteNote,